@@ -8,6 +8,7 @@ from protobufs.services.user.containers import token_pb2
 from service import actions
 import service.control
 
+from search import query_log
 from services import mixins
 from services.utils import build_slack_message
 
@@ -363,11 +364,31 @@ class NoSearchResults(mixins.PreRunParseTokenMixin, actions.Action):
         )
 
     def run(self, *args, **kwargs):
-        organization = service.control.get_object(
-            service='organization',
-            action='get_organization',
-            client_kwargs={'token': self.token},
-            return_object='organization',
-        )
-        profile, manager = self._get_profile_and_manager()
-        self._send_notification(organization, profile, manager)
+        # queries we already know return nothing are only reported once,
+        # unless there's a question attached
+        claimed = False
+        if not self.request.comment:
+            if not query_log.claim_miss_report(
+                self.parsed_token.organization_id,
+                self.request.query,
+            ):
+                return
+            claimed = True
+
+        try:
+            organization = service.control.get_object(
+                service='organization',
+                action='get_organization',
+                client_kwargs={'token': self.token},
+                return_object='organization',
+            )
+            profile, manager = self._get_profile_and_manager()
+            self._send_notification(organization, profile, manager)
+        except Exception:
+            # the miss wasn't reported, so let the next one report it
+            if claimed:
+                query_log.release_miss_report(
+                    self.parsed_token.organization_id,
+                    self.request.query,
+                )
+            raise
@@ -3,6 +3,8 @@ import json
 import service.control
 from protobufs.services.notification import containers_pb2 as notification_containers
 
+from services import loader
+
 
 class BasePlatform(object):
 
@@ -10,13 +12,7 @@ class BasePlatform(object):
         self.token = service_token
 
     def _get_profile(self, profile_id):
-        return service.control.get_object(
-            service='profile',
-            action='get_profile',
-            client_kwargs={'token': self.token},
-            return_object='profile',
-            profile_id=profile_id,
-        )
+        return loader.get(loader.PROFILE, profile_id, self.token)
 
     def _get_group(self, group_id, provider):
         return service.control.get_object(
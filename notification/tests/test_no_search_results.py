@@ -65,3 +65,47 @@ class TestNoSearchResults(MockedTestCase):
         self.assertEqual(mock_publish.call_count, 1)
         kwargs = mock_publish.call_args[1]
         self.assertTrue(kwargs['MessageStructure'], 'json')
+
+    @mock.patch('notification.actions.boto3')
+    def test_no_search_results_known_miss_reported_once(self, patched_boto):
+        self._setup_mocks()
+        for query in ('some search query', 'Some  Search Query'):
+            self.client.call_action(
+                'no_search_results',
+                client_type=token_pb2.WEB,
+                query=query,
+            )
+        mock_publish = patched_boto.resource().Topic().publish
+        self.assertEqual(mock_publish.call_count, 1)
+
+    @mock.patch('notification.actions.boto3')
+    def test_no_search_results_known_miss_reported_after_failure(self, patched_boto):
+        self._setup_mocks()
+        mock_publish = patched_boto.resource().Topic().publish
+        mock_publish.side_effect = [Exception('unavailable'), None]
+        with self.assertRaises(Exception):
+            self.client.call_action(
+                'no_search_results',
+                client_type=token_pb2.WEB,
+                query='some search query',
+            )
+
+        self.client.call_action(
+            'no_search_results',
+            client_type=token_pb2.WEB,
+            query='some search query',
+        )
+        self.assertEqual(mock_publish.call_count, 2)
+
+    @mock.patch('notification.actions.boto3')
+    def test_no_search_results_known_miss_with_comment(self, patched_boto):
+        self._setup_mocks()
+        for _ in range(2):
+            self.client.call_action(
+                'no_search_results',
+                client_type=token_pb2.WEB,
+                query='some search query',
+                comment='I was trying to find something, but couldn\'t',
+            )
+        mock_publish = patched_boto.resource().Topic().publish
+        self.assertEqual(mock_publish.call_count, 2)
@@ -1,14 +1,16 @@
 import logging
 
-from bulk_update.helper import bulk_update
 from common import utils
-from django.db import transaction
+from django.db import (
+    connection,
+    transaction,
+)
 from django.db.models import (
     Count,
-    F,
     Max,
     Q,
 )
+from django.db.models.query_utils import deferred_class_factory
 from protobuf_to_dict import protobuf_to_dict
 from protobufs.services.common import containers_pb2 as common_containers
 from protobufs.services.post import containers_pb2 as post_containers
@@ -16,10 +18,36 @@ from protobufs.services.team import containers_pb2 as team_containers
 import service.control
 from service.actions import Action
 
-from . import models
+from services import loader
+
+from . import (
+    models,
+    ordering,
+)
 
 logger = logging.getLogger(__name__)
 
+TOP_ITEMS_SQL = """
+SELECT {item_columns}, ranked.position, ranked.total_items, {post_columns}
+FROM (
+    SELECT
+        post_collectionitem.*,
+        row_number() OVER (
+            PARTITION BY collection_id
+            ORDER BY sort_key
+        ) - 1 AS position,
+        count(*) OVER (PARTITION BY collection_id) AS total_items
+    FROM post_collectionitem
+    WHERE organization_id = %s AND collection_id IN %s
+) AS ranked
+LEFT JOIN post_post AS post ON (
+    post.id = CASE WHEN ranked.source = %s THEN ranked.source_id::uuid END AND
+    post.organization_id = ranked.organization_id
+)
+WHERE ranked.position < %s
+ORDER BY ranked.collection_id, ranked.position
+"""
+
 
 def collection_exists(collection_id, organization_id):
     """Determine whether or not the collection exists.
@@ -48,14 +76,7 @@ def get_permissions_for_collections(collections, by_profile_id, token):
         )
 
     def get_profile():
-        return service.control.get_object(
-            service='profile',
-            action='get_profile',
-            return_object='profile',
-            client_kwargs={'token': token},
-            fields={'only': ['is_admin']},
-            profile_id=by_profile_id,
-        )
+        return loader.get(loader.PROFILE, by_profile_id, token, fields={'only': ['is_admin']})
 
     team_ids = set([
         str(collection.owner_id) for collection in collections
@@ -64,14 +85,11 @@ def get_permissions_for_collections(collections, by_profile_id, token):
 
     team_id_to_team_dict = {}
     if team_ids:
-        teams = service.control.get_object(
-            service='team',
-            action='get_teams',
-            return_object='teams',
-            client_kwargs={'token': token},
-            control={'paginator': {'page_size': len(team_ids)}},
+        teams = loader.get_many(
+            loader.TEAM,
+            team_ids,
+            token,
             fields={'only': ['id', 'permissions']},
-            ids=list(team_ids),
         )
         team_id_to_team_dict = dict((team.id, team) for team in teams)
 
@@ -112,27 +130,18 @@ def get_team_permissions(team_id, token):
         services.common.containers.PermissionsV1
 
     """
-    team = service.control.get_object(
-        service='team',
-        action='get_team',
-        return_object='team',
-        client_kwargs={'token': token},
+    team = loader.get(
+        loader.TEAM,
+        team_id,
+        token,
         inflations={'disabled': True},
         fields={'only': ['permissions']},
-        team_id=team_id,
     )
     return team.permissions
 
 
 def get_editable_collections(by_profile_id, organization_id, token):
-    profile = service.control.get_object(
-        service='profile',
-        action='get_profile',
-        return_object='profile',
-        client_kwargs={'token': token},
-        fields={'only': ['is_admin']},
-        profile_id=by_profile_id,
-    )
+    profile = loader.get(loader.PROFILE, by_profile_id, token, fields={'only': ['is_admin']})
 
     queryset = models.Collection.objects.filter(organization_id=organization_id)
     if profile.is_admin:
@@ -260,18 +269,17 @@ def create_collection(container, organization_id, by_profile_id, token):
     elif container.owner_type == post_containers.CollectionV1.PROFILE:
         container.owner_id = by_profile_id
 
-    bottom_position = models.Collection.objects.filter(
+    bottom_sort_key = models.Collection.objects.filter(
         organization_id=organization_id,
         owner_id=container.owner_id,
         owner_type=container.owner_type,
-    ).aggregate(Max('position'))['position__max']
-    next_position = bottom_position + 1 if bottom_position is not None else 0
+    ).aggregate(Max('sort_key'))['sort_key__max']
 
     return models.Collection.objects.from_protobuf(
         container,
         organization_id=organization_id,
         by_profile_id=profile_id,
-        position=next_position,
+        sort_key=ordering.get_next_sort_key(bottom_sort_key),
     )
 
 
@@ -345,19 +353,8 @@ def delete_collection(collection_id, organization_id, by_profile_id, token):
         token=token,
     )
 
-    position = collection.position
-    owner_id = collection.owner_id
-    owner_type = collection.owner_type
-
     collection.delete()
 
-    models.Collection.objects.filter(
-        organization_id=organization_id,
-        owner_id=owner_id,
-        owner_type=owner_type,
-        position__gt=position,
-    ).update(position=F('position') - 1)
-
 
 def reorder_collection(collection_id, organization_id, by_profile_id, position_diffs, token):
     """Reorder items within a collection.
@@ -372,11 +369,12 @@ def reorder_collection(collection_id, organization_id, by_profile_id, position_d
 
     Raises:
         post.models.Collection.DoesNotExist if the collection does not exist
+        post.models.CollectionItem.DoesNotExist if an item isn't in the collection
         Action.PermissionDenied if the user doesn't have permission to edit
             the collection
 
     """
-    check_collection_permission(
+    collection = check_collection_permission(
         permission='can_edit',
         collection_id=collection_id,
         organization_id=organization_id,
@@ -384,21 +382,22 @@ def reorder_collection(collection_id, organization_id, by_profile_id, position_d
         token=token,
     )
 
-    min_position = min([position for diff in position_diffs
-                        for position in (diff.current_position, diff.new_position)])
-
-    items = list(models.CollectionItem.objects.filter(
-        collection_id=collection_id,
-        organization_id=organization_id,
-        position__gte=min_position,
-    ).order_by('position'))
-
-    reorder_collection_objects(items, position_diffs, min_position)
-
-    for index, item in enumerate(items):
-        item.position = index + min_position
+    siblings = {'organization_id': collection.organization_id, 'collection_id': collection.id}
+    items = models.CollectionItem.objects.filter(
+        pk__in=[diff.item_id for diff in position_diffs],
+        **siblings
+    )
+    items = dict((str(item.id), item) for item in items)
 
-    bulk_update(items, update_fields=['position', 'changed'])
+    with transaction.atomic():
+        # moves within the collection are serialized so they don't pick the
+        # same sort key
+        models.Collection.objects.select_for_update().get(pk=collection.pk)
+        for diff in position_diffs:
+            item = items.get(diff.item_id)
+            if item is None:
+                raise models.CollectionItem.DoesNotExist
+            ordering.move(models.CollectionItem, siblings, item, diff.new_position)
 
 
 def reorder_collections(organization_id, by_profile_id, position_diffs, token):
@@ -418,49 +417,37 @@ def reorder_collections(organization_id, by_profile_id, position_diffs, token):
             the collection
 
     """
-    min_position = min([position for diff in position_diffs
-                        for position in (diff.current_position, diff.new_position)])
-
     first_collection = models.Collection.objects.get(
         pk=position_diffs[0].item_id,
         organization_id=organization_id,
     )
-    collections = list(models.Collection.objects.filter(
-        organization_id=organization_id,
-        owner_id=first_collection.owner_id,
-        owner_type=first_collection.owner_type,
-        position__gte=min_position,
-    ).order_by('position'))
-    collection_ids = [str(collection.id) for collection in collections]
+    siblings = first_collection.get_siblings()
+    collections = models.Collection.objects.filter(
+        pk__in=[diff.item_id for diff in position_diffs],
+        sort_key__isnull=False,
+        **siblings
+    )
+    collections = dict((str(collection.id), collection) for collection in collections)
+    if any(diff.item_id not in collections for diff in position_diffs):
+        raise models.Collection.DoesNotExist
 
     collections_to_permissions = get_permissions_for_collections(
-        collections=collections,
+        collections=collections.values(),
         by_profile_id=by_profile_id,
         token=token,
     )
-    for collection_id in collection_ids:
-        permissions = collections_to_permissions[collection_id]
+    for permissions in collections_to_permissions.itervalues():
         if not getattr(permissions, 'can_edit'):
             raise Action.PermissionDenied()
 
-    try:
-        reorder_collection_objects(collections, position_diffs, min_position)
-    except IndexError:
-        raise models.Collection.DoesNotExist
-
-    for index, collection in enumerate(collections):
-        collection.position = index + min_position
-
-    bulk_update(collections, update_fields=['position', 'changed'])
-
-
-def reorder_collection_objects(objects, position_diffs, min_position):
-    for diff in position_diffs:
-        # normalize the positions relative to the slice we fetched from the db
-        diff.new_position = diff.new_position - min_position
-        current_position = [idx for idx, obj in enumerate(objects) if str(obj.id) == diff.item_id][0]
-        obj = objects.pop(current_position)
-        objects.insert(diff.new_position, obj)
+    with transaction.atomic():
+        # moves among the owner's collections are serialized so they don't
+        # pick the same sort key
+        list(models.Collection.objects.select_for_update().filter(
+            **siblings
+        ).order_by('pk').values_list('pk', flat=True))
+        for diff in position_diffs:
+            ordering.move(models.Collection, siblings, collections[diff.item_id], diff.new_position)
 
 
 def add_to_collections(item, collections, organization_id, by_profile_id, token):
@@ -487,27 +474,24 @@ def add_to_collections(item, collections, organization_id, by_profile_id, token)
         token=token,
     )
 
-    positions = models.CollectionItem.objects.filter(
+    bottoms = models.CollectionItem.objects.filter(
         organization_id=organization_id,
         collection_id__in=[c.id for c in collections],
-    ).values('collection_id').annotate(position=Max('position'))
-    collection_to_position = dict((str(p['collection_id']), p['position']) for p in positions)
+    ).values('collection_id').annotate(sort_key=Max('sort_key'), total_items=Count('id'))
+    collection_to_bottom = dict((str(b['collection_id']), b) for b in bottoms)
 
     items = []
     for collection in collections:
-        position = collection_to_position.get(str(collection.id), None)
-        if position is None:
-            position = 0
-        else:
-            position += 1
+        bottom = collection_to_bottom.get(str(collection.id), {})
         item = models.CollectionItem(
             organization_id=organization_id,
             collection_id=collection.id,
             source=item.source,
             source_id=item.source_id,
             by_profile_id=by_profile_id,
-            position=position,
+            sort_key=ordering.get_next_sort_key(bottom.get('sort_key')),
         )
+        item.position = bottom.get('total_items', 0)
         items.append(item)
 
     if items:
@@ -535,21 +519,7 @@ def _atomic_remove(item, collections, organization_id):
         )
         raise
     else:
-        collection_dict = {}
-        for item in items:
-            collection_dict[item.collection_id] = list(models.CollectionItem.objects.filter(
-                organization_id=organization_id,
-                collection_id=item.collection_id,
-                position__gt=item.position,
-            ).values_list('pk', flat=True))
-
         items.delete()
-        for collection_id, item_ids in collection_dict.iteritems():
-            models.CollectionItem.objects.filter(
-                organization_id=organization_id,
-                collection_id=collection_id,
-                pk__in=item_ids,
-            ).update(position=F('position') - 1)
 
 
 def remove_from_collection(
@@ -583,22 +553,11 @@ def remove_from_collection(
         if not items:
             continue
 
-        items = models.CollectionItem.objects.filter(
+        models.CollectionItem.objects.filter(
             pk__in=[item.id for item in items],
             organization_id=organization_id,
             collection_id=collection.id,
-        )
-        with transaction.atomic():
-            items.delete()
-            items = models.CollectionItem.objects.filter(
-                organization_id=organization_id,
-                collection_id=collection.id,
-            ).order_by('position')
-            for index, item in enumerate(items):
-                item.position = index
-
-            if items:
-                bulk_update(items, update_fields=['position', 'changed'])
+        ).delete()
 
 
 def remove_from_collections(
@@ -713,7 +672,7 @@ def get_collections(
             owner_id=owner_id,
             owner_type=owner_type,
             **parameters
-        ).order_by('position')
+        ).order_by('sort_key')
         # is_default is a NullBooleanField, we only store a value if
         # `is_default` is True
         if is_default:
@@ -776,18 +735,39 @@ def get_posts_with_fields(ids, organization_id, fields):
         post.models.Post queryset
 
     """
+    # `plain_text` isn't part of the protobuf
     posts = models.Post.objects.filter(
         organization_id=organization_id,
         id__in=ids,
-    )
+    ).defer('plain_text')
     if fields.only:
-        posts = posts.only(*fields.only)
+        posts = posts.only(*_get_post_field_names(fields.only))
 
     if fields.exclude:
-        posts = posts.defer(*fields.exclude)
+        posts = posts.defer(*_get_post_field_names(fields.exclude))
     return posts
 
 
+def _get_post_field_names(names):
+    # the snippet is read from the stored `snippet_text`
+    return ['snippet_text' if name == 'snippet' else name for name in names]
+
+
+def _get_loaded_post_fields(fields):
+    """Return the `Post` fields `get_posts_with_fields` would load for `fields`."""
+    only = set(_get_post_field_names(fields.only))
+    exclude = set(_get_post_field_names(fields.exclude))
+    loaded = []
+    for field in models.Post._meta.concrete_fields:
+        if field.primary_key:
+            loaded.append(field)
+        elif field.name == 'plain_text' or field.name in exclude:
+            continue
+        elif not only or field.name in only:
+            loaded.append(field)
+    return loaded
+
+
 def get_collection_items(collection_id, organization_id):
     """Return the items for the given collection.
 
@@ -803,14 +783,14 @@ def get_collection_items(collection_id, organization_id):
     return models.CollectionItem.objects.filter(
         collection_id=collection_id,
         organization_id=organization_id,
-    ).order_by('position').exclude(
+    ).order_by('sort_key').exclude(
         source_id__in=models.Post.objects.exclude(
             state=post_containers.LISTED,
         ).extra(select={'source_id': 'id::varchar'}).values_list('source_id', flat=True),
     )
 
 
-def inflate_items_source(items, organization_id, inflations, fields, token=None):
+def inflate_items_source(items, organization_id, inflations, fields, token=None, posts=None):
     """Given a list of items, inflate the source objects.
 
     Args:
@@ -819,6 +799,8 @@ def inflate_items_source(items, organization_id, inflations, fields, token=None)
         inflations (services.common.containers.InflationsV1): inflations for the items
         fields (services.common.containers.FieldsV1): fields for the items
         token (Optional[str]): service token
+        posts (Optional[List[post.models.Post]]): posts of the items, if
+            they've already been fetched
 
     Returns:
         List[services.post.containers.CollectionItemV1]
@@ -833,11 +815,12 @@ def inflate_items_source(items, organization_id, inflations, fields, token=None)
 
     for source, data in source_dict.iteritems():
         if source == post_containers.CollectionItemV1.LUNO:
-            posts = get_posts_with_fields(
-                ids=data['ids'],
-                organization_id=organization_id,
-                fields=post_fields,
-            )
+            if posts is None:
+                posts = get_posts_with_fields(
+                    ids=data['ids'],
+                    organization_id=organization_id,
+                    fields=post_fields,
+                )
             profile_id_to_profile = {}
             if utils.should_inflate_field('by_profile', post_inflations) and token:
                 profile_ids = list(set([str(p.by_profile_id) for p in posts]))
@@ -884,6 +867,71 @@ def inflate_items_source(items, organization_id, inflations, fields, token=None)
     return containers
 
 
+def get_top_items_for_collections(collection_ids, number_of_items, organization_id, post_fields):
+    """Get the top items for the collections along with their posts in a single query.
+
+    Args:
+        collection_ids (List[str]): list of collection ids
+        number_of_items (int): top number of items to return for each
+            collection (based on position)
+        organization_id (str): id of the organization
+        post_fields (services.common.containers.FieldsV1): fields for the
+            items' posts
+
+    Returns:
+        tuple of (List[post.models.CollectionItem], List[post.models.Post],
+        dictionary of <collection_id>: <total items>)
+
+    """
+    if not collection_ids:
+        return [], [], {}
+
+    item_fields = models.CollectionItem._meta.concrete_fields
+    post_fields = _get_loaded_post_fields(post_fields)
+    quote_name = connection.ops.quote_name
+    sql = TOP_ITEMS_SQL.format(
+        item_columns=', '.join('ranked.%s' % (quote_name(f.column),) for f in item_fields),
+        post_columns=', '.join('post.%s' % (quote_name(f.column),) for f in post_fields),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            organization_id,
+            tuple(collection_ids),
+            post_containers.CollectionItemV1.LUNO,
+            number_of_items,
+        ])
+        rows = cursor.fetchall()
+
+    # posts are only loaded with the requested fields
+    post_class = models.Post
+    deferred = [f.attname for f in models.Post._meta.concrete_fields if f not in post_fields]
+    if deferred:
+        post_class = deferred_class_factory(models.Post, deferred)
+
+    items = []
+    posts = {}
+    item_counts = {}
+    post_field_names = [f.attname for f in post_fields]
+    for row in rows:
+        item_values = row[:len(item_fields)]
+        position, total_items = row[len(item_fields):len(item_fields) + 2]
+        post_values = row[len(item_fields) + 2:]
+
+        item = models.CollectionItem.from_db(
+            connection.alias,
+            [f.attname for f in item_fields],
+            item_values,
+        )
+        item.position = position
+        items.append(item)
+        item_counts[str(item.collection_id)] = total_items
+        # the post's id is None if the item's post doesn't exist
+        if post_values[0] is not None:
+            post = post_class.from_db(connection.alias, post_field_names, post_values)
+            posts[post.pk] = post
+    return items, posts.values(), item_counts
+
+
 def get_collection_id_to_items_dict(
         collection_ids,
         number_of_items,
@@ -902,24 +950,27 @@ def get_collection_id_to_items_dict(
         fields (services.common.containers.FieldsV1): fields for the items
 
     Returns:
-        dictionary of <collection_id>: <services.post.containers.CollectionItemV1>
+        tuple of (dictionary of <collection_id>: <services.post.containers.CollectionItemV1>,
+        dictionary of <collection_id>: <total items>)
 
     """
-    items = models.CollectionItem.objects.filter(
+    items, posts, item_counts = get_top_items_for_collections(
+        collection_ids=collection_ids,
+        number_of_items=number_of_items,
         organization_id=organization_id,
-        position__lt=number_of_items,
-        collection_id__in=collection_ids,
-    ).order_by('position')
+        post_fields=utils.fields_for_item('post', fields),
+    )
     containers = inflate_items_source(
         items=items,
         organization_id=organization_id,
         inflations=inflations,
         fields=fields,
+        posts=posts,
     )
     collections_dict = {}
     for container in containers:
         collections_dict.setdefault(container.collection_id, []).append(container)
-    return collections_dict
+    return collections_dict, item_counts
 
 
 def get_or_create_default_collection(owner_type, owner_id, organization_id):
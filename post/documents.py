@@ -0,0 +1,111 @@
+"""Cached rendering of a post's `html_document`.
+
+Rendering formats the post into `TEMPLATE` along with the large inline
+`TEMPLATE_STYLE`. Rendered documents are cached in redis alongside a gzipped
+copy, keyed by the post's id, when it last changed and a hash of the template,
+so edits and template changes never serve a stale document and nothing has to
+be invalidated. The same key is the document's ETag.
+
+"""
+import gzip
+import hashlib
+from io import BytesIO
+import logging
+
+from django.conf import settings
+import redis
+
+from services.cache import get_redis_client
+
+from .template import (
+    TEMPLATE,
+    TEMPLATE_STYLE,
+)
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_VERSION = hashlib.sha1((TEMPLATE + TEMPLATE_STYLE).encode('utf-8')).hexdigest()[:8]
+
+
+def render(title, content):
+    return TEMPLATE.format(title=title, content=content, style=TEMPLATE_STYLE)
+
+
+def compress(document):
+    buf = BytesIO()
+    with gzip.GzipFile(mode='wb', compresslevel=6, fileobj=buf, mtime=0) as zfile:
+        zfile.write(document.encode('utf-8'))
+    return buf.getvalue()
+
+
+def get_document_hash(post_id, changed):
+    """Return the hash identifying a rendered version of the post."""
+    return hashlib.sha1('%s:%s:%s' % (post_id, changed.isoformat(), TEMPLATE_VERSION)).hexdigest()
+
+
+def get_etag(post_id, changed):
+    return '"%s"' % (get_document_hash(post_id, changed),)
+
+
+def get_document_key(document_hash):
+    return 'post:html_document:%s' % (document_hash,)
+
+
+def get_compressed_document_key(document_hash):
+    return 'post:html_document:%s:gzip' % (document_hash,)
+
+
+def _cache(client, document_hash, document, compressed):
+    pipeline = client.pipeline(transaction=False)
+    timeout = settings.POST_SERVICE_HTML_DOCUMENT_CACHE_TIMEOUT
+    pipeline.setex(get_document_key(document_hash), timeout, document.encode('utf-8'))
+    pipeline.setex(get_compressed_document_key(document_hash), timeout, compressed)
+    try:
+        pipeline.execute()
+    except redis.RedisError:
+        logger.exception('failed to cache html document')
+
+
+def _get(post, key_builder):
+    """Return the cached (document hash, cached value) for the post.
+
+    Returns None for the cached value if it wasn't cached.
+
+    """
+    document_hash = get_document_hash(post.pk, post.changed)
+    try:
+        cached = get_redis_client().get(key_builder(document_hash))
+    except redis.RedisError:
+        logger.exception('failed to fetch cached html document')
+        cached = None
+    return document_hash, cached
+
+
+def get_document(post):
+    """Return the post's rendered html document."""
+    # posts that haven't been saved have nothing to key the cache by
+    if not settings.POST_SERVICE_HTML_DOCUMENT_CACHE_TIMEOUT or not post.changed:
+        return render(post.title, post.content)
+
+    document_hash, cached = _get(post, get_document_key)
+    if cached is not None:
+        return cached.decode('utf-8')
+
+    document = render(post.title, post.content)
+    _cache(get_redis_client(), document_hash, document, compress(document))
+    return document
+
+
+def get_compressed_document(post):
+    """Return the post's rendered html document, gzipped."""
+    if not settings.POST_SERVICE_HTML_DOCUMENT_CACHE_TIMEOUT or not post.changed:
+        return compress(render(post.title, post.content))
+
+    document_hash, cached = _get(post, get_compressed_document_key)
+    if cached is not None:
+        return cached
+
+    document = render(post.title, post.content)
+    compressed = compress(document)
+    _cache(get_redis_client(), document_hash, document, compressed)
+    return compressed
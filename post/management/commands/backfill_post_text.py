@@ -0,0 +1,47 @@
+from bulk_update.helper import bulk_update
+
+from services.management.base import BaseCommand
+
+from ...models import Post
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+
+    help = 'Extract and store the plain text and snippet of posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of posts to load and update at a time',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Extract text for all posts, not just posts without any',
+        )
+
+    def handle(self, *args, **options):
+        queryset = Post.objects.order_by('pk').only('id', 'content')
+        if not options['all']:
+            queryset = queryset.filter(plain_text__isnull=True)
+
+        total = 0
+        last_pk = None
+        while True:
+            chunk = queryset
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            posts = list(chunk[:options['chunk_size']])
+            if not posts:
+                break
+
+            for post in posts:
+                post.update_plain_text()
+            bulk_update(posts, update_fields=['plain_text', 'snippet_text'])
+            last_pk = posts[-1].pk
+            total += len(posts)
+            self.stdout.write('extracted text from %s posts' % (total,))
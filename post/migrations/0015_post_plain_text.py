@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0014_auto_20160313_1932'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='plain_text',
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='snippet_text',
+            field=models.CharField(max_length=160, null=True),
+        ),
+    ]
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+# post.ordering.POSITION_GAP
+POSITION_GAP = 65536
+
+POPULATE_SORT_KEYS = """
+UPDATE post_collection SET sort_key = position * {gap};
+UPDATE post_collectionitem SET sort_key = position * {gap};
+""".format(gap=POSITION_GAP)
+
+POPULATE_POSITIONS = """
+UPDATE post_collection SET position = ranked.position
+FROM (
+    SELECT
+        id,
+        row_number() OVER (
+            PARTITION BY organization_id, owner_id, owner_type
+            ORDER BY sort_key
+        ) - 1 AS position
+    FROM post_collection
+    WHERE sort_key IS NOT NULL
+) AS ranked
+WHERE post_collection.id = ranked.id;
+UPDATE post_collectionitem SET position = ranked.position
+FROM (
+    SELECT
+        id,
+        row_number() OVER (
+            PARTITION BY organization_id, collection_id
+            ORDER BY sort_key
+        ) - 1 AS position
+    FROM post_collectionitem
+) AS ranked
+WHERE post_collectionitem.id = ranked.id;
+"""
+
+
+class DeferredUniqueTogether(migrations.AlterUniqueTogether):
+
+    def __init__(self, name, unique_together, columns):
+        super(DeferredUniqueTogether, self).__init__(name, unique_together)
+        self.columns = columns
+
+    def deconstruct(self):
+        name, args, kwargs = super(DeferredUniqueTogether, self).deconstruct()
+        kwargs['columns'] = self.columns
+        return name, args, kwargs
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        new_model = to_state.apps.get_model(app_label, self.name)
+        if self.allow_migrate_model(schema_editor.connection.alias, new_model):
+            statement = schema_editor._create_unique_sql(new_model, self.columns)
+            statement += ' INITIALLY DEFERRED'
+            schema_editor.execute(statement)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        super(DeferredUniqueTogether, self).database_forwards(
+            app_label,
+            schema_editor,
+            from_state,
+            to_state,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0015_post_plain_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='sort_key',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='collectionitem',
+            name='sort_key',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='collectionitem',
+            name='position',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.RunSQL(POPULATE_SORT_KEYS, reverse_sql=POPULATE_POSITIONS),
+        migrations.AlterUniqueTogether(
+            name='collection',
+            unique_together=set([('organization_id', 'owner_id', 'owner_type', 'is_default')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='collectionitem',
+            unique_together=set([('organization_id', 'collection', 'source', 'source_id')]),
+        ),
+        migrations.RemoveField(
+            model_name='collection',
+            name='position',
+        ),
+        migrations.RemoveField(
+            model_name='collectionitem',
+            name='position',
+        ),
+        migrations.AlterField(
+            model_name='collectionitem',
+            name='sort_key',
+            field=models.BigIntegerField(),
+        ),
+        DeferredUniqueTogether(
+            name='collection',
+            unique_together=set([
+                ('organization_id', 'owner_id', 'owner_type', 'is_default'),
+                ('organization_id', 'owner_id', 'owner_type', 'sort_key'),
+            ]),
+            columns=('organization_id', 'owner_id', 'owner_type', 'sort_key'),
+        ),
+        DeferredUniqueTogether(
+            name='collectionitem',
+            unique_together=set([
+                ('organization_id', 'collection', 'sort_key'),
+                ('organization_id', 'collection', 'source', 'source_id'),
+            ]),
+            columns=('organization_id', 'collection_id', 'sort_key'),
+        ),
+    ]
@@ -1,18 +1,22 @@
-from cacheops import cached_as
 from common import utils
 from common.db import models
+from django.conf import settings
+from django.db.models.query import QuerySet
 from protobufs.services.post import containers_pb2 as post_containers
 from protobuf_to_dict import protobuf_to_dict
-import service.control
 
 from search.stores.es.types.post.utils import transform_html
+from services import loader
 
-from .template import (
-    TEMPLATE,
-    TEMPLATE_STYLE,
+from . import (
+    documents,
+    ordering,
 )
 from .utils import clean
 
+# max number of characters in a post's snippet
+SNIPPET_LENGTH = 160
+
 
 class Post(models.UUIDModel, models.TimestampableModel):
 
@@ -25,6 +29,7 @@ class Post(models.UUIDModel, models.TimestampableModel):
     }
 
     protobuf_include_fields = ('snippet',)
+    protobuf_exclude_fields = ('plain_text', 'snippet_text')
 
     title = models.CharField(max_length=255)
     content = models.TextField()
@@ -39,35 +44,70 @@ class Post(models.UUIDModel, models.TimestampableModel):
         default=post_containers.WEB,
     )
     source_id = models.CharField(max_length=255, null=True)
+    # text extracted from `content`, null until it has been extracted (see `save`)
+    plain_text = models.TextField(null=True)
+    snippet_text = models.CharField(max_length=SNIPPET_LENGTH, null=True)
 
     class Meta:
         index_together = (('organization_id', 'by_profile_id'), ('organization_id', 'state'))
         protobuf = post_containers.PostV1
 
-    @property
-    def snippet(self):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Post, cls).from_db(db, field_names, values)
+        # so we only extract text when the content changes
+        instance._saved_content = instance.__dict__.get('content')
+        return instance
 
-        @cached_as(self)
-        def _get_snippet():
-            return transform_html(self.content)[:160]
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super(Post, self).refresh_from_db(using=using, fields=fields, **kwargs)
+        # deferred content is loaded through here
+        if fields is None or 'content' in fields:
+            self._saved_content = self.content
 
-        return _get_snippet()
+    @property
+    def snippet(self):
+        if self.snippet_text is None:
+            return transform_html(self.content)[:SNIPPET_LENGTH]
+        return self.snippet_text
+
+    def update_plain_text(self):
+        """Extract the text from the post's content."""
+        self.plain_text = transform_html(self.content)
+        self.snippet_text = self.plain_text[:SNIPPET_LENGTH]
+
+    def save(self, *args, **kwargs):
+        # deferred content that was never loaded hasn't changed
+        content_changed = (
+            'content' in self.__dict__ and
+            self.content != getattr(self, '_saved_content', None)
+        )
+        if content_changed:
+            if len(self.content) <= settings.POST_SERVICE_PLAIN_TEXT_MAX_SYNC_LENGTH:
+                self.update_plain_text()
+            else:
+                self.plain_text = None
+                self.snippet_text = None
+
+        super(Post, self).save(*args, **kwargs)
+        self._saved_content = self.content
+        if content_changed and self.plain_text is None:
+            # avoid circular import
+            from .tasks import update_plain_text
+            update_plain_text.apply_async(
+                (str(self.pk), self.changed.isoformat()),
+                countdown=settings.POST_SERVICE_PLAIN_TEXT_DELAY,
+            )
 
     @property
     def html_document(self):
-        return TEMPLATE.format(
-            title=self.title,
-            content=self.content,
-            style=TEMPLATE_STYLE,
-        )
+        return documents.get_document(self)
 
     def _get_by_profile(self, token):
-        return service.control.get_object(
-            service='profile',
-            action='get_profile',
-            client_kwargs={'token': token},
-            return_object='profile',
-            profile_id=str(self.by_profile_id),
+        return loader.get(
+            loader.PROFILE,
+            self.by_profile_id,
+            token,
             inflations={'only': ['display_title']},
         )
 
@@ -83,13 +123,7 @@ class Post(models.UUIDModel, models.TimestampableModel):
         return False
 
     def _inflate_files(self, attachments, token):
-        files = service.control.get_object(
-            service='file',
-            action='get_files',
-            client_kwargs={'token': token},
-            return_object='files',
-            ids=[str(a.file_id) for a in attachments],
-        )
+        files = loader.get_many(loader.FILE, [a.file_id for a in attachments], token)
         return [protobuf_to_dict(f) for f in files]
 
     def _inflate(self, protobuf, inflations, overrides, token):
@@ -145,13 +179,69 @@ class Attachment(models.UUIDModel, models.TimestampableModel):
     file_id = models.UUIDField()
 
 
-class Collection(models.UUIDModel, models.TimestampableModel):
+class OrderedQuerySet(QuerySet):
+
+    def iterator(self):
+        # objects loaded together share the list, so the positions of all of
+        # them are set by a single query the first time one is needed
+        objects = list(super(OrderedQuerySet, self).iterator())
+        for obj in objects:
+            obj._loaded_with = objects
+        return iter(objects)
+
+
+class OrderedManager(models.CommonManager):
+
+    def get_queryset(self):
+        return OrderedQuerySet(self.model, using=self._db, hints=self._hints)
+
+
+class OrderedModelMixin(object):
+    """Expose the dense `position` of objects ordered by a sparse `sort_key`.
+
+    See `post.ordering`.
+
+    """
+
+    # columns shared by the siblings an object is ordered among
+    ordering_columns = ()
+
+    @property
+    def position(self):
+        if not hasattr(self, '_position'):
+            ordering.set_positions(type(self), getattr(self, '_loaded_with', [self]))
+        return self._position
+
+    @position.setter
+    def position(self, value):
+        self._position = value
+
+    def get_siblings(self):
+        """Return column -> value identifying the objects this is ordered among."""
+        return dict((column, getattr(self, column)) for column in self.ordering_columns)
+
+    def save(self, *args, **kwargs):
+        # objects can be created at an explicit position, which is only used
+        # to seed the sort key
+        if self.sort_key is None and getattr(self, '_position', None) is not None:
+            self.sort_key = ordering.get_sort_key(self._position)
+            del self._position
+        super(OrderedModelMixin, self).save(*args, **kwargs)
+
+
+class Collection(OrderedModelMixin, models.UUIDModel, models.TimestampableModel):
 
     as_dict_value_transforms = {
         'owner_type': int,
         'position': lambda x: x if x is None else int(x),
     }
 
+    protobuf_include_fields = ('position',)
+    protobuf_exclude_fields = ('sort_key',)
+    ordering_columns = ('organization_id', 'owner_id', 'owner_type')
+
+    objects = OrderedManager()
+
     organization_id = models.UUIDField(editable=False)
     owner_id = models.UUIDField()
     owner_type = models.SmallIntegerField(
@@ -163,26 +253,37 @@ class Collection(models.UUIDModel, models.TimestampableModel):
     # owner_type and owner_id
     is_default = models.NullBooleanField(editable=False, null=True)
     by_profile_id = models.UUIDField(null=True, editable=False)
-    position = models.PositiveSmallIntegerField(null=True)
+    # the default collection isn't ordered
+    sort_key = models.BigIntegerField(null=True)
 
     class Meta:
         index_together = ('id', 'organization_id')
+        # The sort_key constraint is created with custom sql:
+        # post/migrations/0016_collection_sort_key.py to support initially
+        # deferring the constraint check, so collections can be renumbered in
+        # a single statement.
         unique_together = (
             ('organization_id', 'owner_id', 'owner_type', 'is_default'),
-            ('organization_id', 'owner_id', 'owner_type', 'position'),
+            ('organization_id', 'owner_id', 'owner_type', 'sort_key'),
         )
         protobuf = post_containers.CollectionV1
 
 
-class CollectionItem(models.UUIDModel, models.TimestampableModel):
+class CollectionItem(OrderedModelMixin, models.UUIDModel, models.TimestampableModel):
 
     as_dict_value_transforms = {
         'source': int,
         'position': int,
     }
 
+    protobuf_include_fields = ('position',)
+    protobuf_exclude_fields = ('sort_key',)
+    ordering_columns = ('organization_id', 'collection_id')
+
+    objects = OrderedManager()
+
     collection = models.ForeignKey(Collection)
-    position = models.PositiveSmallIntegerField()
+    sort_key = models.BigIntegerField()
     by_profile_id = models.UUIDField(null=True)
     organization_id = models.UUIDField()
     source = models.SmallIntegerField(
@@ -195,12 +296,12 @@ class CollectionItem(models.UUIDModel, models.TimestampableModel):
         index_together = (
             ('organization_id', 'source', 'source_id'),
         )
-        # This index is created with custom sql:
-        # post/migrations/0009_auto_20160212_2047.py to support initially
-        # deferring the constraint check. this allows us to reorder the
-        # collection in a single transaction.
+        # The sort_key constraint is created with custom sql:
+        # post/migrations/0016_collection_sort_key.py to support initially
+        # deferring the constraint check, so the collection can be renumbered
+        # in a single statement.
         unique_together = (
-            ('organization_id', 'collection', 'position'),
+            ('organization_id', 'collection', 'sort_key'),
             ('organization_id', 'collection', 'source', 'source_id'),
         )
         protobuf = post_containers.CollectionItemV1
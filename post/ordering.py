@@ -0,0 +1,158 @@
+"""Sparse ordering of collections and collection items.
+
+Collections (per owner) and items (per collection) are ordered by a
+`sort_key` that's spaced `POSITION_GAP` apart. Moving an object only rewrites
+its own key, to a key between its new neighbours. When there's no room left
+between two neighbours, the siblings are spread back out with a single
+statement.
+
+Clients still see dense, zero based positions. An object's position is the
+number of siblings ordered before it, which is computed for a whole list of
+objects at once.
+
+"""
+import uuid
+
+from django.db import connection
+from django.db.models import Max
+
+POSITION_GAP = 1 << 16
+
+POSITIONS_SQL = """
+SELECT id, position FROM (
+    SELECT id, row_number() OVER (
+        PARTITION BY {columns}
+        ORDER BY sort_key
+    ) - 1 AS position
+    FROM {table}
+    WHERE ({columns}) IN %s AND sort_key IS NOT NULL
+) AS ranked
+WHERE id IN %s
+"""
+
+RENUMBER_SQL = """
+UPDATE {table} SET sort_key = ranked.position * %s
+FROM (
+    SELECT id, row_number() OVER (ORDER BY sort_key) - 1 AS position
+    FROM {table}
+    WHERE {conditions} AND sort_key IS NOT NULL
+) AS ranked
+WHERE {table}.id = ranked.id
+"""
+
+
+def _adapt(value):
+    return str(value) if isinstance(value, uuid.UUID) else value
+
+
+def set_positions(model, objects):
+    """Set the position of each of `objects` with a single query.
+
+    Args:
+        model (django.db.models.Model): model being ordered
+        objects (List[django.db.models.Model]): objects to set positions for
+
+    """
+    ordered = []
+    for obj in objects:
+        obj.position = None
+        if obj.sort_key is not None:
+            ordered.append(obj)
+    if not ordered:
+        return
+
+    columns = model.ordering_columns
+    groups = set(tuple(_adapt(getattr(obj, column)) for column in columns) for obj in ordered)
+    sql = POSITIONS_SQL.format(table=model._meta.db_table, columns=', '.join(columns))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [tuple(groups), tuple(str(obj.pk) for obj in ordered)])
+        positions = dict((str(pk), position) for pk, position in cursor.fetchall())
+
+    for obj in ordered:
+        obj.position = positions.get(str(obj.pk))
+
+
+def get_sort_key(position):
+    """Return the sort key for an object created at `position`."""
+    return position * POSITION_GAP
+
+
+def get_next_sort_key(max_sort_key):
+    """Return the sort key for an object added after `max_sort_key`."""
+    if max_sort_key is None:
+        return 0
+    return max_sort_key + POSITION_GAP
+
+
+def renumber(model, siblings):
+    """Spread the siblings back out by `POSITION_GAP` in a single statement.
+
+    Args:
+        model (django.db.models.Model): model being ordered
+        siblings (dict): column -> value identifying the siblings
+
+    """
+    columns = sorted(siblings)
+    sql = RENUMBER_SQL.format(
+        table=model._meta.db_table,
+        conditions=' AND '.join('%s = %%s' % (column,) for column in columns),
+    )
+    with connection.cursor() as cursor:
+        params = [POSITION_GAP]
+        for column in columns:
+            params.append(_adapt(siblings[column]))
+        cursor.execute(sql, params)
+
+
+def _get_sort_key_at(queryset, index):
+    """Return a sort key that would order an object at `index` within `queryset`.
+
+    Returns None if there's no room between the neighbours at `index`.
+
+    """
+    queryset = queryset.order_by('sort_key')
+    start = max(index - 1, 0)
+    keys = list(queryset.values_list('sort_key', flat=True)[start:index + 1])
+    if index == 0:
+        before = None
+        after = keys[0] if keys else None
+    elif keys:
+        before = keys[0]
+        after = keys[1] if len(keys) > 1 else None
+    else:
+        # moving past the end of the list
+        before = queryset.aggregate(Max('sort_key'))['sort_key__max']
+        after = None
+
+    if before is None and after is None:
+        return 0
+    elif before is None:
+        return after - POSITION_GAP
+    elif after is None:
+        return before + POSITION_GAP
+    elif after - before > 1:
+        return (before + after) // 2
+    return None
+
+
+def move(model, siblings, obj, index):
+    """Move `obj` to `index` among its siblings.
+
+    Only `obj` is written, unless its new neighbours are adjacent and the
+    siblings have to be renumbered first.
+
+    Args:
+        model (django.db.models.Model): model being ordered
+        siblings (dict): column -> value identifying the siblings
+        obj (django.db.models.Model): object being moved
+        index (int): new position of the object
+
+    """
+    queryset = model.objects.filter(sort_key__isnull=False, **siblings).exclude(pk=obj.pk)
+    sort_key = _get_sort_key_at(queryset, index)
+    if sort_key is None:
+        renumber(model, siblings)
+        sort_key = _get_sort_key_at(queryset, index)
+
+    obj.sort_key = sort_key
+    obj.save(update_fields=['sort_key', 'changed'])
@@ -197,30 +197,30 @@ class GetPosts(PreRunParseTokenMixin, actions.Action):
         elif not self.request.all_states:
             parameters['state'] = self.request.state
 
-        posts = models.Post.objects.filter(**parameters).order_by('-changed')
+        posts = models.Post.objects.filter(**parameters).defer('plain_text').order_by('-changed')
+        posts = self.get_paginated_objects(posts)
         authors = {}
-        if common_utils.should_inflate_field('by_profile', self.request.inflations):
-            author_ids = [str(post.by_profile_id) for post in posts]
+        if posts and common_utils.should_inflate_field('by_profile', self.request.inflations):
+            author_ids = list(set(str(post.by_profile_id) for post in posts))
             profiles = service.control.get_object(
                 'profile',
                 client_kwargs={'token': self.token},
                 action='get_profiles',
                 return_object='profiles',
+                control={'paginator': {'page_size': len(author_ids)}},
                 ids=author_ids
             )
             # XXX redundant protobuf_to_dict call
             authors = dict((profile.id, protobuf_to_dict(profile)) for profile in profiles)
-        self.paginated_response(
-            self.response.posts,
-            posts,
-            lambda item, container: item.to_protobuf(
-                container.add(),
+
+        for post in posts:
+            post.to_protobuf(
+                self.response.posts.add(),
                 inflations=self.request.inflations,
                 token=self.token,
                 fields=self.request.fields,
-                by_profile=authors.get(str(item.by_profile_id), {})
-            ),
-        )
+                by_profile=authors.get(str(post.by_profile_id), {})
+            )
 
 
 class DeletePost(PostPermissionsMixin, actions.Action):
@@ -421,12 +421,6 @@ class GetCollections(PreRunParseTokenMixin, actions.Action):
         )
         collections = self.get_paginated_objects(collections)
         collection_ids = [str(c.id) for c in collections]
-        item_counts = {}
-        if common_utils.should_inflate_field('total_items', self.request.inflations):
-            item_counts = get_total_items_for_collections(
-                collection_ids=collection_ids,
-                organization_id=self.parsed_token.organization_id,
-            )
 
         collection_id_to_display_name = {}
         if common_utils.should_inflate_field('display_name', self.request.inflations):
@@ -446,14 +440,27 @@ class GetCollections(PreRunParseTokenMixin, actions.Action):
         )
 
         collection_to_items = {}
+        item_counts = {}
+        inflate_total_items = common_utils.should_inflate_field(
+            'total_items',
+            self.request.inflations,
+        )
         if self.request.items_per_collection:
-            collection_to_items = get_collection_id_to_items_dict(
+            # the total items are counted in the same query as the items
+            collection_to_items, item_counts = get_collection_id_to_items_dict(
                 collection_ids=collection_ids,
                 number_of_items=self.request.items_per_collection,
                 organization_id=self.parsed_token.organization_id,
                 fields=item_fields,
                 inflations=item_inflations,
             )
+            if not inflate_total_items:
+                item_counts = {}
+        elif inflate_total_items:
+            item_counts = get_total_items_for_collections(
+                collection_ids=collection_ids,
+                organization_id=self.parsed_token.organization_id,
+            )
 
         for collection in collections:
             container = self.response.collections.add()
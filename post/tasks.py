@@ -1,10 +1,16 @@
 import logging
 
+from celery.exceptions import MaxRetriesExceededError
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
 from protobufs.services.post import containers_pb2 as post_containers
 
 from services.celery import app
 
-from .models import Collection
+from .models import (
+    Collection,
+    Post,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -61,3 +67,30 @@ def ensure_default_collections():
         Collection.objects.bulk_create(collections)
     else:
         logger.info('no default collections required')
+
+
+@app.task(bind=True, max_retries=settings.POST_SERVICE_PLAIN_TEXT_MAX_RETRIES)
+def update_plain_text(self, post_id, changed=None):
+    """Extract the text from a post too large to extract when it was saved.
+
+    Args:
+        post_id (str): id of the post
+        changed (Optional[str]): when the post was saved, in ISO 8601. the task
+            is retried until the post's transaction commits.
+
+    """
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or (changed and post.changed < parse_datetime(changed)):
+        try:
+            raise self.retry(countdown=settings.POST_SERVICE_PLAIN_TEXT_DELAY)
+        except MaxRetriesExceededError:
+            # the post was deleted or its transaction rolled back
+            logger.info('post %s never committed, not extracting plain text', post_id)
+            return
+
+    post.update_plain_text()
+    # skip the update if the post was edited since
+    Post.objects.filter(pk=post_id, content=post.content).update(
+        plain_text=post.plain_text,
+        snippet_text=post.snippet_text,
+    )
@@ -1,4 +1,5 @@
-from mock import patch
+from protobufs.services.search.containers import entity_pb2
+from search.models import IndexUpdate
 from services.test import (
     fuzzy,
     TestCase,
@@ -9,48 +10,49 @@ from .. import factories
 
 class Test(TestCase):
 
-    @patch('service.control')
-    def test_post_save_signal(self, patched):
+    def _get_index_updates(self, instance, entity_type):
+        return IndexUpdate.objects.filter(
+            organization_id=instance.organization_id,
+            entity_type=entity_type,
+            entity_id=instance.id,
+        ).order_by('id')
+
+    def test_post_save_signal(self):
         instance = factories.PostFactory.build()
         instance.save()
-        self.assertEqual(patched.call_action.call_count, 1)
-        call_args = patched.call_action.call_args_list[0][1]
-        self.assertEqual(call_args['action'], 'update_entities')
-        self.assertEqual(call_args['ids'], [str(instance.id)])
+        updates = self._get_index_updates(instance, entity_pb2.POST)
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(updates[0].action, IndexUpdate.UPDATE)
         instance.title = fuzzy.FuzzyText().fuzz()
         instance.save()
-        self.assertEqual(patched.call_action.call_count, 2)
+        self.assertEqual(self._get_index_updates(instance, entity_pb2.POST).count(), 2)
 
-    @patch('service.control')
-    def test_post_delete_signal(self, patched):
+    def test_post_delete_signal(self):
         instance = factories.PostFactory.create()
         # id won't be available after we call delete
-        ids = [str(instance.id)]
+        instance_id = instance.id
         instance.delete()
-        self.assertEqual(patched.call_action.call_count, 2)
-        call_args = patched.call_action.call_args_list[1][1]
-        self.assertEqual(call_args['ids'], ids)
-        self.assertEqual(call_args['action'], 'delete_entities')
+        instance.id = instance_id
+        updates = self._get_index_updates(instance, entity_pb2.POST)
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(updates[1].action, IndexUpdate.DELETE)
 
-    @patch('service.control')
-    def test_collection_save_signal(self, patched):
+    def test_collection_save_signal(self):
         instance = factories.CollectionFactory.build()
         instance.save()
-        self.assertEqual(patched.call_action.call_count, 1)
-        call_args = patched.call_action.call_args_list[0][1]
-        self.assertEqual(call_args['action'], 'update_entities')
-        self.assertEqual(call_args['ids'], [str(instance.id)])
+        updates = self._get_index_updates(instance, entity_pb2.COLLECTION)
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(updates[0].action, IndexUpdate.UPDATE)
         instance.name = fuzzy.FuzzyText().fuzz()
         instance.save()
-        self.assertEqual(patched.call_action.call_count, 2)
+        self.assertEqual(self._get_index_updates(instance, entity_pb2.COLLECTION).count(), 2)
 
-    @patch('service.control')
-    def test_collection_delete_signal(self, patched):
+    def test_collection_delete_signal(self):
         instance = factories.CollectionFactory.create()
         # id won't be available after we call delete
-        ids = [str(instance.id)]
+        instance_id = instance.id
         instance.delete()
-        self.assertEqual(patched.call_action.call_count, 2)
-        call_args = patched.call_action.call_args_list[1][1]
-        self.assertEqual(call_args['ids'], ids)
-        self.assertEqual(call_args['action'], 'delete_entities')
+        instance.id = instance_id
+        updates = self._get_index_updates(instance, entity_pb2.COLLECTION)
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(updates[1].action, IndexUpdate.DELETE)
@@ -1,3 +1,5 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from protobufs.services.post import containers_pb2 as post_containers
 from protobufs.services.team import containers_pb2 as team_containers
 import service.control
@@ -150,6 +152,92 @@ class Test(MockedTestCase):
                 self.assertTrue(item.post.created)
                 self.assertFalse(item.post.content)
 
+    def test_get_collections_items_fetched_with_posts_in_one_query(self):
+        team = mocks.mock_team(organization_id=self.organization.id)
+        collections = factories.CollectionFactory.create_batch(size=3, team=team)
+        for collection in collections:
+            posts = factories.PostFactory.create_batch(
+                size=5,
+                organization_id=self.organization.id,
+            )
+            for index, post in enumerate(posts):
+                factories.CollectionItemFactory.create(
+                    collection=collection,
+                    source=post_containers.CollectionItemV1.LUNO,
+                    source_id=str(post.id),
+                    position=index,
+                )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.call_action(
+                'get_collections',
+                owner_id=team.id,
+                owner_type=post_containers.CollectionV1.TEAM,
+                items_per_collection=3,
+                inflations={'only': ['total_items']},
+            )
+
+        item_queries = [q for q in queries.captured_queries if 'post_collectionitem' in q['sql']]
+        self.assertEqual(len(item_queries), 1)
+        self.assertIn('post_post', item_queries[0]['sql'])
+        response_collections = response.result.collections
+        self.assertEqual(len(response_collections), len(collections))
+        for collection in response_collections:
+            self.assertEqual(collection.total_items, 5)
+            self.assertEqual([item.position for item in collection.items], [0, 1, 2])
+            for item in collection.items:
+                self.assertEqual(item.source_id, item.post.id)
+                self.assertTrue(item.post.title)
+
+    def test_get_collections_items_with_other_sources(self):
+        team = mocks.mock_team(organization_id=self.organization.id)
+        collection = factories.CollectionFactory.create(team=team)
+        post = factories.PostFactory.create(organization_id=self.organization.id)
+        factories.CollectionItemFactory.create(
+            collection=collection,
+            source=post_containers.CollectionItemV1.LUNO,
+            source_id=str(post.id),
+            position=0,
+        )
+        other_source = [s for s in post_containers.CollectionItemV1.SourceV1.values()
+                        if s != post_containers.CollectionItemV1.LUNO][0]
+        factories.CollectionItemFactory.create(
+            collection=collection,
+            source=other_source,
+            source_id='not-a-uuid',
+            position=1,
+        )
+
+        response = self.client.call_action(
+            'get_collections',
+            owner_id=team.id,
+            owner_type=post_containers.CollectionV1.TEAM,
+            items_per_collection=3,
+            inflations={'only': ['total_items']},
+        )
+        items = response.result.collections[0].items
+        self.assertEqual(len(items), 2)
+        self.assertEqual(items[0].post.id, str(post.id))
+        self.assertEqual(items[1].source_id, 'not-a-uuid')
+
+    def test_get_collections_positions_in_one_query(self):
+        team = mocks.mock_team(organization_id=self.organization.id)
+        factories.CollectionFactory.create_batch(size=5, team=team)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.call_action(
+                'get_collections',
+                owner_id=team.id,
+                owner_type=post_containers.CollectionV1.TEAM,
+            )
+
+        position_queries = [q for q in queries.captured_queries if 'row_number()' in q['sql']]
+        self.assertEqual(len(position_queries), 1)
+        self.assertEqual(
+            sorted(c.position for c in response.result.collections),
+            range(5),
+        )
+
     def test_get_collections_owned_by_profile(self):
         profile = mocks.mock_profile(organization_id=self.organization.id)
         collections = factories.CollectionFactory.create_batch(size=3, profile=profile)
@@ -1,3 +1,6 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from mock import patch
 from protobufs.services.post import containers_pb2 as post_containers
 import service.control
 
@@ -178,3 +181,39 @@ class TestPosts(MockedTestCase):
         )
         response = self.client.call_action('get_posts', all_states=True, fields={'exclude': ['snippet']})
         self.assertFalse(response.result.posts[0].snippet)
+
+    def _get_posts_page(self, page_size):
+        with patch('service.control.get_object', return_value=[]) as patched_get_object:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.call_action(
+                    'get_posts',
+                    all_states=True,
+                    control={'paginator': {'page_size': page_size}},
+                )
+        self.assertEqual(len(response.result.posts), page_size)
+        return len(queries), patched_get_object
+
+    def test_get_posts_inflates_authors_for_page(self):
+        authors = [mocks.mock_profile(organization_id=self.organization.id) for _ in range(2)]
+        for author in authors:
+            factories.PostFactory.create_batch(
+                size=2,
+                profile=author,
+                state=post_containers.LISTED,
+            )
+        few_queries, _ = self._get_posts_page(page_size=4)
+
+        for author in authors:
+            factories.PostFactory.create_batch(
+                size=20,
+                profile=author,
+                state=post_containers.LISTED,
+            )
+        many_queries, patched_get_object = self._get_posts_page(page_size=4)
+        self.assertEqual(few_queries, many_queries)
+
+        # authors are fetched once, only for the posts on the page
+        self.assertEqual(patched_get_object.call_count, 1)
+        author_ids = patched_get_object.call_args[1]['ids']
+        self.assertEqual(len(author_ids), len(set(author_ids)))
+        self.assertTrue(len(author_ids) <= 2)
@@ -0,0 +1,93 @@
+import gzip
+from io import BytesIO
+
+from django.test import Client
+from mock import patch
+from protobufs.services.post import containers_pb2 as post_containers
+
+from services.test import (
+    mocks,
+    TestCase,
+)
+from users.factories import TokenFactory
+
+from .. import (
+    documents,
+    factories,
+)
+
+
+def _decompress(compressed):
+    return gzip.GzipFile(fileobj=BytesIO(compressed)).read().decode('utf-8')
+
+
+class TestHTMLDocument(TestCase):
+
+    def setUp(self):
+        super(TestHTMLDocument, self).setUp()
+        self.organization = mocks.mock_organization()
+        self.profile = mocks.mock_profile(organization_id=self.organization.id)
+        self.post = factories.PostFactory.create(
+            profile=self.profile,
+            state=post_containers.LISTED,
+            content='<div>some content</div>',
+        )
+        self.client = Client()
+        token = TokenFactory.create()
+        self.token = mocks.mock_token(
+            auth_token=token.key,
+            organization_id=self.organization.id,
+            profile_id=self.profile.id,
+        )
+
+    def _get_document(self, **kwargs):
+        return self.client.get(
+            '/post/%s/document/' % (self.post.id,),
+            HTTP_AUTHORIZATION='Token %s' % (self.token,),
+            **kwargs
+        )
+
+    def test_html_document_cached(self):
+        document = self.post.html_document
+        self.assertIn('some content', document)
+        with patch('post.documents.render') as patched_render:
+            self.assertEqual(self.post.html_document, document)
+        self.assertFalse(patched_render.called)
+        self.assertEqual(_decompress(documents.get_compressed_document(self.post)), document)
+
+    def test_html_document_rerendered_when_post_changes(self):
+        etag = documents.get_etag(self.post.id, self.post.changed)
+        self.post.content = '<div>other content</div>'
+        self.post.save()
+        self.assertNotEqual(documents.get_etag(self.post.id, self.post.changed), etag)
+        self.assertIn('other content', self.post.html_document)
+
+    def test_get_html_document(self):
+        response = self._get_document()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode('utf-8'), self.post.html_document)
+        self.assertEqual(response['ETag'], documents.get_etag(self.post.id, self.post.changed))
+
+    def test_get_html_document_gzipped(self):
+        response = self._get_document(HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response['ETag'].endswith(';gzip"'))
+        self.assertEqual(_decompress(response.content), self.post.html_document)
+
+    def test_get_html_document_not_modified(self):
+        etag = self._get_document(HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        with patch('post.documents.render') as patched_render:
+            response = self._get_document(HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(patched_render.called)
+
+    def test_get_html_document_unlisted(self):
+        post = factories.PostFactory.create(
+            organization_id=self.organization.id,
+            state=post_containers.DRAFT,
+        )
+        response = self.client.get(
+            '/post/%s/document/' % (post.id,),
+            HTTP_AUTHORIZATION='Token %s' % (self.token,),
+        )
+        self.assertEqual(response.status_code, 403)
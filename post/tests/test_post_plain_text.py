@@ -0,0 +1,102 @@
+import datetime
+
+from celery.exceptions import (
+    MaxRetriesExceededError,
+    Retry,
+)
+from django.core.management import call_command
+from django.test import override_settings
+from mock import patch
+
+from services.test import (
+    fuzzy,
+    TestCase,
+)
+
+from .. import (
+    factories,
+    models,
+    tasks,
+)
+
+
+class TestPostPlainText(TestCase):
+
+    def test_plain_text_extracted_on_save(self):
+        post = factories.PostFactory.create(content='<div>some <b>content</b></div>')
+        post = models.Post.objects.get(pk=post.pk)
+        self.assertEqual(post.plain_text, 'some content')
+        self.assertEqual(post.snippet, 'some content')
+
+    def test_plain_text_extracted_when_content_changes(self):
+        post = factories.PostFactory.create(content='<div>some content</div>')
+        post = models.Post.objects.get(pk=post.pk)
+        post.content = '<div>other content</div>'
+        post.save()
+        post = models.Post.objects.get(pk=post.pk)
+        self.assertEqual(post.plain_text, 'other content')
+
+    def test_snippet_read_from_stored_text(self):
+        post = factories.PostFactory.create(content='<div>%s</div>' % ('a' * 200,))
+        post = models.Post.objects.get(pk=post.pk)
+        self.assertEqual(len(post.snippet_text), models.SNIPPET_LENGTH)
+        with patch('post.models.transform_html') as patched_transform_html:
+            self.assertEqual(post.snippet, 'a' * models.SNIPPET_LENGTH)
+        self.assertFalse(patched_transform_html.called)
+
+    @override_settings(POST_SERVICE_PLAIN_TEXT_MAX_SYNC_LENGTH=10)
+    def test_plain_text_extracted_asynchronously_for_large_posts(self):
+        with patch('post.tasks.update_plain_text.apply_async') as patched_apply_async:
+            post = factories.PostFactory.create(content='<div>some large content</div>')
+        self.assertIsNone(models.Post.objects.get(pk=post.pk).plain_text)
+        self.assertEqual(
+            patched_apply_async.call_args[0][0],
+            (str(post.pk), post.changed.isoformat()),
+        )
+
+        # snippets are still available before the text is extracted
+        self.assertEqual(post.snippet, 'some large content')
+
+        tasks.update_plain_text(*patched_apply_async.call_args[0][0])
+        self.assertEqual(models.Post.objects.get(pk=post.pk).plain_text, 'some large content')
+
+    def test_update_plain_text_retries_until_committed(self):
+        post = factories.PostFactory.create(content='<div>some content</div>')
+        with patch.object(tasks.update_plain_text, 'retry', return_value=Retry()) as patched:
+            # the post hasn't been committed yet
+            with self.assertRaises(Retry):
+                tasks.update_plain_text(str(fuzzy.uuid()))
+            # the saved version of the post hasn't been committed yet
+            changed = (post.changed + datetime.timedelta(seconds=1)).isoformat()
+            with self.assertRaises(Retry):
+                tasks.update_plain_text(str(post.pk), changed)
+        self.assertEqual(patched.call_count, 2)
+
+    def test_update_plain_text_gives_up_when_retries_exhausted(self):
+        with patch.object(
+            tasks.update_plain_text,
+            'retry',
+            side_effect=MaxRetriesExceededError(),
+        ) as patched:
+            self.assertIsNone(tasks.update_plain_text(str(fuzzy.uuid())))
+        self.assertEqual(patched.call_count, 1)
+
+    def test_deferred_content_unchanged(self):
+        post = factories.PostFactory.create(content='<div>some content</div>')
+        post = models.Post.objects.defer('content').get(pk=post.pk)
+        post.title = 'new title'
+        with patch('post.models.transform_html') as patched_transform_html:
+            post.save()
+            # loading deferred content doesn't change it
+            self.assertEqual(post.content, '<div>some content</div>')
+            post.save()
+        self.assertFalse(patched_transform_html.called)
+        self.assertEqual(models.Post.objects.get(pk=post.pk).plain_text, 'some content')
+
+    def test_backfill_post_text(self):
+        posts = factories.PostFactory.create_batch(size=3, content='<div>some content</div>')
+        models.Post.objects.update(plain_text=None, snippet_text=None)
+        call_command('backfill_post_text', chunk_size=2)
+        for post in models.Post.objects.filter(pk__in=[p.pk for p in posts]):
+            self.assertEqual(post.plain_text, 'some content')
+            self.assertEqual(post.snippet_text, 'some content')
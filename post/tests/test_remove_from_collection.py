@@ -41,7 +41,7 @@ class Test(MockedTestCase):
         ).exists())
         remaining_items = models.CollectionItem.objects.filter(
             collection_id=collection.id,
-        ).order_by('position')
+        ).order_by('sort_key')
         for index, item in enumerate(remaining_items):
             self.assertEqual(item.position, index)
 
@@ -116,7 +116,7 @@ class Test(MockedTestCase):
             len(items) - 2,
         )
         verify_items = models.CollectionItem.objects.filter(collection_id=collection.id).order_by(
-            'position'
+            'sort_key'
         )
         self.assertEqual(len(verify_items), len(items) - 2)
         for index, item in enumerate(verify_items):
@@ -147,7 +147,7 @@ class Test(MockedTestCase):
             len(items) - 1,
         )
         verify_items = models.CollectionItem.objects.filter(collection_id=collection.id).order_by(
-            'position'
+            'sort_key'
         )
         self.assertEqual(len(verify_items), len(items) - 1)
         for index, item in enumerate(verify_items):
@@ -1,3 +1,5 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from protobufs.services.post.containers_pb2 import PositionDiffV1
 from protobufs.services.team import containers_pb2 as team_containers
 import service.control
@@ -11,6 +13,7 @@ from services.test import (
 from .. import (
     factories,
     models,
+    ordering,
 )
 from .helpers import (
     mock_get_teams,
@@ -59,7 +62,7 @@ class Test(MockedTestCase):
 
         instances = models.CollectionItem.objects.filter(
             collection_id=collection.id,
-        ).order_by('position')
+        ).order_by('sort_key')
         instance_id_to_dict = dict((str(item.id), item) for item in instances)
 
         # verify all the original items were resorted
@@ -210,7 +213,7 @@ class Test(MockedTestCase):
 
         instances = models.CollectionItem.objects.filter(
             collection_id=collection.id,
-        ).order_by('position')
+        ).order_by('sort_key')
         instance_id_to_dict = dict((str(item.id), item) for item in instances)
 
         # verify all the original items were resorted
@@ -237,3 +240,57 @@ class Test(MockedTestCase):
                 self.assertEqual(updated_item.position, 4)
             elif index == 6:
                 self.assertEqual(updated_item.position, 5)
+
+    def test_reorder_collection_only_writes_moved_item(self):
+        collection = factories.CollectionFactory.create(profile=self.profile)
+        items = factories.CollectionItemFactory.create_protobufs(size=10, collection=collection)
+
+        item = items[-1]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.call_action(
+                'reorder_collection',
+                collection_id=str(collection.id),
+                diffs=[mock_position_diff(
+                    item_id=item.id,
+                    current_position=item.position,
+                    new_position=0,
+                )],
+            )
+
+        updates = [q for q in queries.captured_queries
+                   if q['sql'].startswith('UPDATE "post_collectionitem"')]
+        self.assertEqual(len(updates), 1)
+        instances = models.CollectionItem.objects.filter(
+            collection_id=collection.id,
+        ).order_by('sort_key')
+        self.assertEqual(
+            [str(i.id) for i in instances],
+            [item.id] + [i.id for i in items[:-1]],
+        )
+        self.assertEqual([i.position for i in instances], range(len(items)))
+
+    def test_reorder_collection_renumbers_when_out_of_room(self):
+        collection = factories.CollectionFactory.create(profile=self.profile)
+        items = [
+            factories.CollectionItemFactory.create(collection=collection, sort_key=sort_key)
+            for sort_key in range(3)
+        ]
+
+        # there's no room between the first two items
+        item = items[-1]
+        self.client.call_action(
+            'reorder_collection',
+            collection_id=str(collection.id),
+            diffs=[mock_position_diff(item_id=str(item.id), current_position=2, new_position=1)],
+        )
+
+        instances = models.CollectionItem.objects.filter(
+            collection_id=collection.id,
+        ).order_by('sort_key')
+        self.assertEqual([i.id for i in instances], [items[0].id, items[2].id, items[1].id])
+        self.assertEqual([i.position for i in instances], [0, 1, 2])
+        sort_keys = [i.sort_key for i in instances]
+        self.assertTrue(all(
+            after - before >= ordering.POSITION_GAP / 2
+            for before, after in zip(sort_keys, sort_keys[1:])
+        ))
@@ -65,7 +65,7 @@ class Test(MockedTestCase):
             by_profile_id=self.profile.id,
             owner_type=owner_type if owner_type else post_containers.CollectionV1.PROFILE,
             owner_id=owner_id if owner_id else self.profile.id,
-        ).order_by('position')
+        ).order_by('sort_key')
         collections_by_id = dict((str(collection.id), collection) for collection in instances)
 
         # verify all the original collections were resorted
@@ -209,7 +209,7 @@ class Test(MockedTestCase):
             by_profile_id=self.profile.id,
             owner_type=post_containers.CollectionV1.PROFILE,
             owner_id=self.profile.id,
-        ).order_by('position')
+        ).order_by('sort_key')
         collections_by_id = dict((str(collection.id), collection) for collection in instances)
 
         # verify all the original collections were resorted
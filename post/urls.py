@@ -0,0 +1,11 @@
+from django.conf.urls import url
+
+from . import views
+
+urlpatterns = [
+    url(
+        r'^(?P<post_id>[0-9a-f-]{32,36})/document/$',
+        views.HTMLDocumentView.as_view(),
+        name='post-html-document',
+    ),
+]
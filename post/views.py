@@ -0,0 +1,83 @@
+import re
+
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+)
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from protobufs.services.post import containers_pb2 as post_containers
+from rest_framework import exceptions
+from rest_framework.views import APIView
+
+from services import utils
+from services.token import parse_token
+
+from . import (
+    documents,
+    models,
+)
+
+re_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+class HTMLDocumentView(APIView):
+    """Serve a post's rendered `html_document`.
+
+    Responses carry an ETag identifying the rendered version of the post, so
+    clients can revalidate without the document being rendered or compressed
+    again. Documents are served precompressed to clients that accept gzip.
+
+    """
+
+    def _get_parsed_token(self, request):
+        if not request.auth:
+            raise exceptions.NotAuthenticated()
+        return parse_token(request.successful_authenticator.get_token(request))
+
+    def _get_post(self, post_id, parsed_token):
+        try:
+            post = models.Post.objects.only(
+                'id',
+                'changed',
+                'state',
+                'by_profile_id',
+            ).get(pk=post_id, organization_id=parsed_token.organization_id)
+        except models.Post.DoesNotExist:
+            raise Http404
+
+        unlisted = post.state in [post_containers.UNLISTED, post_containers.DRAFT]
+        is_author = utils.matching_uuids(post.by_profile_id, parsed_token.profile_id)
+        if unlisted and not is_author:
+            raise exceptions.PermissionDenied()
+        return post
+
+    def get(self, request, post_id, *args, **kwargs):
+        parsed_token = self._get_parsed_token(request)
+        post = self._get_post(post_id, parsed_token)
+        etag = documents.get_etag(post.pk, post.changed)
+        gzipped = bool(re_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+        # match the ETags `GZipMiddleware` would have sent
+        if_none_match = [
+            tag.replace(';gzip', '') for tag in
+            parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        ]
+        if etag.strip('"') in if_none_match:
+            response = HttpResponseNotModified()
+        elif gzipped:
+            response = HttpResponse(
+                documents.get_compressed_document(post),
+                content_type='text/html; charset=utf-8',
+            )
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(
+                documents.get_document(post),
+                content_type='text/html; charset=utf-8',
+            )
+
+        response['ETag'] = re.sub('"$', ';gzip"', etag) if gzipped else etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
@@ -3,7 +3,10 @@ from service import (
     validators,
 )
 from services.mixins import PreRunParseTokenMixin
-from .. import models
+from .. import (
+    models,
+    recents,
+)
 
 
 class Action(PreRunParseTokenMixin, actions.Action):
@@ -24,3 +27,9 @@ class Action(PreRunParseTokenMixin, actions.Action):
             raise self.ActionFieldError('id', 'DOES_NOT_EXIST')
         else:
             r.delete()
+            recents.remove(
+                organization_id=r.organization_id,
+                by_profile_id=r.by_profile_id,
+                document_type=r.document_type,
+                document_id=r.document_id,
+            )
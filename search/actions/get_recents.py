@@ -1,12 +1,14 @@
 import logging
 
-from protobuf_to_dict import dict_to_protobuf
 from elasticsearch_dsl import connections
 from service import actions
 from services.mixins import PreRunParseTokenMixin
 from ..stores.es.indices.organization.actions import get_read_alias
 from ..stores.es import types
-from .. import models
+from ..stores.es.plans import get_excluded_source_fields
+from ..stores.postgres import actions as postgres
+from .. import recents
+from ..instrumentation import PhaseTimer
 
 logger = logging.getLogger(__name__)
 
@@ -14,19 +16,41 @@ logger = logging.getLogger(__name__)
 class Action(PreRunParseTokenMixin, actions.Action):
 
     def run(self, *args, **kwargs):
-        recents = models.Recent.objects.filter(
-            organization_id=self.parsed_token.organization_id,
-            by_profile_id=self.parsed_token.profile_id,
-        ).order_by('-changed')
+        timer = PhaseTimer('search.get_recents')
+        with timer.phase('recents_lookup'):
+            documents = recents.get_recents(
+                organization_id=self.parsed_token.organization_id,
+                by_profile_id=self.parsed_token.profile_id,
+            )
 
         docs = []
-        for recent in self.get_paginated_objects(recents):
-            docs.append({'_type': recent.document_type, '_id': str(recent.document_id)})
+        for document_type, document_id in self.get_paginated_objects(documents):
+            doc = {'_type': document_type, '_id': document_id}
+            excluded_source_fields = get_excluded_source_fields(document_type)
+            if excluded_source_fields:
+                doc['_source'] = {'exclude': excluded_source_fields}
+            docs.append(doc)
+
+        if not docs:
+            timer.finish(organization_id=self.parsed_token.organization_id)
+            return
+
+        if postgres.is_primary():
+            with timer.phase('postgres'):
+                found_docs = postgres.get_documents(
+                    self.parsed_token.organization_id,
+                    [(doc['_type'], doc['_id']) for doc in docs],
+                )
+        else:
+            read_alias = get_read_alias(self.parsed_token.organization_id)
+            es = connections.connections.get_connection()
+            with timer.phase('es_network'):
+                found_docs = es.mget(index=read_alias, body={'docs': docs})['docs']
+
+        for doc in found_docs:
+            if not doc.get('found'):
+                continue
 
-        read_alias = get_read_alias(self.parsed_token.organization_id)
-        es = connections.connections.get_connection()
-        response = es.mget(index=read_alias, body={'docs': docs})
-        for doc in response['docs']:
             doc_type = doc['_type']
             object_type = types.get_doc_type_with_name(doc_type)
 
@@ -41,6 +65,7 @@ class Action(PreRunParseTokenMixin, actions.Action):
                 logger.warn('object_type: "%s" does not exist', object_type)
                 continue
 
-            data = doc['_source']
-            object_type.prepare_protobuf_dict(data)
-            dict_to_protobuf(data, result_object)
+            with timer.phase('decode'):
+                object_type.decode_source(doc['_source'], result_object)
+
+        timer.finish(organization_id=self.parsed_token.organization_id, body={'docs': docs})
@@ -1,39 +1,322 @@
-from elasticsearch.helpers import reindex
+"""Migrate organizations between indices without downtime.
+
+Migrating an organization:
+
+    1. creates the organization's index for the new version (or adds its
+       aliases to a shared index). the write alias now points at both the old
+       and new index, so updates are written to both while we migrate.
+    2. copies the documents from the old index into the new one. The copy is
+       split into slices, one per shard of the old index, and the slices are
+       copied in parallel. Completed slices are checkpointed in redis, so a
+       restarted migration only copies the slices that didn't finish.
+       Documents are copied with their version in the old index, so a newer
+       version that was dual-written during the migration is never
+       overwritten.
+    3. waits for the document counts of the two indices to match and then
+       atomically swaps the read alias over and removes the old index from
+       the write alias.
+
+Copying is throttled to `SEARCH_SERVICE_MIGRATION_MAX_DOCS_PER_SECOND` so
+migrations don't hurt live search latency.
+
+"""
+import logging
+from multiprocessing.pool import ThreadPool
+import re
+import threading
+import time
+
+from django.conf import settings
+from elasticsearch.helpers import scan
 from elasticsearch_dsl import connections
+import redis
 
+from services.cache import get_redis_client
+
+from .. import (
+    cache,
+    indexer,
+)
 from ..stores.es.indices.organization import INDEX_VERSION
 from ..stores.es.indices.organization.actions import (
     create_index,
     get_read_alias,
+    get_read_alias_options,
+    get_routing,
     get_write_alias,
+    is_shared_index,
 )
+from ..tasks import schedule_warm_search_cache
 
+logger = logging.getLogger(__name__)
 
-def get_indices_to_migrate(current_version=INDEX_VERSION):
+INDEX_VERSION_RE = re.compile(r'_v(\d+)$')
+
+# number of seconds to keep a migration's checkpoint
+CHECKPOINT_TIMEOUT = 60 * 60 * 24 * 7
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Throttle(object):
+    """Limit the rate of an operation across threads.
+
+    Args:
+        rate (Optional[float]): max number of operations per second. None
+            disables throttling.
+
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.next_time = time.time()
+
+    def wait(self, count=1):
+        if not self.rate:
+            return
+
+        with self.lock:
+            now = time.time()
+            delay = self.next_time - now
+            self.next_time = max(self.next_time, now) + count / float(self.rate)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _get_indices():
     es = connections.connections.get_connection()
-    indices = es.cat.indices(h='index').split(' \n')
-    is_old_index = lambda index: (
-        len(index) > 3 and
-        index[-2] == 'v' and
-        not index.endswith(str(current_version))
+    return es.indices.get_alias(index='*').keys()
+
+
+def get_index_version(index_name):
+    match = INDEX_VERSION_RE.search(index_name)
+    if match:
+        return int(match.group(1))
+
+
+def get_indices_to_migrate(current_version=INDEX_VERSION):
+    is_old_index = lambda index: get_index_version(index) not in (None, current_version)
+    return sorted(index for index in _get_indices() if is_old_index(index))
+
+
+def get_organization_indices():
+    """Return the indices that belong to a single organization."""
+    return sorted(
+        index for index in _get_indices()
+        if get_index_version(index) is not None and not is_shared_index(index)
     )
-    return [index for index in indices if is_old_index(index)]
 
 
-def migrate_index(index_name, current_version=INDEX_VERSION):
-    organization_id, version = index_name.split('_')
+def get_organization_ids(index_name):
+    """Return the ids of the organizations with documents in the index."""
+    es = connections.connections.get_connection()
+    aliases = es.indices.get_alias(index=index_name).get(index_name, {}).get('aliases', {})
+    return sorted(set(alias.rsplit('-', 1)[0] for alias in aliases))
+
+
+def get_checkpoint_key(organization_id, source_index, target_index):
+    return 'search:migrations:%s:%s:%s' % (organization_id, source_index, target_index)
+
+
+def _get_completed_slices(key):
+    try:
+        return set(int(value) for value in get_redis_client().smembers(key))
+    except redis.RedisError:
+        logger.exception('failed to fetch migration checkpoint')
+        return set()
+
+
+def _complete_slice(key, slice_id):
+    client = get_redis_client()
+    try:
+        client.pipeline().sadd(key, slice_id).expire(key, CHECKPOINT_TIMEOUT).execute()
+    except redis.RedisError:
+        logger.exception('failed to checkpoint migration')
+
+
+def _get_query(index_name, organization_id):
+    if is_shared_index(index_name):
+        return {'query': {'term': {'organization_id': str(organization_id)}}}
+    return {'query': {'match_all': {}}}
+
+
+def _get_search_kwargs(index_name, organization_id):
+    kwargs = {'index': index_name}
+    routing = get_routing(index_name, organization_id)
+    if routing:
+        kwargs['routing'] = routing
+    return kwargs
+
+
+def _get_slices(es, index_name, organization_id):
+    """Return the slices to copy the organization's documents in.
+
+    Each shard of a per organization index is a slice. Documents in shared
+    indices are routed to a single shard, so they're copied in one slice.
+
+    """
+    if is_shared_index(index_name):
+        return [0]
+
+    response = es.indices.get_settings(index=index_name, name='index.number_of_shards')
+    shards = int(response[index_name]['settings']['index']['number_of_shards'])
+    return range(shards)
+
+
+def _copy_slice(es, organization_id, source_index, target_index, slice_id, throttle):
+    scan_kwargs = _get_search_kwargs(source_index, organization_id)
+    if not is_shared_index(source_index):
+        scan_kwargs['preference'] = '_shards:%s' % (slice_id,)
+
+    def _generate_actions():
+        documents = scan(
+            es,
+            query=_get_query(source_index, organization_id),
+            version=True,
+            **scan_kwargs
+        )
+        routing = get_routing(target_index, organization_id)
+        for document in documents:
+            throttle.wait()
+            source = document['_source']
+            # read aliases on shared indices are filtered by organization_id
+            source.setdefault('organization_id', str(organization_id))
+            action = {
+                '_index': target_index,
+                '_type': document['_type'],
+                '_id': document['_id'],
+                '_source': source,
+                # unlike indexing, writing the same version again means the
+                # document was already written to the new index
+                '_version': document['_version'],
+                '_version_type': 'external',
+            }
+            if routing:
+                action['_routing'] = routing
+            yield action
+
+    # documents written through the write alias during the migration are
+    # newer than the copy and are counted as conflicts rather than failures
+    stats = indexer.bulk(es, _generate_actions())
+    for failure in stats.failures:
+        logger.error('failed to copy document: %s', failure)
+    return stats.failures
+
+
+def _copy_documents(es, organization_id, source_index, target_index, workers=None):
+    workers = workers or settings.SEARCH_SERVICE_MIGRATION_WORKERS
+    checkpoint_key = get_checkpoint_key(organization_id, source_index, target_index)
+    completed = _get_completed_slices(checkpoint_key)
+    slices = [s for s in _get_slices(es, source_index, organization_id) if s not in completed]
+    throttle = Throttle(settings.SEARCH_SERVICE_MIGRATION_MAX_DOCS_PER_SECOND)
+
+    def _copy(slice_id):
+        failures = _copy_slice(es, organization_id, source_index, target_index, slice_id, throttle)
+        if not failures:
+            _complete_slice(checkpoint_key, slice_id)
+        return failures
+
+    pool = ThreadPool(min(workers, len(slices) or 1))
+    try:
+        failures = sum(pool.map(_copy, slices), [])
+    finally:
+        pool.close()
+        pool.join()
+
+    if failures:
+        raise MigrationError(
+            'failed to copy %s documents from %s to %s' % (len(failures), source_index, target_index)
+        )
+    return checkpoint_key
+
+
+def _count(es, index_name, organization_id):
+    return es.count(body=_get_query(index_name, organization_id), **_get_search_kwargs(
+        index_name,
+        organization_id,
+    ))['count']
+
+
+def _wait_for_counts(es, organization_id, source_index, target_index, attempts=None):
+    attempts = attempts or settings.SEARCH_SERVICE_MIGRATION_CONVERGE_ATTEMPTS
+    for attempt in xrange(attempts):
+        if attempt:
+            time.sleep(1)
+        es.indices.refresh(index='%s,%s' % (source_index, target_index))
+        source_count = _count(es, source_index, organization_id)
+        target_count = _count(es, target_index, organization_id)
+        if source_count == target_count:
+            return source_count
+
+    raise MigrationError('document counts for %s did not converge: %s (%s) != %s (%s)' % (
+        organization_id,
+        source_index,
+        source_count,
+        target_index,
+        target_count,
+    ))
+
+
+def migrate_organization(organization_id, index_name, current_version=INDEX_VERSION):
+    """Move the organization's documents from `index_name` to its current index.
+
+    The organization's current index is its own index or a shared index
+    depending on `SEARCH_SERVICE_SHARED_INDEX_COUNT`, so this is also how
+    organizations are moved between the per organization and shared layouts.
+
+    Raises:
+        MigrationError: if documents failed to copy or the document counts
+            didn't converge. the organization keeps reading from the old index
+            and writing to both, and migrating again resumes the copy.
+
+    """
     new_index = create_index(organization_id, version=current_version, check_duplicate=False)
+    if new_index._name == index_name:
+        return new_index
+
     es = connections.connections.get_connection()
-    reindex(es, source_index=index_name, target_index=new_index._name)
+    checkpoint_key = _copy_documents(es, organization_id, index_name, new_index._name)
+    _wait_for_counts(es, organization_id, index_name, new_index._name)
     # adjust the read and write aliases
     read_alias = get_read_alias(organization_id)
     write_alias = get_write_alias(organization_id)
     es.indices.update_aliases(body={
         'actions': [
             {'remove': {'index': index_name, 'alias': read_alias}},
-            {'add': {'index': new_index._name, 'alias': read_alias}},
+            {'add': dict(
+                {'index': new_index._name, 'alias': read_alias},
+                **get_read_alias_options(new_index._name, organization_id)
+            )},
             {'remove': {'index': index_name, 'alias': write_alias}},
         ]
     })
-    es.indices.delete(index_name)
+    cache.invalidate_write_indices(organization_id)
+    cache.bump_generation(organization_id)
+    schedule_warm_search_cache(organization_id)
+    try:
+        get_redis_client().delete(checkpoint_key)
+    except redis.RedisError:
+        logger.exception('failed to clear migration checkpoint')
+    return new_index
+
+
+def migrate_index(index_name, current_version=INDEX_VERSION):
+    """Move every organization in the index to its current index and delete it."""
+    if is_shared_index(index_name):
+        organization_ids = get_organization_ids(index_name)
+    else:
+        organization_ids = [index_name.split('_')[0]]
+
+    new_index = None
+    remaining = False
+    for organization_id in organization_ids:
+        new_index = migrate_organization(organization_id, index_name, current_version)
+        remaining = remaining or new_index._name == index_name
+
+    if not remaining:
+        es = connections.connections.get_connection()
+        es.indices.delete(index_name)
     return new_index
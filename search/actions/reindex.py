@@ -0,0 +1,305 @@
+"""Stream an organization's entities from the database into its search index.
+
+Rather than driving `update_entities` through paginated service calls, we
+stream primary keys with a server-side cursor, load and convert the entities
+in chunks and send them to ES with `indexer.parallel_bulk`. Entities are
+loaded in the calling thread only as fast as the bulk requests are sent, so an
+organization is never held in memory. Chunks are also written to the Postgres
+store when it's enabled.
+
+"""
+from collections import (
+    defaultdict,
+    OrderedDict,
+)
+from contextlib import contextmanager
+import logging
+import time
+import uuid
+
+from django.db import (
+    connections,
+    transaction,
+)
+from elasticsearch_dsl import connections as es_connections
+from protobuf_to_dict import protobuf_to_dict
+from protobufs.services.post import containers_pb2 as post_containers
+import service.control
+
+from organizations.models import Location
+from post.models import (
+    Collection,
+    Post,
+)
+from profiles.models import Profile
+from services.token import make_admin_token
+from team.models import Team
+
+from .. import (
+    cache,
+    indexer,
+)
+from ..stores.es.indices.organization.actions import (
+    get_routing,
+    is_shared_index,
+)
+from ..stores.es.types.collection.document import CollectionV1
+from ..stores.es.types.location.document import LocationV1
+from ..stores.es.types.post.document import PostV1
+from ..stores.es.types.profile.document import ProfileV1
+from ..stores.es.types.team.document import TeamV1
+from ..stores.postgres import actions as postgres
+from ..tasks import (
+    _get_update_action,
+    _get_write_indices_for_organization_id,
+    prime_post_text,
+    schedule_warm_search_cache,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_WORKERS = 4
+
+
+def stream_ids(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield chunks of primary keys for the queryset using a server-side cursor.
+
+    Django doesn't support server-side cursors, so we compile the query and
+    execute it with a named psycopg2 cursor. Named cursors must be used within
+    a transaction.
+
+    """
+    queryset = queryset.order_by().values_list('pk', flat=True)
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    connection = connections[queryset.db]
+    with transaction.atomic(using=queryset.db):
+        connection.ensure_connection()
+        cursor = connection.connection.cursor(name='stream_ids_%s' % (uuid.uuid4().hex,))
+        cursor.itersize = chunk_size
+        try:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [row[0] for row in rows]
+        finally:
+            cursor.close()
+
+
+def _get_profile_protobufs(ids, token):
+    response = service.control.call_action(
+        service='organization',
+        action='get_teams_for_profile_ids',
+        client_kwargs={'token': token},
+        profile_ids=[str(_id) for _id in ids],
+        fields={'only': ['name']},
+    )
+    profiles_teams = dict((p.profile_id, p.team) for p in response.result.profiles_teams)
+    protobufs = []
+    for profile in Profile.objects.nocache().filter(pk__in=ids):
+        team = profiles_teams.get(str(profile.id))
+        display_title = profile.get_display_title(team) if team else profile.title
+        protobufs.append(profile.to_protobuf(
+            inflations={'disabled': True},
+            display_title=display_title,
+        ))
+    return protobufs
+
+
+def _get_team_protobufs(ids, token):
+    return [team.to_protobuf(inflations={'disabled': True}) for team in
+            Team.objects.filter(pk__in=ids)]
+
+
+def _get_location_protobufs(ids, token):
+    return [location.to_protobuf(inflations={'disabled': True}) for location in
+            Location.objects.nocache().filter(pk__in=ids)]
+
+
+def _get_post_protobufs(ids, token):
+    posts = list(Post.objects.filter(pk__in=ids))
+    prime_post_text((post.content, post.plain_text) for post in posts)
+    author_ids = set(post.by_profile_id for post in posts)
+    authors = dict(
+        (profile.id, protobuf_to_dict(profile)) for profile
+        in _get_profile_protobufs(list(author_ids), token)
+    )
+    return [post.to_protobuf(
+        inflations={'only': ['by_profile']},
+        by_profile=authors.get(str(post.by_profile_id), {}),
+    ) for post in posts]
+
+
+def _get_collection_protobufs(ids, token):
+    return [collection.to_protobuf(inflations={'disabled': True}) for collection in
+            Collection.objects.filter(pk__in=ids)]
+
+
+# entity name -> (document type, queryset builder, protobuf loader)
+ENTITY_TYPES = OrderedDict([
+    ('profiles', (
+        ProfileV1,
+        lambda organization_id: Profile.objects.filter(organization_id=organization_id),
+        _get_profile_protobufs,
+    )),
+    ('teams', (
+        TeamV1,
+        lambda organization_id: Team.objects.filter(organization_id=organization_id),
+        _get_team_protobufs,
+    )),
+    ('locations', (
+        LocationV1,
+        lambda organization_id: Location.objects.filter(organization_id=organization_id),
+        _get_location_protobufs,
+    )),
+    ('posts', (
+        PostV1,
+        lambda organization_id: Post.objects.filter(
+            organization_id=organization_id,
+            state=post_containers.LISTED,
+        ),
+        _get_post_protobufs,
+    )),
+    ('collections', (
+        CollectionV1,
+        lambda organization_id: Collection.objects.filter(organization_id=organization_id),
+        _get_collection_protobufs,
+    )),
+])
+
+
+class ReindexStats(object):
+
+    def __init__(self):
+        self.start = time.time()
+        self.end = None
+        # documents loaded and sent to each write index
+        self.documents = defaultdict(int)
+        # writes ES rejected
+        self.failures = defaultdict(int)
+        # documents a newer version was indexed for while we were reindexing
+        self.conflicts = 0
+        self.bytes = 0
+
+    def finish(self):
+        self.end = time.time()
+
+    @property
+    def duration(self):
+        return (self.end or time.time()) - self.start
+
+    @property
+    def total_documents(self):
+        return sum(self.documents.values())
+
+    @property
+    def documents_per_second(self):
+        return self.total_documents / (self.duration or 1)
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / (self.duration or 1)
+
+
+@contextmanager
+def refresh_disabled(es, indices):
+    """Disable refreshing the indices while we load documents.
+
+    Shared indices are left alone since other organizations are searching them.
+
+    """
+    indices = [name for name in indices if not is_shared_index(name)]
+    if not indices:
+        yield
+        return
+
+    index = ','.join(indices)
+    current = es.indices.get_settings(index=index, name='index.refresh_interval')
+    es.indices.put_settings(index=index, body={'index': {'refresh_interval': '-1'}})
+    try:
+        yield
+    finally:
+        for name in indices:
+            refresh_interval = current.get(name, {}).get('settings', {}).get('index', {}).get(
+                'refresh_interval',
+                '1s',
+            )
+            es.indices.put_settings(
+                index=name,
+                body={'index': {'refresh_interval': refresh_interval}},
+            )
+        es.indices.refresh(index=index)
+
+
+def _generate_actions(organization_id, entity_types, indices, stats, chunk_size):
+    token = make_admin_token(organization_id=organization_id)
+    for entity_type in entity_types:
+        document_type, get_queryset, get_protobufs = ENTITY_TYPES[entity_type]
+        for ids in stream_ids(get_queryset(organization_id), chunk_size=chunk_size):
+            documents = [_get_update_action(document_type, p) for p in get_protobufs(ids, token)]
+            if postgres.is_enabled():
+                postgres.bulk(organization_id, documents)
+            stats.documents[document_type._doc_type.name] += len(documents)
+
+            for document in documents:
+                for index in indices:
+                    action = document.copy()
+                    action['_index'] = index
+                    routing = get_routing(index, organization_id)
+                    if routing:
+                        action['_routing'] = routing
+                    yield action
+
+
+def reindex_organization(
+        organization_id,
+        entity_types=None,
+        workers=DEFAULT_WORKERS,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+    ):
+    """Stream all of the organization's entities into its write indices.
+
+    Args:
+        organization_id (str): id of the organization
+        entity_types (Optional[list]): names of the entity types to index, see
+            `ENTITY_TYPES`. defaults to all entity types.
+        workers (Optional[int]): number of threads sending bulk requests
+        chunk_size (Optional[int]): number of entities to load at a time and
+            max number of documents per bulk request
+
+    Returns:
+        ReindexStats
+
+    """
+    entity_types = entity_types or ENTITY_TYPES.keys()
+    for entity_type in entity_types:
+        if entity_type not in ENTITY_TYPES:
+            raise ValueError('unsupported entity type: %s' % (entity_type,))
+
+    es = es_connections.connections.get_connection()
+    indices = []
+    if not postgres.is_primary():
+        indices = _get_write_indices_for_organization_id(es, organization_id)
+    stats = ReindexStats()
+    actions = _generate_actions(organization_id, entity_types, indices, stats, chunk_size)
+    with refresh_disabled(es, indices):
+        bulk_stats = indexer.parallel_bulk(
+            es,
+            actions,
+            workers,
+            max_actions=chunk_size,
+        )
+
+    stats.bytes = bulk_stats.bytes
+    stats.conflicts = bulk_stats.conflicts
+    for failure in bulk_stats.failures:
+        result = failure.values()[0]
+        stats.failures[result['_type']] += 1
+        logger.error('failed to index document: %s', result)
+
+    cache.bump_generation(organization_id)
+    schedule_warm_search_cache(organization_id)
+    stats.finish()
+    return stats
@@ -1,161 +1,241 @@
 import logging
-import time
 
-from elasticsearch_dsl import (
-    Search,
-    Q,
-)
-from protobuf_to_dict import dict_to_protobuf
+from django.conf import settings
+from elasticsearch.exceptions import TransportError
+from elasticsearch_dsl import connections
 from protobufs.services.search.containers import search_pb2
-from service import actions
+from service import (
+    actions,
+    metrics,
+)
 
 from services.mixins import PreRunParseTokenMixin
-from ..stores.es import types
+from .. import (
+    cache,
+    query_log,
+)
+from ..instrumentation import PhaseTimer
+from ..stores.es import (
+    health,
+    types,
+)
 from ..stores.es.indices.organization.actions import get_read_alias
-from ..stores.es.types.collection import actions as collection_actions
-from ..stores.es.types.post import actions as post_actions
-from ..stores.es.types.profile import actions as profile_actions
-from ..stores.es.types.team import actions as team_actions
+from ..stores.es.plans import (
+    get_multi_search_plan,
+    get_query_plan,
+)
+from ..stores.postgres import actions as postgres
 
 logger = logging.getLogger(__name__)
 
-CATEGORY_TO_ACTIONS = {
-    search_pb2.POSTS: [post_actions],
-    search_pb2.PROFILES: [profile_actions],
-    search_pb2.TEAMS: [team_actions],
-    search_pb2.COLLECTIONS: [collection_actions],
-}
-
-
-def _combine_statements(statement_funcs, query):
-    statements = []
-    for func in statement_funcs:
-        for statement in func(query):
-            if statement not in statements:
-                statements.append(statement)
-    return statements
-
 
 class Action(PreRunParseTokenMixin, actions.Action):
 
     required_fields = ('query',)
 
-    def _get_doc_type(self):
-        if self.request.category == search_pb2.ALL:
-            return None
-
-        doc_types = []
-        if self.request.category == search_pb2.PROFILES:
-            doc_types.append(types.ProfileV1._doc_type.name)
-        elif self.request.category == search_pb2.TEAMS:
-            doc_types.append(types.TeamV1._doc_type.name)
-        elif self.request.category == search_pb2.POSTS:
-            doc_types.append(types.PostV1._doc_type.name)
-        elif self.request.category == search_pb2.COLLECTIONS:
-            doc_types.append(types.CollectionV1._doc_type.name)
-        return ','.join(doc_types) or None
-
-    def _get_statements(self, statement_type):
-        actions = []
-        if self.request.category == search_pb2.ALL:
-            actions = sum(CATEGORY_TO_ACTIONS.values(), [])
-        else:
-            actions = CATEGORY_TO_ACTIONS[self.request.category]
-
-        statements = []
-        for action in actions:
-            if hasattr(action, statement_type):
-                statements.append(getattr(action, statement_type))
-
-        if statements:
-            return _combine_statements(statements, self.request.query)
-
-    def _get_should_statements(self):
-        return self._get_statements('get_should_statements_v1')
-
-    def _get_rescore_statements(self):
-        return self._get_statements('get_rescore_statements_v1')
-
-    def _get_highlight_fields(self):
-        statements = self._get_statements('get_highlight_fields_v1')
-        if statements:
-            return dict((statement.field_name, statement.options) for statement in statements)
-
-    def _get_excluded_source_fields(self):
-        return self._get_statements('get_excluded_source_fields_v1')
-
-    def run(self, *args, **kwargs):
-        read_alias = get_read_alias(self.parsed_token.organization_id)
-        search = Search(index=read_alias, doc_type=self._get_doc_type())
-
-        should_statements = self._get_should_statements()
-        rescore_statements = self._get_rescore_statements()
-        highlight_fields = self._get_highlight_fields()
-        excluded_source_fields = self._get_excluded_source_fields()
-        extra = {}
-        if rescore_statements:
-            rescore_query = Q('bool', should=rescore_statements)
-            extra['rescore'] = {
-                'window_size': 20,
-                'query': {
-                    'rescore_query': rescore_query.to_dict(),
-                },
-            }
-
-        if highlight_fields:
-            extra['highlight'] = {
-                'number_of_fragments': 1,
-                'order': 'score',
-                'fields': highlight_fields,
-                'pre_tags': ['<mark>'],
-                'post_tags': ['</mark>'],
-            }
-
-        if excluded_source_fields:
-            extra['_source'] = {
-                'exclude': excluded_source_fields,
-            }
-
-        q = Q('bool', should=should_statements)
-        start = time.time()
-        response = search.query(q).extra(**extra).execute()
-        end = time.time()
+    def _add_result(self, hit):
+        doc_type = hit['_type']
+        result_object_type = types.get_doc_type_with_name(doc_type)
+        if not result_object_type:
+            logger.warn('unsupported search result doc_type: %s', doc_type)
+            return
+
+        container = self.response.results.add()
+        try:
+            result_object = getattr(container, result_object_type._doc_type.name)
+        except AttributeError:
+            logger.warn('result_object_type: "%s" does not exist', result_object_type)
+            return
+
+        with self.timer.phase('decode'):
+            result_object_type.decode_source(hit['_source'], result_object)
+        container.score = hit['_score']
+        if 'highlight' in hit:
+            with self.timer.phase('highlight'):
+                result_object_type.decode_highlight(hit['highlight'], container.highlight)
+
+        container.tracking_details.document_id = hit['_id']
+        container.tracking_details.document_type = doc_type
+
+    def _get_search_kwargs(self):
+        # give up on ES once it's over budget if we can search postgres instead
+        if settings.SEARCH_SERVICE_POSTGRES_FALLBACK and settings.SEARCH_SERVICE_ES_LATENCY_BUDGET:
+            return {'request_timeout': settings.SEARCH_SERVICE_ES_LATENCY_BUDGET}
+        return {}
+
+    def _search(self, read_alias):
+        with self.timer.phase('query_build'):
+            plan = get_query_plan(self.request.category)
+            self.body = plan.render(self.request.query)
+
+        es = connections.connections.get_connection()
+        with self.timer.phase('es_network'):
+            response = es.search(
+                index=read_alias,
+                doc_type=plan.doc_type,
+                body=self.body,
+                **self._get_search_kwargs()
+            )
+        self.timer.record('es_took', response['took'])
+        health.record_took(response['took'])
         logger.info(
             'elasticsearch response time: %sms (query: "%s")',
-            response.took,
+            response['took'],
             self.request.query,
         )
+        for hit in response['hits']['hits']:
+            self._add_result(hit)
+
+    def _multi_search(self, read_alias):
+        with self.timer.phase('query_build'):
+            plan = get_multi_search_plan(
+                settings.SEARCH_SERVICE_MULTI_SEARCH_SIZE,
+                timeout=settings.SEARCH_SERVICE_MULTI_SEARCH_TIMEOUT,
+            )
+            self.body = plan.render(self.request.query)
+
+        es = connections.connections.get_connection()
+        with self.timer.phase('es_network'):
+            response = es.msearch(index=read_alias, body=self.body, **self._get_search_kwargs())
+
+        hits = []
+        for category, category_response in zip(plan.categories, response['responses']):
+            if 'error' in category_response:
+                self.partial = True
+                logger.error(
+                    'search failed for category: %s (query: "%s"): %s',
+                    category,
+                    self.request.query,
+                    category_response['error'],
+                )
+                continue
+
+            if category_response.get('timed_out'):
+                self.partial = True
+                logger.warn(
+                    'search timed out for category: %s (query: "%s")',
+                    category,
+                    self.request.query,
+                )
+            logger.info(
+                'elasticsearch response time: %sms (category: %s, query: "%s")',
+                category_response['took'],
+                category,
+                self.request.query,
+            )
+            # sub-searches run concurrently, so we track the slowest one
+            self.timer.timings['es_took'] = max(
+                self.timer.timings.get('es_took', 0),
+                category_response['took'],
+            )
+            hits.extend(category_response['hits']['hits'])
+
+        health.record_took(self.timer.timings.get('es_took', 0))
+        for hit in sorted(hits, key=lambda hit: hit['_score'], reverse=True):
+            self._add_result(hit)
+
+    def _postgres_search(self, organization_id):
+        with self.timer.phase('postgres'):
+            hits = postgres.search(organization_id, self.request.category, self.request.query)
+        for hit in hits:
+            self._add_result(hit)
+
+    def _es_search(self, organization_id, read_alias):
+        """Search ES, falling back to postgres if ES fails.
+
+        Returns:
+            whether we fell back to postgres
+
+        """
+        if settings.SEARCH_SERVICE_POSTGRES_FALLBACK and not health.is_available():
+            metrics.increment('search.search_v2.fallback')
+            self._postgres_search(organization_id)
+            return True
+
+        try:
+            if (
+                self.request.category == search_pb2.ALL and
+                settings.SEARCH_SERVICE_MULTI_SEARCH_SIZE
+            ):
+                self._multi_search(read_alias)
+            else:
+                self._search(read_alias)
+        except TransportError:
+            health.record_failure()
+            if not settings.SEARCH_SERVICE_POSTGRES_FALLBACK:
+                raise
+
+            logger.exception(
+                'search failed, falling back to postgres (query: "%s")',
+                self.request.query,
+            )
+            metrics.increment('search.search_v2.fallback')
+            del self.response.results[:]
+            self._postgres_search(organization_id)
+            return True
+        return False
+
+    def _log_query(self, organization_id):
+        # searches run by the cache warmer aren't counted
+        if self.parsed_token.is_admin():
+            return
+
+        with self.timer.phase('query_log'):
+            query_log.record(
+                organization_id,
+                self.request.category,
+                self.request.query,
+                len(self.response.results),
+            )
+
+    def run(self, *args, **kwargs):
+        self.timer = PhaseTimer('search.search_v2')
+        self.body = None
+        # set if some categories failed or timed out
+        self.partial = False
+        organization_id = self.parsed_token.organization_id
+        read_alias = get_read_alias(organization_id)
+
+        with self.timer.phase('cache_lookup'):
+            generation, cached_results = cache.get_results(
+                organization_id,
+                read_alias,
+                self.request.category,
+                self.request.query,
+            )
+        if cached_results is not None:
+            self.response.MergeFromString(cached_results)
+            self._log_query(organization_id)
+            self.timer.finish(organization_id=organization_id, query=self.request.query)
+            return
+
+        fallback = False
+        if postgres.is_primary():
+            self._postgres_search(organization_id)
+        else:
+            fallback = self._es_search(organization_id, read_alias)
+
+        # don't serve fallback or partial results once ES is back
+        if not fallback and not self.partial:
+            with self.timer.phase('serialize'):
+                serialized = self.response.SerializeToString()
+            cache.set_results(
+                read_alias,
+                self.request.category,
+                self.request.query,
+                generation,
+                serialized,
+            )
+        self._log_query(organization_id)
+        total_ms = self.timer.finish(
+            organization_id=organization_id,
+            category=self.request.category,
+            query=self.request.query,
+            body=self.body,
+            fallback=fallback,
+        )
         logger.info(
             'search response time: %sms (query: "%s")',
-            (end - start) * 1000,
+            total_ms,
             self.request.query,
         )
-        for result in response.hits:
-            result_object_type = types.get_doc_type_with_name(result.meta.doc_type)
-            if not result_object_type:
-                logger.warn('unsupported search result doc_type: %s', result.meta.doc_type)
-                continue
-
-            container = self.response.results.add()
-            try:
-                result_object = getattr(container, result_object_type._doc_type.name)
-            except AttributeError:
-                logger.warn('result_object_type: "%s" does not exist', result_object_type)
-                continue
-
-            data = result.to_dict()
-            result_object_type.prepare_protobuf_dict(data)
-            dict_to_protobuf(data, result_object)
-            container.score = result.meta.score
-            if hasattr(result.meta, 'highlight'):
-                highlight = result.meta.highlight.to_dict()
-                # handle any document_to_protobuf_mapping
-                result_object_type.prepare_highlight_dict(highlight)
-                # ES returns highlight fragments as a dictionary of <field name:
-                # array of fragments>. We only want to return the top highlight
-                # fragment.
-                for key, value in highlight.iteritems():
-                    container.highlight[key] = value[0]
-
-            container.tracking_details.document_id = result.meta.id
-            container.tracking_details.document_type = result.meta.doc_type
@@ -1,6 +1,6 @@
 from service import actions
 from services.mixins import PreRunParseTokenMixin
-from .. import models
+from .. import recents
 
 
 class Action(PreRunParseTokenMixin, actions.Action):
@@ -12,8 +12,9 @@ class Action(PreRunParseTokenMixin, actions.Action):
     )
 
     def run(self, *args, **kwargs):
-        models.Recent.objects.from_protobuf(
-            self.request.tracking_details,
+        recents.track(
             organization_id=self.parsed_token.organization_id,
             by_profile_id=self.parsed_token.profile_id,
+            document_type=self.request.tracking_details.document_type,
+            document_id=self.request.tracking_details.document_id,
         )
@@ -0,0 +1,332 @@
+"""Benchmark search latency and indexing throughput against a local ES.
+
+Organizations are generated by recombining the entities in a fixture file
+(see `search/fixtures/acme.yml`), indexed through `search.tasks` and then
+queried through the search service with a query mix derived from the same
+fixtures. When the Postgres store is enabled the same queries are also run
+against it directly.
+
+With shared indices the benchmark organization's documents and aliases are
+removed afterwards, leaving the shared index and other organizations alone.
+
+"""
+import math
+import random
+import time
+import uuid
+
+from elasticsearch.helpers import (
+    bulk,
+    scan,
+)
+from elasticsearch_dsl import connections
+from protobuf_to_dict import dict_to_protobuf
+from protobufs.services.organization import containers_pb2 as organization_containers
+from protobufs.services.post import containers_pb2 as post_containers
+from protobufs.services.profile import containers_pb2 as profile_containers
+from protobufs.services.search.containers import search_pb2
+from protobufs.services.team import containers_pb2 as team_containers
+import service.control
+from service.transports import local
+
+from services.token import make_admin_token
+
+from . import (
+    cache,
+    factories,
+    models,
+    tasks,
+)
+from .stores.es.indices.organization.actions import (
+    create_index,
+    get_index_name,
+    get_read_alias,
+    get_routing,
+    get_write_alias,
+    shared_indices_enabled,
+)
+from .stores.es.types.location.document import LocationV1
+from .stores.es.types.post.document import PostV1
+from .stores.es.types.profile.document import ProfileV1
+from .stores.es.types.team.document import TeamV1
+from .stores.postgres import actions as postgres
+
+INDEX_CHUNK_SIZE = 500
+RECENTS_PER_PROFILE = 50
+
+# fixture key -> (container, document type)
+FIXTURE_TYPES = [
+    ('profiles', profile_containers.ProfileV1, ProfileV1),
+    ('teams', team_containers.TeamV1, TeamV1),
+    ('locations', organization_containers.LocationV1, LocationV1),
+    ('posts', post_containers.PostV1, PostV1),
+]
+
+DOCUMENT_TYPES = dict((key, document_type) for key, _, document_type in FIXTURE_TYPES)
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of the values."""
+    if not values:
+        return None
+    values = sorted(values)
+    index = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[max(0, min(index, len(values) - 1))]
+
+
+def summarize(durations):
+    """Summarize durations (in seconds) as milliseconds."""
+    return {
+        'count': len(durations),
+        'mean': sum(durations) / len(durations) * 1000 if durations else None,
+        'p50': percentile(durations, 50) * 1000 if durations else None,
+        'p95': percentile(durations, 95) * 1000 if durations else None,
+        'p99': percentile(durations, 99) * 1000 if durations else None,
+    }
+
+
+def _generate_profile(fixtures, rng, n):
+    profile = dict(rng.choice(fixtures['profiles']))
+    first_name = rng.choice(fixtures['profiles'])['first_name']
+    last_name = rng.choice(fixtures['profiles'])['last_name']
+    profile.update({
+        'first_name': first_name,
+        'last_name': last_name,
+        'full_name': '%s %s' % (first_name, last_name),
+        'email': '%s.%s.%s@acme.com' % (first_name.lower(), last_name.lower(), n),
+        'authentication_identifier': '%s.%s.%s@acme.com' % (
+            first_name.lower(),
+            last_name.lower(),
+            n,
+        ),
+    })
+    return profile
+
+
+def _generate_team(fixtures, rng, n):
+    team = dict(rng.choice(fixtures['teams']))
+    team['name'] = '%s %s' % (team['name'], n)
+    return team
+
+
+def _generate_location(fixtures, rng, n):
+    location = dict(rng.choice(fixtures['locations']))
+    location['name'] = '%s %s' % (location['name'], n)
+    return location
+
+
+def _generate_post(fixtures, rng, n):
+    post = dict(rng.choice(fixtures['posts']))
+    # mix titles and content so posts aren't exact duplicates of each other
+    post['content'] = rng.choice(fixtures['posts'])['content']
+    return post
+
+
+GENERATORS = {
+    'profiles': _generate_profile,
+    'teams': _generate_team,
+    'locations': _generate_location,
+    'posts': _generate_post,
+}
+
+
+def generate_corpus(fixtures, organization_id, size, seed=0):
+    """Generate documents for an organization in the same mix as the fixtures.
+
+    Args:
+        fixtures (dict): fixtures in the shape of `search/fixtures/acme.yml`
+        organization_id (str): id of the generated organization
+        size (int): total number of documents to generate
+        seed (Optional[int]): seed for the random number generator
+
+    Returns:
+        dict of fixture key -> list of protobuf containers
+
+    """
+    rng = random.Random(seed)
+    fixture_types = [f for f in FIXTURE_TYPES if fixtures.get(f[0])]
+    total = sum(len(fixtures[key]) for key, _, _ in fixture_types)
+    corpus = {}
+    generated = 0
+    for index, (key, container, _) in enumerate(fixture_types):
+        if index == len(fixture_types) - 1:
+            count = size - generated
+        else:
+            count = int(size * len(fixtures[key]) / float(total))
+        generated += count
+
+        containers = corpus[key] = []
+        for n in xrange(count):
+            data = GENERATORS[key](fixtures, rng, n)
+            data['id'] = str(uuid.uuid4())
+            data['organization_id'] = organization_id
+            containers.append(dict_to_protobuf(data, container))
+    return corpus
+
+
+def generate_queries(fixtures, count, seed=0):
+    """Generate a query mix of names, partial names, team names and post titles."""
+    rng = random.Random(seed)
+    generators = [
+        lambda: rng.choice(fixtures['profiles'])['full_name'],
+        lambda: rng.choice(fixtures['profiles'])['first_name'][:3],
+        lambda: rng.choice(fixtures['profiles'])['last_name'],
+        lambda: rng.choice(fixtures['teams'])['name'],
+        lambda: ' '.join(rng.choice(fixtures['posts'])['title'].split()[:2]),
+    ]
+    return [rng.choice(generators)() for _ in xrange(count)]
+
+
+def _get_client(token):
+    client = service.control.Client('search', token=token)
+    client.set_transport(local.instance)
+    return client
+
+
+def index_corpus(organization_id, corpus):
+    """Index the corpus through the indexing tasks.
+
+    Returns:
+        tuple of (number of documents, seconds spent indexing)
+
+    """
+    documents = 0
+    start = time.time()
+    for key, containers in corpus.iteritems():
+        for offset in xrange(0, len(containers), INDEX_CHUNK_SIZE):
+            chunk = containers[offset:offset + INDEX_CHUNK_SIZE]
+            tasks._update_documents(DOCUMENT_TYPES[key], chunk, organization_id)
+            documents += len(chunk)
+    return documents, time.time() - start
+
+
+def get_index_size(organization_id):
+    """Return the size of the organization's index.
+
+    Shared indices include the documents of other organizations.
+
+    """
+    es = connections.connections.get_connection()
+    index_names = es.indices.get_alias(index='*', name=get_read_alias(organization_id)).keys()
+    es.indices.refresh(index=index_names)
+    stats = es.indices.stats(index=index_names, metric='store')
+    return sum(
+        stats['indices'][index_name]['primaries']['store']['size_in_bytes']
+        for index_name in index_names
+    )
+
+
+def delete_organization(organization_id):
+    """Remove the benchmark organization from ES.
+
+    Its own index is deleted. Shared indices are kept, and only the
+    organization's documents and aliases are removed from them.
+
+    """
+    es = connections.connections.get_connection()
+    if not shared_indices_enabled():
+        es.indices.delete(index=get_index_name(organization_id), ignore=404)
+        return
+
+    read_alias = get_read_alias(organization_id)
+    if not es.indices.exists_alias('*', read_alias):
+        return
+
+    documents = scan(es, index=read_alias, query={'query': {'match_all': {}}, '_source': False})
+    actions = ({
+        '_op_type': 'delete',
+        '_index': document['_index'],
+        '_type': document['_type'],
+        '_id': document['_id'],
+        '_routing': get_routing(document['_index'], organization_id),
+    } for document in documents)
+    bulk(es, actions)
+    es.indices.delete_alias(
+        index='*',
+        name=[get_write_alias(organization_id), read_alias],
+        ignore=404,
+    )
+    cache.invalidate_write_indices(organization_id)
+
+
+def _time_calls(func, arguments):
+    durations = []
+    for argument in arguments:
+        start = time.time()
+        func(argument)
+        durations.append(time.time() - start)
+    return durations
+
+
+def run_benchmark(fixtures, size, queries, seed=0, keep=False):
+    """Benchmark an organization with `size` documents.
+
+    Args:
+        fixtures (dict): fixtures to generate the organization from
+        size (int): number of documents to generate
+        queries (list): queries to replay through search_v2
+        seed (Optional[int]): seed for generating the organization
+        keep (Optional[bool]): keep the generated index and recents
+
+    Returns:
+        dict of results
+
+    """
+    organization_id = str(uuid.UUID(int=random.Random(seed + size).getrandbits(128), version=4))
+    corpus = generate_corpus(fixtures, organization_id, size, seed=seed)
+    create_index(organization_id)
+    try:
+        documents, indexing_seconds = index_corpus(organization_id, corpus)
+        index_size = get_index_size(organization_id)
+
+        search_client = _get_client(make_admin_token(organization_id=organization_id))
+        # warm up connections and query plans
+        search_client.call_action('search_v2', query=queries[0])
+        search_durations = _time_calls(
+            lambda query: search_client.call_action('search_v2', query=query),
+            queries,
+        )
+        postgres_durations = None
+        if postgres.is_enabled():
+            postgres_durations = _time_calls(
+                lambda query: postgres.search(organization_id, search_pb2.ALL, query),
+                queries,
+            )
+
+        profile_id = corpus['profiles'][0].id
+        rng = random.Random(seed)
+        for key in ('profiles', 'posts'):
+            for container in rng.sample(corpus[key], min(RECENTS_PER_PROFILE / 2, len(corpus[key]))):
+                factories.RecentFactory.create(
+                    organization_id=organization_id,
+                    by_profile_id=profile_id,
+                    document_type=DOCUMENT_TYPES[key]._doc_type.name,
+                    document_id=container.id,
+                )
+        recents_client = _get_client(make_admin_token(
+            organization_id=organization_id,
+            profile_id=profile_id,
+        ))
+        recents_durations = _time_calls(
+            lambda _: recents_client.call_action('get_recents'),
+            range(len(queries)),
+        )
+    finally:
+        if not keep:
+            delete_organization(organization_id)
+            models.Recent.objects.filter(organization_id=organization_id).delete()
+            models.Document.objects.filter(organization_id=organization_id).delete()
+
+    return {
+        'organization_id': organization_id,
+        'documents': documents,
+        'document_counts': dict((key, len(containers)) for key, containers in corpus.iteritems()),
+        'indexing': {
+            'seconds': indexing_seconds,
+            'docs_per_second': documents / indexing_seconds if indexing_seconds else None,
+        },
+        'index_size_bytes': index_size,
+        'search_v2': summarize(search_durations),
+        'postgres_search': summarize(postgres_durations) if postgres_durations else None,
+        'get_recents': summarize(recents_durations),
+    }
@@ -0,0 +1,197 @@
+"""Redis backed cache of search results.
+
+Cached results are scoped to an organization's read alias and tagged with a
+per organization "generation". Any time we index documents for an
+organization the generation is bumped, which orphans every cached result for
+that organization without having to scan for keys. Orphaned results expire
+via their TTL.
+
+We also cache the indices behind each organization's write alias so indexing
+tasks don't have to resolve the alias on every bulk request.
+
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+import redis
+
+from services.cache import get_redis_client
+
+from .stores.es.indices.organization import INDEX_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Fetch the organization's current generation and the cached results for that
+# generation in a single round trip. Returns [generation, results].
+LOOKUP_SCRIPT = """
+local generation = redis.call('GET', KEYS[1]) or '0'
+return {generation, redis.call('GET', ARGV[1] .. generation)}
+"""
+
+_lookup_script = None
+
+
+def _get_lookup_script(client):
+    global _lookup_script
+    if _lookup_script is None:
+        _lookup_script = client.register_script(LOOKUP_SCRIPT)
+    return _lookup_script
+
+
+def _is_enabled():
+    return bool(getattr(settings, 'SEARCH_SERVICE_RESULT_CACHE_TIMEOUT', None))
+
+
+def normalize_query(query):
+    """Normalize a query so trivially different queries share a cache entry.
+
+    All of our search analyzers lowercase and split on whitespace, so casing
+    and runs of whitespace don't affect the results.
+
+    """
+    return u' '.join(query.lower().split())
+
+
+def get_generation_key(organization_id):
+    return 'search:generation:%s' % (organization_id,)
+
+
+def get_results_key_prefix(read_alias, category, query):
+    query_hash = hashlib.sha1(normalize_query(query).encode('utf-8')).hexdigest()
+    return 'search:results:%s:%s:v%s:%s:' % (read_alias, category, INDEX_VERSION, query_hash)
+
+
+def get_results(organization_id, read_alias, category, query):
+    """Return the cached results for the query.
+
+    Args:
+        organization_id (str): id of the organization
+        read_alias (str): read alias we're searching against
+        category (search_pb2.CategoryV1): category being searched
+        query (str): the raw search query
+
+    Returns:
+        tuple of (generation, results). results is the serialized response or
+        None if we have a cache miss. generation should be passed to
+        `set_results` when caching the response so results computed while
+        documents are being indexed are discarded.
+
+    """
+    if not _is_enabled():
+        return None, None
+
+    client = get_redis_client()
+    key_prefix = get_results_key_prefix(read_alias, category, query)
+    try:
+        generation, results = _get_lookup_script(client)(
+            keys=[get_generation_key(organization_id)],
+            args=[key_prefix],
+            client=client,
+        )
+    except redis.RedisError:
+        logger.exception('failed to fetch cached search results')
+        return None, None
+    return generation, results
+
+
+def set_results(read_alias, category, query, generation, results):
+    """Cache the serialized results for the query.
+
+    Args:
+        read_alias (str): read alias we're searching against
+        category (search_pb2.CategoryV1): category being searched
+        query (str): the raw search query
+        generation (str): generation returned from `get_results`
+        results (str): serialized response
+
+    """
+    if not _is_enabled() or generation is None:
+        return
+
+    client = get_redis_client()
+    key = get_results_key_prefix(read_alias, category, query) + str(generation)
+    try:
+        client.setex(key, settings.SEARCH_SERVICE_RESULT_CACHE_TIMEOUT, results)
+    except redis.RedisError:
+        logger.exception('failed to cache search results')
+
+
+def bump_generation(organization_id):
+    """Invalidate all cached results for the organization."""
+    client = get_redis_client()
+    try:
+        return client.incr(get_generation_key(organization_id))
+    except redis.RedisError:
+        logger.exception('failed to bump search generation: %s', organization_id)
+
+
+def get_write_indices_key(organization_id):
+    return 'search:write_indices:%s' % (organization_id,)
+
+
+def get_write_indices(organization_id):
+    """Return the cached write indices for the organization.
+
+    Returns:
+        list of index names or None if we have a cache miss
+
+    """
+    if not getattr(settings, 'SEARCH_SERVICE_WRITE_INDICES_CACHE_TIMEOUT', None):
+        return None
+
+    client = get_redis_client()
+    try:
+        indices = client.get(get_write_indices_key(organization_id))
+    except redis.RedisError:
+        logger.exception('failed to fetch cached write indices')
+        return None
+
+    if indices is not None:
+        return json.loads(indices)
+
+
+def set_write_indices(organization_id, indices):
+    """Cache the write indices for the organization."""
+    timeout = getattr(settings, 'SEARCH_SERVICE_WRITE_INDICES_CACHE_TIMEOUT', None)
+    if not timeout:
+        return
+
+    client = get_redis_client()
+    try:
+        client.setex(get_write_indices_key(organization_id), timeout, json.dumps(indices))
+    except redis.RedisError:
+        logger.exception('failed to cache write indices')
+
+
+def invalidate_write_indices(organization_id):
+    """Clear the cached write indices for the organization.
+
+    This must be called any time the organization's write alias changes.
+
+    """
+    client = get_redis_client()
+    try:
+        client.delete(get_write_indices_key(organization_id))
+    except redis.RedisError:
+        logger.exception('failed to invalidate write indices: %s', organization_id)
+
+
+def get_warm_key(organization_id):
+    return 'search:warm:%s' % (organization_id,)
+
+
+def claim_warm(organization_id, timeout):
+    """Claim warming the organization's results for the next `timeout` seconds.
+
+    Returns:
+        whether warming should be scheduled
+
+    """
+    client = get_redis_client()
+    try:
+        return bool(client.set(get_warm_key(organization_id), 1, ex=timeout, nx=True))
+    except redis.RedisError:
+        logger.exception('failed to claim search cache warming: %s', organization_id)
+        return False
@@ -0,0 +1,366 @@
+"""Pipelined, size aware bulk indexing.
+
+Indexing a batch of entities has three stages: fetching the entities from
+their service, converting them to documents and sending the documents to ES.
+`prefetch` lets the stages overlap so the next page of entities is fetched and
+converted while the previous bulk request is in flight.
+
+Bulk requests are chunked by their size in bytes rather than by a number of
+entities, and items ES rejects because its bulk queue is full (429) are
+retried with exponential backoff. Items that fail for any other reason are
+reported in the returned `BulkStats` instead of failing the whole batch.
+
+Documents are versioned by when their source row last changed (see
+`get_version`) so indexers can run in parallel and out of order: ES rejects a
+write carrying an older version than the indexed document with a conflict,
+which we count rather than report as a failure.
+
+"""
+import Queue
+import sys
+import threading
+import time
+
+import arrow
+from django.conf import settings
+from django.db import connections
+from elasticsearch.exceptions import TransportError
+from elasticsearch.helpers import expand_action
+
+# status ES responds with when its bulk queue is full
+REJECTED_STATUS = 429
+# status ES responds with when a write is older than the indexed document
+CONFLICT_STATUS = 409
+
+# Some documents include data from other rows (ie. a profile's display title
+# comes from its teams), so they're re-indexed without their own row changing.
+# Writing the same version again is allowed for that reason.
+VERSION_TYPE = 'external_gte'
+
+
+class BulkStats(object):
+
+    def __init__(self):
+        self.succeeded = 0
+        self.conflicts = 0
+        self.failures = []
+        self.retries = 0
+        self.requests = 0
+        self.bytes = 0
+        self.send_ms = 0
+        self.backoff_ms = 0
+
+    def merge(self, other):
+        """Add the stats from another `BulkStats`."""
+        self.succeeded += other.succeeded
+        self.conflicts += other.conflicts
+        self.failures.extend(other.failures)
+        self.retries += other.retries
+        self.requests += other.requests
+        self.bytes += other.bytes
+        self.send_ms += other.send_ms
+        self.backoff_ms += other.backoff_ms
+
+
+def get_version(timestamp):
+    """Return the external version for a document last changed at `timestamp`.
+
+    Args:
+        timestamp (datetime or str): when the document's source changed
+
+    Returns:
+        microseconds since the epoch
+
+    """
+    timestamp = arrow.get(timestamp)
+    return timestamp.timestamp * 1000000 + timestamp.microsecond
+
+
+def set_version(action, timestamp):
+    """Version the bulk action by when its source changed."""
+    action['_version'] = get_version(timestamp)
+    action['_version_type'] = VERSION_TYPE
+    return action
+
+
+def prefetch(iterable, size=1):
+    """Consume `iterable` in a background thread, staying `size` items ahead.
+
+    Exceptions raised while consuming `iterable` are re-raised in the calling
+    thread. The background thread stops if we stop iterating.
+
+    Django's database connections are per thread, so any connections opened
+    while consuming `iterable` are closed before the thread exits.
+
+    """
+    queue = Queue.Queue(maxsize=size)
+    stopped = threading.Event()
+    done = object()
+
+    def _put(item):
+        while not stopped.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+            except Queue.Full:
+                continue
+            return True
+        return False
+
+    def _produce():
+        try:
+            for item in iterable:
+                if not _put((item, None)):
+                    return
+        except Exception:
+            result = (None, sys.exc_info())
+        else:
+            result = (done, None)
+        finally:
+            for connection in connections.all():
+                connection.close()
+        _put(result)
+
+    thread = threading.Thread(target=_produce)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            item, exc_info = queue.get()
+            if exc_info is not None:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            if item is done:
+                break
+            yield item
+    finally:
+        stopped.set()
+
+
+def chunk_actions(actions, serializer, max_bytes, max_actions):
+    """Serialize actions and group them into bulk requests.
+
+    Args:
+        actions (iterable): bulk actions, see `elasticsearch.helpers.expand_action`
+        serializer (elasticsearch.serializer.JSONSerializer): serializer for
+            the action and data lines
+        max_bytes (int): max size of a chunk in bytes. an action larger than
+            this is sent on its own.
+        max_actions (int): max number of actions in a chunk
+
+    Yields:
+        lists of (action line, data line) tuples. the data line is None for
+        deletes.
+
+    """
+    chunk = []
+    chunk_bytes = 0
+    for action in actions:
+        action_line, data = expand_action(action)
+        action_line = serializer.dumps(action_line)
+        size = len(action_line) + 1
+        if data is not None:
+            data = serializer.dumps(data)
+            size += len(data) + 1
+
+        if chunk and (chunk_bytes + size > max_bytes or len(chunk) == max_actions):
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+
+        chunk.append((action_line, data))
+        chunk_bytes += size
+
+    if chunk:
+        yield chunk
+
+
+def _get_body(chunk):
+    lines = []
+    for action_line, data in chunk:
+        lines.append(action_line)
+        if data is not None:
+            lines.append(data)
+    return '\n'.join(lines) + '\n'
+
+
+def _send_chunk(es, chunk, stats):
+    """Send a chunk, returning the part of the chunk that should be retried."""
+    body = _get_body(chunk)
+    stats.requests += 1
+    stats.bytes += len(body)
+    start = time.time()
+    try:
+        response = es.bulk(body=body)
+    except TransportError as e:
+        if e.status_code == REJECTED_STATUS:
+            return chunk
+        raise
+    finally:
+        stats.send_ms += (time.time() - start) * 1000
+
+    if not response['errors']:
+        stats.succeeded += len(chunk)
+        return []
+
+    rejected = []
+    for actions, item in zip(chunk, response['items']):
+        op_type, result = item.items()[0]
+        status = result.get('status', 500)
+        # deleting a document that doesn't exist leaves the index how we want it
+        if 200 <= status < 300 or (op_type == 'delete' and status == 404):
+            stats.succeeded += 1
+        elif status == REJECTED_STATUS:
+            rejected.append(actions)
+        elif status == CONFLICT_STATUS:
+            # we've already indexed a newer version of the document
+            stats.conflicts += 1
+        else:
+            stats.failures.append({op_type: result})
+    return rejected
+
+
+def _send_with_retries(es, chunk, stats, max_retries, initial_backoff):
+    chunk = _send_chunk(es, chunk, stats)
+    for attempt in xrange(max_retries):
+        if not chunk:
+            break
+
+        backoff = initial_backoff * 2 ** attempt
+        stats.retries += len(chunk)
+        stats.backoff_ms += backoff * 1000
+        time.sleep(backoff)
+        chunk = _send_chunk(es, chunk, stats)
+
+    for action_line, _ in chunk:
+        op_type, action = es.transport.serializer.loads(action_line).items()[0]
+        action.update({'status': REJECTED_STATUS, 'error': 'rejected'})
+        stats.failures.append({op_type: action})
+
+
+def bulk(
+        es,
+        actions,
+        max_bytes=None,
+        max_actions=None,
+        max_retries=None,
+        initial_backoff=None,
+    ):
+    """Send actions to ES in size bounded chunks.
+
+    Actions are serialized and chunked in a background thread while the
+    previous chunk is sent.
+
+    Args:
+        es (elasticsearch.Elasticsearch): client
+        actions (iterable): bulk actions
+        max_bytes (Optional[int]): max size of a bulk request in bytes
+        max_actions (Optional[int]): max number of actions in a bulk request
+        max_retries (Optional[int]): number of times to retry rejected actions
+        initial_backoff (Optional[float]): seconds to wait before the first
+            retry, doubling with each retry
+
+    Returns:
+        BulkStats
+
+    """
+    max_bytes = max_bytes or settings.SEARCH_SERVICE_BULK_MAX_BYTES
+    max_actions = max_actions or settings.SEARCH_SERVICE_BULK_MAX_ACTIONS
+    if max_retries is None:
+        max_retries = settings.SEARCH_SERVICE_BULK_MAX_RETRIES
+    if initial_backoff is None:
+        initial_backoff = settings.SEARCH_SERVICE_BULK_INITIAL_BACKOFF
+
+    stats = BulkStats()
+    chunks = prefetch(chunk_actions(actions, es.transport.serializer, max_bytes, max_actions))
+    for chunk in chunks:
+        _send_with_retries(es, chunk, stats, max_retries, initial_backoff)
+    return stats
+
+
+def parallel_bulk(
+        es,
+        actions,
+        workers,
+        max_bytes=None,
+        max_actions=None,
+        max_retries=None,
+        initial_backoff=None,
+    ):
+    """Send actions to ES from `workers` threads.
+
+    Unlike `bulk`, actions are generated and chunked in the calling thread,
+    so generating them can use the database. At most `workers` chunks are
+    queued, so actions are only generated as fast as they're sent.
+
+    Args:
+        es (elasticsearch.Elasticsearch): client
+        actions (iterable): bulk actions
+        workers (int): number of threads sending bulk requests
+        max_bytes (Optional[int]): max size of a bulk request in bytes
+        max_actions (Optional[int]): max number of actions in a bulk request
+        max_retries (Optional[int]): number of times to retry rejected actions
+        initial_backoff (Optional[float]): seconds to wait before the first
+            retry, doubling with each retry
+
+    Returns:
+        BulkStats
+
+    """
+    max_bytes = max_bytes or settings.SEARCH_SERVICE_BULK_MAX_BYTES
+    max_actions = max_actions or settings.SEARCH_SERVICE_BULK_MAX_ACTIONS
+    if max_retries is None:
+        max_retries = settings.SEARCH_SERVICE_BULK_MAX_RETRIES
+    if initial_backoff is None:
+        initial_backoff = settings.SEARCH_SERVICE_BULK_INITIAL_BACKOFF
+
+    queue = Queue.Queue(maxsize=workers)
+    failed = threading.Event()
+    done = object()
+    results = []
+
+    def _consume():
+        stats = BulkStats()
+        exc_info = None
+        try:
+            while True:
+                chunk = queue.get()
+                if chunk is done:
+                    break
+                _send_with_retries(es, chunk, stats, max_retries, initial_backoff)
+        except Exception:
+            exc_info = sys.exc_info()
+            failed.set()
+        results.append((stats, exc_info))
+
+    def _put(item):
+        while any(thread.is_alive() for thread in threads):
+            try:
+                queue.put(item, timeout=0.1)
+            except Queue.Full:
+                continue
+            return True
+        return False
+
+    threads = [threading.Thread(target=_consume) for _ in xrange(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        for chunk in chunk_actions(actions, es.transport.serializer, max_bytes, max_actions):
+            if failed.is_set() or not _put(chunk):
+                break
+    finally:
+        # each worker stops at the first `done` it reads
+        while _put(done):
+            pass
+        for thread in threads:
+            thread.join()
+
+    stats = BulkStats()
+    for worker_stats, _ in results:
+        stats.merge(worker_stats)
+    for _, exc_info in results:
+        if exc_info is not None:
+            raise exc_info[0], exc_info[1], exc_info[2]
+    return stats
+
@@ -0,0 +1,80 @@
+"""Phase level timing for search requests and indexing.
+
+Phase timings are accumulated over the course of an operation and emitted as
+`<prefix>.<phase>` timing metrics when the operation finishes. Operations that
+exceed `SEARCH_SERVICE_SLOW_QUERY_THRESHOLD_MS` are sampled into the slow query
+log along with the request body so they can be replayed.
+
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from service import metrics
+
+slow_query_logger = logging.getLogger('search.slow_queries')
+
+
+class PhaseTimer(object):
+    """Accumulate the time spent in each phase of an operation.
+
+    Args:
+        prefix (str): prefix for the emitted metrics
+
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.timings = OrderedDict()
+        self.start = time.time()
+
+    @contextmanager
+    def phase(self, name):
+        """Time the wrapped block, adding to any time already spent in the phase."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, (time.time() - start) * 1000)
+
+    def record(self, name, duration_ms):
+        """Record time spent in a phase that we didn't time ourselves (ie. ES `took`)."""
+        self.timings[name] = self.timings.get(name, 0) + duration_ms
+
+    @property
+    def total_ms(self):
+        return (time.time() - self.start) * 1000
+
+    def finish(self, **details):
+        """Emit the phase timings and sample the operation if it was slow.
+
+        Args:
+            **details: context to include in the slow query log (ie. the
+                request body and organization id)
+
+        Returns:
+            total duration of the operation in milliseconds
+
+        """
+        total_ms = self.total_ms
+        for name, duration_ms in self.timings.iteritems():
+            metrics.timing('%s.%s' % (self.prefix, name), duration_ms, use_ms=False)
+        metrics.timing('%s.total' % (self.prefix,), total_ms, use_ms=False)
+
+        threshold = settings.SEARCH_SERVICE_SLOW_QUERY_THRESHOLD_MS
+        if (
+            threshold is not None and
+            total_ms > threshold and
+            random.random() < settings.SEARCH_SERVICE_SLOW_QUERY_SAMPLE_RATE
+        ):
+            slow_query_logger.warning(
+                'slow %s: %.1fms %s',
+                self.prefix,
+                total_ms,
+                json.dumps({'timings': self.timings, 'details': details}, default=str),
+            )
+        return total_ms
@@ -0,0 +1,96 @@
+import json
+import timeit
+
+from elasticsearch_dsl import (
+    Q,
+    Search,
+)
+from protobufs.services.search.containers import search_pb2
+
+from services.management.base import BaseCommand
+
+from ...stores.es.plans import (
+    CATEGORY_TO_ACTIONS,
+    get_doc_type,
+    get_query_plan,
+    RESCORE_WINDOW_SIZE,
+)
+
+
+def _get_statements(category, statement_type, query):
+    if category == search_pb2.ALL:
+        actions = sum(CATEGORY_TO_ACTIONS.values(), [])
+    else:
+        actions = CATEGORY_TO_ACTIONS[category]
+
+    statements = []
+    for action in actions:
+        if hasattr(action, statement_type):
+            for statement in getattr(action, statement_type)(query):
+                if statement not in statements:
+                    statements.append(statement)
+    return statements
+
+
+def build_original_body(category, query):
+    """Build and serialize the request body the way search_v2 did before query plans."""
+    search = Search(doc_type=get_doc_type(category))
+    should_statements = _get_statements(category, 'get_should_statements_v1', query)
+    rescore_statements = _get_statements(category, 'get_rescore_statements_v1', query)
+    highlight_fields = _get_statements(category, 'get_highlight_fields_v1', query)
+    excluded_source_fields = _get_statements(category, 'get_excluded_source_fields_v1', query)
+    extra = {}
+    if rescore_statements:
+        extra['rescore'] = {
+            'window_size': RESCORE_WINDOW_SIZE,
+            'query': {
+                'rescore_query': Q('bool', should=rescore_statements).to_dict(),
+            },
+        }
+
+    if highlight_fields:
+        extra['highlight'] = {
+            'number_of_fragments': 1,
+            'order': 'score',
+            'fields': dict((field.field_name, field.options) for field in highlight_fields),
+            'pre_tags': ['<mark>'],
+            'post_tags': ['</mark>'],
+        }
+
+    if excluded_source_fields:
+        extra['_source'] = {
+            'exclude': excluded_source_fields,
+        }
+
+    search = search.query(Q('bool', should=should_statements)).extra(**extra)
+    return json.dumps(search.to_dict())
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark the per request cost of building search_v2 request bodies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10000, help='Iterations per run')
+        parser.add_argument('--query', default='Meg in Customer Support', help='Query to render')
+
+    def _time(self, func, iterations):
+        return min(timeit.repeat(func, number=iterations, repeat=3)) / iterations * 1000000
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        query = options['query']
+        categories = [search_pb2.ALL] + CATEGORY_TO_ACTIONS.keys()
+        for category in categories:
+            # compile the plan outside of the timed section
+            plan = get_query_plan(category)
+            before = self._time(lambda: build_original_body(category, query), iterations)
+            after = self._time(lambda: plan.render(query), iterations)
+            self.stdout.write(
+                '%s: before %.2fus, after %.2fus (%.1fx)' % (
+                    plan.doc_type or 'all',
+                    before,
+                    after,
+                    before / after,
+                )
+            )
@@ -0,0 +1,80 @@
+import json
+
+from django.test.utils import override_settings
+import yaml
+
+from services.management.base import BaseCommand
+
+from ... import benchmarks
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark indexing throughput and search latency against a local ES'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='1000,10000,100000',
+            help='Comma separated number of documents per generated organization',
+        )
+        parser.add_argument('--queries', type=int, default=200, help='Number of queries to replay')
+        parser.add_argument(
+            '--fixtures',
+            default='search/fixtures/acme.yml',
+            help='Fixtures to generate organizations from',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Seed for generating data')
+        parser.add_argument('--output', help='Path to write the JSON results to, defaults to stdout')
+        parser.add_argument(
+            '--cache',
+            action='store_true',
+            default=False,
+            help='Leave the search result cache enabled',
+        )
+        parser.add_argument(
+            '--postgres',
+            action='store_true',
+            default=False,
+            help='Also index into and benchmark the Postgres search store',
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            default=False,
+            help='Keep the generated indices',
+        )
+
+    def handle(self, *args, **options):
+        with open(options['fixtures']) as read_file:
+            fixtures = yaml.load(read_file)
+
+        queries = benchmarks.generate_queries(fixtures, options['queries'], seed=options['seed'])
+        overrides = {}
+        if not options['cache']:
+            overrides['SEARCH_SERVICE_RESULT_CACHE_TIMEOUT'] = None
+        if options['postgres']:
+            overrides['SEARCH_SERVICE_POSTGRES_FALLBACK'] = True
+
+        results = []
+        with override_settings(**overrides):
+            for size in options['sizes'].split(','):
+                results.append(benchmarks.run_benchmark(
+                    fixtures,
+                    int(size),
+                    queries,
+                    seed=options['seed'],
+                    keep=options['keep'],
+                ))
+
+        output = json.dumps({
+            'fixtures': options['fixtures'],
+            'queries': len(queries),
+            'seed': options['seed'],
+            'results': results,
+        }, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as write_file:
+                write_file.write(output)
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,65 @@
+import timeit
+
+from protobuf_to_dict import dict_to_protobuf
+from protobufs.services.post import containers_pb2 as post_containers
+import yaml
+
+from services.management.base import BaseCommand
+
+from ... import benchmarks
+from ...stores.es.types.collection.document import CollectionV1
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark converting protobufs into bulk index actions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5, help='Iterations per run')
+        parser.add_argument(
+            '--fixtures',
+            default='search/fixtures/acme.yml',
+            help='Fixtures to build protobufs from',
+        )
+
+    def _time(self, func, iterations):
+        return min(timeit.repeat(func, number=iterations, repeat=3)) / iterations
+
+    def _get_protobufs(self, fixtures):
+        protobufs = []
+        for key, container, document_type in benchmarks.FIXTURE_TYPES:
+            containers = [dict_to_protobuf(f, container, strict=False) for f in fixtures[key]]
+            protobufs.append((document_type, containers))
+
+        # the fixtures don't include collections, so name them after teams
+        collections = [post_containers.CollectionV1(id=team['id'], name=team['name']) for team
+                       in fixtures['teams']]
+        protobufs.append((CollectionV1, collections))
+        return protobufs
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        with open(options['fixtures']) as read_file:
+            fixtures = yaml.load(read_file)
+
+        for document_type, containers in self._get_protobufs(fixtures):
+            from_protobuf = lambda: [
+                document_type.from_protobuf(c).to_dict(include_meta=True) for c in containers
+            ]
+            to_action = lambda: [document_type.to_action(c) for c in containers]
+            if from_protobuf() != to_action():
+                self.stderr.write('%s: to_action output differs from from_protobuf' % (
+                    document_type._doc_type.name,
+                ))
+
+            before = self._time(from_protobuf, iterations)
+            after = self._time(to_action, iterations)
+            self.stdout.write(
+                '%s (%d documents): from_protobuf %.0f docs/s, to_action %.0f docs/s (%.1fx)' % (
+                    document_type._doc_type.name,
+                    len(containers),
+                    len(containers) / before,
+                    len(containers) / after,
+                    before / after,
+                )
+            )
@@ -0,0 +1,94 @@
+import random
+import timeit
+
+import yaml
+
+from services.management.base import BaseCommand
+
+from ...stores.es.types.post import utils
+
+ATTACHMENT = (
+    '<a data-trix-attachment="{&quot;contentType&quot;:&quot;image/jpeg&quot;,&quot;filename&quot;:'
+    '&quot;%(n)s.JPG&quot;,&quot;filesize&quot;:298046,&quot;height&quot;:915,&quot;url&quot;:'
+    '&quot;https://example.com/%(n)s.JPG&quot;,&quot;width&quot;:1520}" data-trix-content-type='
+    '"image/jpeg" href="https://example.com/%(n)s.JPG"><figure class="attachment attachment-preview '
+    'jpg"><img src="https://example.com/%(n)s.JPG" width="1520" height="915"><figcaption class='
+    '"caption">caption %(n)s</figcaption></figure></a>'
+)
+
+
+def _build_block(paragraph, n):
+    lines = [line.strip() for line in paragraph.splitlines() if line.strip()]
+    choice = n % 5
+    if choice == 0:
+        return '<div><strong>%s</strong><br>%s<br><br></div>' % (lines[0], '<br>'.join(lines[1:]))
+    elif choice == 1:
+        return '<ul>%s</ul>' % (''.join('<li>%s</li>' % (line,) for line in lines),)
+    elif choice == 2:
+        return '<pre>%s</pre>' % ('\n'.join(lines),)
+    elif choice == 3:
+        return '<div>%s&nbsp;%s</div>' % (' '.join(lines), ATTACHMENT % {'n': n})
+    return '<div><em>%s</em> <a href="https://example.com/?a=1&amp;b=%s">link</a></div>' % (
+        ' '.join(lines),
+        n,
+    )
+
+
+def build_corpus(paragraphs, sizes):
+    """Build Trix documents of roughly the given sizes from the paragraphs."""
+    documents = []
+    for size in sizes:
+        blocks = []
+        length = 0
+        while length < size:
+            block = _build_block(paragraphs[len(blocks) % len(paragraphs)], len(blocks))
+            blocks.append(block)
+            length += len(block)
+        documents.append(u''.join(blocks))
+    return documents
+
+
+class Command(BaseCommand):
+
+    help = 'Benchmark extracting text from post content'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Iterations per run')
+        parser.add_argument(
+            '--sizes',
+            default='500,2000,10000,50000',
+            help='Comma separated document sizes (in characters) to benchmark',
+        )
+        parser.add_argument(
+            '--fixtures',
+            default='search/fixtures/acme.yml',
+            help='Fixtures to source post content from',
+        )
+
+    def _time(self, func, iterations):
+        return min(timeit.repeat(func, number=iterations, repeat=3)) / iterations * 1000
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        with open(options['fixtures']) as read_file:
+            fixtures = yaml.load(read_file)
+
+        paragraphs = [post['content'] for post in fixtures['posts'] if post['content'].strip()]
+        random.Random(0).shuffle(paragraphs)
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        for size, document in zip(sizes, build_corpus(paragraphs, sizes)):
+            if utils._transform_html_fast(document) != utils._transform_html_with_html5lib(document):
+                self.stderr.write('%s: fast path output differs from html5lib' % (size,))
+
+            before = self._time(lambda: utils._transform_html_with_html5lib(document), iterations)
+            after = self._time(lambda: utils._transform_html_fast(document), iterations)
+            cached = self._time(lambda: utils.transform_html(document), iterations)
+            self.stdout.write(
+                '%s chars: html5lib %.2fms, fast %.2fms (%.1fx), memoized %.3fms' % (
+                    len(document),
+                    before,
+                    after,
+                    before / after,
+                    cached,
+                )
+            )
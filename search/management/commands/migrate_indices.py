@@ -1,16 +1,45 @@
-from services.management.base import BaseCommand
+from services.management.base import (
+    BaseCommand,
+    CommandError,
+)
 
 from ...actions.migrations import (
     get_indices_to_migrate,
+    get_organization_indices,
     migrate_index,
+    MigrationError,
 )
+from ...stores.es.indices.organization.actions import shared_indices_enabled
 
 
 class Command(BaseCommand):
 
     help = 'Migrate all organizations to the latest index version'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--shared',
+            action='store_true',
+            help='Move organizations with their own index into shared indices',
+        )
+
     def handle(self, *args, **options):
-        indices = get_indices_to_migrate()
+        if options['shared']:
+            if not shared_indices_enabled():
+                raise CommandError('SEARCH_SERVICE_SHARED_INDEX_COUNT is not set')
+            indices = get_organization_indices()
+        else:
+            indices = get_indices_to_migrate()
+
+        failed = []
         for index in indices:
-            migrate_index(index)
+            self.stdout.write('migrating %s' % (index,))
+            try:
+                migrate_index(index)
+            except MigrationError as e:
+                # the organization keeps using the old index, rerunning resumes the migration
+                self.stderr.write('failed to migrate %s: %s' % (index, e))
+                failed.append(index)
+
+        if failed:
+            raise CommandError('failed to migrate: %s' % (', '.join(failed),))
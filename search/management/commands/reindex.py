@@ -0,0 +1,71 @@
+from organizations.models import Organization
+from services.management.base import BaseCommand
+
+from ...actions.reindex import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_WORKERS,
+    ENTITY_TYPES,
+    reindex_organization,
+)
+
+
+class Command(BaseCommand):
+
+    help = 'Stream organization entities from the database into their search indices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--org', help='Organization to reindex, defaults to all organizations')
+        parser.add_argument(
+            '--types',
+            default=','.join(ENTITY_TYPES.keys()),
+            help='Comma separated entity types to reindex (%s)' % (', '.join(ENTITY_TYPES.keys()),),
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_WORKERS,
+            help='Number of threads sending bulk requests',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of entities to load and index at a time',
+        )
+
+    def handle(self, *args, **options):
+        entity_types = [t.strip() for t in options['types'].split(',') if t.strip()]
+        if options['org']:
+            organization_ids = [options['org']]
+        else:
+            organization_ids = Organization.objects.values_list('id', flat=True)
+
+        for organization_id in organization_ids:
+            stats = reindex_organization(
+                str(organization_id),
+                entity_types=entity_types,
+                workers=options['workers'],
+                chunk_size=options['chunk_size'],
+            )
+            self.stdout.write(
+                '%s: indexed %d documents in %.2fs (%.1f docs/s, %.1f KB/s)' % (
+                    organization_id,
+                    stats.total_documents,
+                    stats.duration,
+                    stats.documents_per_second,
+                    stats.bytes_per_second / 1024,
+                )
+            )
+            doc_types = set(stats.documents.keys() + stats.failures.keys())
+            for doc_type in sorted(doc_types):
+                self.stdout.write(
+                    '  %s: %d indexed, %d failed' % (
+                        doc_type,
+                        stats.documents[doc_type],
+                        stats.failures[doc_type],
+                    )
+                )
+            if stats.conflicts:
+                self.stdout.write('  %d stale (newer versions already indexed)' % (
+                    stats.conflicts,
+                ))
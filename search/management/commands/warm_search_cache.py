@@ -0,0 +1,23 @@
+from organizations.models import Organization
+from services.management.base import BaseCommand
+
+from ...tasks import warm_search_cache
+
+
+class Command(BaseCommand):
+
+    help = 'Queue warming the search result cache with popular queries (ie. after a deploy)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--org', help='Organization to warm, defaults to all organizations')
+        parser.add_argument('--limit', type=int, help='Number of queries to warm per organization')
+
+    def handle(self, *args, **options):
+        if options['org']:
+            organization_ids = [options['org']]
+        else:
+            organization_ids = Organization.objects.values_list('id', flat=True)
+
+        for organization_id in organization_ids:
+            warm_search_cache.delay(str(organization_id), limit=options['limit'])
+            self.stdout.write('queued warming search cache: %s' % (organization_id,))
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0002_auto_20160201_0456'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexUpdate',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('changed', models.DateTimeField(auto_now=True)),
+                ('organization_id', models.UUIDField()),
+                ('entity_type', models.SmallIntegerField()),
+                ('entity_id', models.UUIDField()),
+                ('action', models.SmallIntegerField(default=0, choices=[(0, b'update'), (1, b'delete')])),
+            ],
+        ),
+    ]
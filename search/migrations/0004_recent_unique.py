@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# keep the most recently viewed row for each profile and document
+DEDUPE_RECENTS = """
+DELETE FROM search_recent WHERE id IN (
+    SELECT id FROM (
+        SELECT
+            id,
+            row_number() OVER (
+                PARTITION BY organization_id, by_profile_id, document_type, document_id
+                ORDER BY changed DESC
+            ) AS position
+        FROM search_recent
+    ) AS ranked
+    WHERE position > 1
+)
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0003_indexupdate'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DEDUPE_RECENTS, reverse_sql=migrations.RunSQL.noop),
+        migrations.AlterUniqueTogether(
+            name='recent',
+            unique_together=set([('organization_id', 'by_profile_id', 'document_type', 'document_id')]),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import uuid
+
+
+# the expressions must match the queries in `search.stores.postgres.actions`
+CREATE_SEARCH_INDEXES = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX search_document_text ON search_document
+    USING gin (to_tsvector('english', title || ' ' || content));
+CREATE INDEX search_document_title_trgm ON search_document USING gin (title gin_trgm_ops);
+"""
+
+DROP_SEARCH_INDEXES = """
+DROP INDEX search_document_text;
+DROP INDEX search_document_title_trgm;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0004_recent_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Document',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, serialize=False, primary_key=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('changed', models.DateTimeField(auto_now=True)),
+                ('organization_id', models.UUIDField()),
+                ('document_type', models.CharField(max_length=255)),
+                ('document_id', models.UUIDField()),
+                ('version', models.BigIntegerField(null=True)),
+                ('title', models.TextField(default='')),
+                ('content', models.TextField(default='')),
+                ('source', models.TextField()),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='document',
+            unique_together=set([('organization_id', 'document_type', 'document_id')]),
+        ),
+        migrations.RunSQL(CREATE_SEARCH_INDEXES, reverse_sql=DROP_SEARCH_INDEXES),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0005_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Query',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, serialize=False, primary_key=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('changed', models.DateTimeField(auto_now=True)),
+                ('organization_id', models.UUIDField()),
+                ('category', models.SmallIntegerField()),
+                ('query', models.CharField(max_length=255)),
+                ('count', models.IntegerField(default=0)),
+                ('hits', models.IntegerField(default=0)),
+                ('reported', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='query',
+            unique_together=set([('organization_id', 'category', 'query')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='query',
+            index_together=set([('organization_id', 'count')]),
+        ),
+    ]
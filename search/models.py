@@ -1,4 +1,36 @@
 from common.db import models
+from django.db import (
+    IntegrityError,
+    transaction,
+)
+from django.db.models import F
+from django.utils import timezone
+
+
+class RecentManager(models.Manager):
+
+    def track(self, organization_id, by_profile_id, document_type, document_id):
+        """Record that the profile viewed the document.
+
+        If the profile has already viewed the document we bump its `changed`
+        timestamp instead of creating a new row.
+
+        """
+        lookup = {
+            'organization_id': organization_id,
+            'by_profile_id': by_profile_id,
+            'document_type': document_type,
+            'document_id': document_id,
+        }
+        if self.filter(**lookup).update(changed=timezone.now()):
+            return
+
+        try:
+            with transaction.atomic():
+                self.create(**lookup)
+        except IntegrityError:
+            # lost a race with another request tracking the same document
+            self.filter(**lookup).update(changed=timezone.now())
 
 
 class Recent(models.UUIDModel, models.TimestampableModel):
@@ -8,5 +40,113 @@ class Recent(models.UUIDModel, models.TimestampableModel):
     document_type = models.CharField(max_length=255)
     document_id = models.UUIDField()
 
+    objects = RecentManager()
+
     class Meta:
         index_together = ('organization_id', 'by_profile_id')
+        unique_together = ('organization_id', 'by_profile_id', 'document_type', 'document_id')
+
+
+class IndexUpdate(models.TimestampableModel):
+    """Pending change to an indexed entity.
+
+    Rows are written in the same transaction as the change to the entity and
+    are periodically drained by `search.tasks.process_index_updates`, which
+    coalesces them into batched updates to the index.
+
+    """
+
+    UPDATE = 0
+    DELETE = 1
+    ACTION_CHOICES = (
+        (UPDATE, 'update'),
+        (DELETE, 'delete'),
+    )
+
+    organization_id = models.UUIDField()
+    # entity_pb2.EntityTypeV1
+    entity_type = models.SmallIntegerField()
+    entity_id = models.UUIDField()
+    action = models.SmallIntegerField(choices=ACTION_CHOICES, default=UPDATE)
+
+
+class Document(models.UUIDModel, models.TimestampableModel):
+    """Copy of an indexed document for the Postgres search store.
+
+    See `search.stores.postgres.actions`.
+
+    """
+
+    organization_id = models.UUIDField()
+    document_type = models.CharField(max_length=255)
+    document_id = models.UUIDField()
+    # external version of the document, see `search.indexer.get_version`
+    version = models.BigIntegerField(null=True)
+    title = models.TextField(default='')
+    content = models.TextField(default='')
+    # the document's `_source` in ES, serialized as JSON
+    source = models.TextField()
+
+    class Meta:
+        unique_together = ('organization_id', 'document_type', 'document_id')
+
+
+class QueryManager(models.Manager):
+
+    def increment(self, organization_id, category, query, count, hits, **values):
+        """Add to the logged counts for the query.
+
+        Rows are created the first time a query is logged.
+
+        """
+        lookup = {
+            'organization_id': organization_id,
+            'category': category,
+            'query': query,
+        }
+        now = timezone.now()
+        updated = self.filter(**lookup).update(
+            count=F('count') + count,
+            hits=F('hits') + hits,
+            changed=now,
+            **values
+        )
+        if updated:
+            return
+
+        try:
+            with transaction.atomic():
+                self.create(count=count, hits=hits, **dict(lookup, **values))
+        except IntegrityError:
+            # lost a race with another flush logging the same query
+            self.filter(**lookup).update(
+                count=F('count') + count,
+                hits=F('hits') + hits,
+                changed=now,
+                **values
+            )
+
+
+class Query(models.UUIDModel, models.TimestampableModel):
+    """Counts of the searches for a normalized query.
+
+    Rolled up from redis by `search.query_log.flush`.
+
+    """
+
+    organization_id = models.UUIDField()
+    # search_pb2.CategoryV1
+    category = models.SmallIntegerField()
+    query = models.CharField(max_length=255)
+    # number of times the query was searched for
+    count = models.IntegerField(default=0)
+    # number of times the query returned results
+    hits = models.IntegerField(default=0)
+    # when we were last notified the query returned nothing
+    reported = models.DateTimeField(null=True)
+
+    objects = QueryManager()
+
+    class Meta:
+        index_together = ('organization_id', 'count')
+        unique_together = ('organization_id', 'category', 'query')
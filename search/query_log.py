@@ -0,0 +1,181 @@
+"""Log of the queries each organization searches for.
+
+`search_v2` counts every normalized query in a redis hash per organization,
+along with how many of those searches returned results. The counters are
+periodically rolled up into the `Query` table by
+`search.tasks.flush_query_log`, which is what we use to find the popular
+queries worth warming in the result cache and the queries we already know
+return nothing.
+
+"""
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.db.models import (
+    Max,
+    Sum,
+)
+from django.utils import timezone
+from protobufs.services.search.containers import search_pb2
+import redis
+
+from services.cache import get_redis_client
+
+from . import models
+from .cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+ORGANIZATIONS_KEY = 'search:query_log:organizations'
+
+# longer queries are truncated so they fit in the `Query` table
+MAX_QUERY_LENGTH = 255
+
+
+def _normalize(query):
+    return normalize_query(query)[:MAX_QUERY_LENGTH]
+
+
+def get_counts_key(organization_id):
+    return 'search:query_log:counts:%s' % (organization_id,)
+
+
+def get_hits_key(organization_id):
+    return 'search:query_log:hits:%s' % (organization_id,)
+
+
+def get_field(category, query):
+    return u'%s:%s' % (category, query)
+
+
+def parse_field(field):
+    category, query = field.split(':', 1)
+    return int(category), query.decode('utf-8')
+
+
+def record(organization_id, category, query, result_count):
+    """Count a search for the query.
+
+    Args:
+        organization_id (str): id of the organization
+        category (search_pb2.CategoryV1): category being searched
+        query (str): the raw search query
+        result_count (int): number of results returned
+
+    """
+    query = _normalize(query)
+    if not query:
+        return
+
+    client = get_redis_client()
+    field = get_field(category, query).encode('utf-8')
+    pipeline = client.pipeline(transaction=False)
+    pipeline.hincrby(get_counts_key(organization_id), field, 1)
+    if result_count:
+        pipeline.hincrby(get_hits_key(organization_id), field, 1)
+    pipeline.sadd(ORGANIZATIONS_KEY, organization_id)
+    try:
+        pipeline.execute()
+    except redis.RedisError:
+        logger.exception('failed to log search query')
+
+
+def _pop_counts(client, organization_id):
+    pipeline = client.pipeline()
+    pipeline.hgetall(get_counts_key(organization_id))
+    pipeline.hgetall(get_hits_key(organization_id))
+    pipeline.delete(get_counts_key(organization_id), get_hits_key(organization_id))
+    pipeline.srem(ORGANIZATIONS_KEY, organization_id)
+    counts, hits, _, _ = pipeline.execute()
+    return counts, hits
+
+
+def flush():
+    """Roll the logged counts up into the `Query` table.
+
+    Returns:
+        number of queries flushed
+
+    """
+    client = get_redis_client()
+    try:
+        organization_ids = client.smembers(ORGANIZATIONS_KEY)
+    except redis.RedisError:
+        logger.exception('failed to fetch logged search queries')
+        return 0
+
+    flushed = 0
+    for organization_id in organization_ids:
+        try:
+            counts, hits = _pop_counts(client, organization_id)
+        except redis.RedisError:
+            logger.exception('failed to fetch logged search queries: %s', organization_id)
+            continue
+
+        for field, count in counts.iteritems():
+            category, query = parse_field(field)
+            models.Query.objects.increment(
+                organization_id=organization_id,
+                category=category,
+                query=query,
+                count=int(count),
+                hits=int(hits.get(field, 0)),
+            )
+            flushed += 1
+    return flushed
+
+
+def get_popular_queries(organization_id, limit):
+    """Return the queries the organization searches for most often.
+
+    Only queries searched within `SEARCH_SERVICE_QUERY_LOG_WINDOW` seconds are
+    considered.
+
+    Returns:
+        list of (category, query) tuples, most popular first
+
+    """
+    since = timezone.now() - timedelta(seconds=settings.SEARCH_SERVICE_QUERY_LOG_WINDOW)
+    return list(models.Query.objects.filter(
+        organization_id=organization_id,
+        changed__gte=since,
+        count__gt=0,
+    ).order_by('-count').values_list('category', 'query')[:limit])
+
+
+def claim_miss_report(organization_id, query):
+    """Claim the report of a query that returned nothing.
+
+    Queries that have never returned results are only reported once, until
+    they start returning results. If the report can't be sent, the claim
+    should be released with `release_miss_report`.
+
+    Returns:
+        whether the miss should be reported
+
+    """
+    query = _normalize(query)
+    queries = models.Query.objects.filter(organization_id=organization_id, query=query)
+    logged = queries.aggregate(hits=Sum('hits'), reported=Max('reported'))
+    if logged['reported'] and not logged['hits']:
+        return False
+
+    if not queries.update(reported=timezone.now()):
+        models.Query.objects.increment(
+            organization_id=organization_id,
+            category=search_pb2.ALL,
+            query=query,
+            count=0,
+            hits=0,
+            reported=timezone.now(),
+        )
+    return True
+
+
+def release_miss_report(organization_id, query):
+    """Release a claim on reporting a miss so the next miss is reported."""
+    models.Query.objects.filter(
+        organization_id=organization_id,
+        query=_normalize(query),
+    ).update(reported=None)
@@ -0,0 +1,163 @@
+"""Capped, deduplicated list of the documents a profile has recently viewed.
+
+The `Recent` table is the source of truth and holds one row per profile and
+document. The most recent `SEARCH_SERVICE_RECENTS_LIMIT` documents for each
+profile are mirrored in a redis sorted set scored by when the document was
+last viewed, so reading recents doesn't have to query the table. Rows beyond
+the limit are trimmed by `search.tasks.compact_recents`.
+
+"""
+import calendar
+import logging
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+import redis
+
+from services.cache import get_redis_client
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# Only update the sorted set if it has already been populated from the
+# database, otherwise it would hold a partial list of recents.
+TRACK_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -(tonumber(ARGV[3]) + 1))
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+end
+"""
+
+COMPACT_RECENTS = """
+DELETE FROM search_recent WHERE id IN (
+    SELECT id FROM (
+        SELECT
+            id,
+            row_number() OVER (
+                PARTITION BY organization_id, by_profile_id
+                ORDER BY changed DESC
+            ) AS position
+        FROM search_recent
+    ) AS ranked
+    WHERE position > %s
+)
+"""
+
+_track_script = None
+
+
+def _get_track_script(client):
+    global _track_script
+    if _track_script is None:
+        _track_script = client.register_script(TRACK_SCRIPT)
+    return _track_script
+
+
+def _get_score(timestamp):
+    return calendar.timegm(timestamp.utctimetuple()) + timestamp.microsecond / 1e6
+
+
+def get_key(organization_id, by_profile_id):
+    return 'search:recents:%s:%s' % (organization_id, by_profile_id)
+
+
+def get_member(document_type, document_id):
+    return '%s:%s' % (document_type, document_id)
+
+
+def track(organization_id, by_profile_id, document_type, document_id):
+    """Record that the profile viewed the document."""
+    models.Recent.objects.track(
+        organization_id=organization_id,
+        by_profile_id=by_profile_id,
+        document_type=document_type,
+        document_id=document_id,
+    )
+
+    client = get_redis_client()
+    try:
+        _get_track_script(client)(
+            keys=[get_key(organization_id, by_profile_id)],
+            args=[
+                _get_score(timezone.now()),
+                get_member(document_type, document_id),
+                settings.SEARCH_SERVICE_RECENTS_LIMIT,
+                settings.SEARCH_SERVICE_RECENTS_CACHE_TIMEOUT,
+            ],
+            client=client,
+        )
+    except redis.RedisError:
+        logger.exception('failed to track recent')
+
+
+def _get_recents_from_db(organization_id, by_profile_id):
+    return models.Recent.objects.filter(
+        organization_id=organization_id,
+        by_profile_id=by_profile_id,
+    ).order_by('-changed').values_list(
+        'document_type',
+        'document_id',
+        'changed',
+    )[:settings.SEARCH_SERVICE_RECENTS_LIMIT]
+
+
+def get_recents(organization_id, by_profile_id):
+    """Return the documents the profile has recently viewed.
+
+    Returns:
+        list of (document_type, document_id) tuples, most recent first
+
+    """
+    client = get_redis_client()
+    key = get_key(organization_id, by_profile_id)
+    try:
+        members = client.zrevrange(key, 0, settings.SEARCH_SERVICE_RECENTS_LIMIT - 1)
+    except redis.RedisError:
+        logger.exception('failed to fetch recents')
+        members = None
+
+    if members:
+        return [tuple(member.split(':', 1)) for member in members]
+
+    recents = _get_recents_from_db(organization_id, by_profile_id)
+    if recents and members is not None:
+        scores = dict(
+            (get_member(document_type, document_id), _get_score(changed))
+            for document_type, document_id, changed in recents
+        )
+        pipeline = client.pipeline()
+        pipeline.delete(key)
+        pipeline.zadd(key, **scores)
+        pipeline.expire(key, settings.SEARCH_SERVICE_RECENTS_CACHE_TIMEOUT)
+        try:
+            pipeline.execute()
+        except redis.RedisError:
+            logger.exception('failed to cache recents')
+    return [(document_type, str(document_id)) for document_type, document_id, _ in recents]
+
+
+def remove(organization_id, by_profile_id, document_type, document_id):
+    """Remove the document from the profile's cached recents."""
+    client = get_redis_client()
+    try:
+        client.zrem(
+            get_key(organization_id, by_profile_id),
+            get_member(document_type, document_id),
+        )
+    except redis.RedisError:
+        logger.exception('failed to remove recent')
+
+
+def compact():
+    """Delete all but the most recent rows for each profile.
+
+    Returns:
+        number of rows deleted
+
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(COMPACT_RECENTS, [settings.SEARCH_SERVICE_RECENTS_LIMIT])
+        return cursor.rowcount
@@ -0,0 +1,57 @@
+"""Track whether ES is healthy enough to serve searches.
+
+Searches that fail or take longer than `SEARCH_SERVICE_ES_LATENCY_BUDGET`
+count against ES. After `SEARCH_SERVICE_ES_FAILURE_THRESHOLD` of them in a row
+we stop sending searches to ES for `SEARCH_SERVICE_ES_RETRY_INTERVAL` seconds
+and serve them from the Postgres store instead.
+
+State is kept per process so an unhealthy ES is detected without another
+network call on the search path.
+
+"""
+import threading
+import time
+
+from django.conf import settings
+from service import metrics
+
+_lock = threading.Lock()
+_state = {
+    'failures': 0,
+    'unavailable_until': 0,
+}
+
+
+def is_available():
+    return time.time() >= _state['unavailable_until']
+
+
+def record_success():
+    with _lock:
+        _state['failures'] = 0
+
+
+def record_failure():
+    with _lock:
+        _state['failures'] += 1
+        if _state['failures'] < settings.SEARCH_SERVICE_ES_FAILURE_THRESHOLD:
+            return
+
+        _state['failures'] = 0
+        _state['unavailable_until'] = time.time() + settings.SEARCH_SERVICE_ES_RETRY_INTERVAL
+    metrics.increment('search.es.unavailable')
+
+
+def record_took(took_ms):
+    """Record how long a search took in ES."""
+    budget = settings.SEARCH_SERVICE_ES_LATENCY_BUDGET
+    if budget and took_ms > budget * 1000:
+        record_failure()
+    else:
+        record_success()
+
+
+def reset():
+    with _lock:
+        _state['failures'] = 0
+        _state['unavailable_until'] = 0
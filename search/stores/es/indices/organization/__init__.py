@@ -1 +1 @@
-INDEX_VERSION = 7
+INDEX_VERSION = 8
@@ -1,16 +1,21 @@
 import logging
 import time
+import zlib
 
+from django.conf import settings
 from elasticsearch_dsl import (
     connections,
     Index,
 )
 from . import INDEX_VERSION
+from ..... import cache
 from ... import types
 from ...analysis import default_search
 
 logger = logging.getLogger(__name__)
 
+SHARED_INDEX_PREFIX = 'shared'
+
 
 class DuplicateIndex(Exception):
     pass
@@ -29,7 +34,110 @@ def get_index_name(organization_id, version=None):
     return '%s_v%s' % (organization_id, version)
 
 
+def shared_indices_enabled():
+    return bool(settings.SEARCH_SERVICE_SHARED_INDEX_COUNT)
+
+
+def get_shared_index_name(organization_id, version=None):
+    """Return the name of the shared index the organization belongs in."""
+    version = version or INDEX_VERSION
+    number = (zlib.crc32(str(organization_id)) & 0xffffffff) % (
+        settings.SEARCH_SERVICE_SHARED_INDEX_COUNT
+    )
+    return '%s_%s_v%s' % (SHARED_INDEX_PREFIX, number, version)
+
+
+def is_shared_index(index_name):
+    return index_name.startswith('%s_' % (SHARED_INDEX_PREFIX,))
+
+
+def get_routing(index_name, organization_id):
+    """Return the routing for the organization's documents in the index.
+
+    Documents in shared indices are routed by organization so each
+    organization's documents live on a single shard.
+
+    """
+    if is_shared_index(index_name):
+        return str(organization_id)
+
+
+def get_read_alias_options(index_name, organization_id):
+    """Return the options for the organization's read alias on the index."""
+    if not is_shared_index(index_name):
+        return {}
+
+    return {
+        'routing': str(organization_id),
+        'filter': {'term': {'organization_id': str(organization_id)}},
+    }
+
+
+def get_write_alias_options(index_name, organization_id):
+    """Return the options for the organization's write alias on the index."""
+    if not is_shared_index(index_name):
+        return {}
+
+    return {'routing': str(organization_id)}
+
+
+def _build_index(index_name):
+    index = Index(index_name)
+    index.settings(index={'analysis': default_search.get_analysis_definition()})
+    # XXX make it easier/document how to add a document type
+    doc_types = ['LocationV1', 'PostV1', 'ProfileV1', 'TeamV1', 'CollectionV1']
+    for doc_type in doc_types:
+        index.doc_type(getattr(types, doc_type))
+    return index
+
+
+def _wait_for_cluster(index):
+    waiting = True
+    while waiting:
+        health = index.connection.cluster.health()
+        waiting = health['status'] == 'red'
+        # XXX switch to logger
+        logger.info('waiting for cluster to get out of "red" status: %s' % (health,))
+        time.sleep(1)
+
+
+def _create_shared_index(es, organization_id, version=None):
+    """Add the organization's aliases to its shared index, creating the index if necessary."""
+    index_name = get_shared_index_name(organization_id, version=version)
+    index = _build_index(index_name)
+    if not es.indices.exists(index=index_name):
+        # another organization may create the index at the same time
+        index.create(ignore=400)
+        _wait_for_cluster(index)
+
+    write_alias = get_write_alias(organization_id)
+    read_alias = get_read_alias(organization_id)
+    actions = [{'add': dict(
+        {'index': index_name, 'alias': write_alias},
+        **get_write_alias_options(index_name, organization_id)
+    )}]
+    if not es.indices.exists_alias('*', read_alias):
+        actions.append({'add': dict(
+            {'index': index_name, 'alias': read_alias},
+            **get_read_alias_options(index_name, organization_id)
+        )})
+    es.indices.update_aliases(body={'actions': actions})
+    return index
+
+
 def create_index(organization_id, version=None, check_duplicate=True):
+    """Create the organization's index and aliases.
+
+    If `SEARCH_SERVICE_SHARED_INDEX_COUNT` is set, the organization's aliases
+    are added to a shared index instead of creating an index for the
+    organization. Read aliases on shared indices are filtered by organization
+    and both aliases are routed by organization, so searching and indexing
+    through the aliases works the same either way.
+
+    Without `check_duplicate`, an index left behind by an earlier attempt
+    (e.g. a failed migration) is reused and its aliases are restored.
+
+    """
     es = connections.connections.get_connection()
     write_alias = get_write_alias(organization_id)
     read_alias = get_read_alias(organization_id)
@@ -37,8 +145,20 @@ def create_index(organization_id, version=None, check_duplicate=True):
         aliases = es.indices.get_alias('*', organization_id)
         raise DuplicateIndex(aliases)
 
+    if shared_indices_enabled():
+        index = _create_shared_index(es, organization_id, version=version)
+        cache.invalidate_write_indices(organization_id)
+        return index
+
     index_name = get_index_name(organization_id, version=version)
-    index = Index(index_name)
+    index = _build_index(index_name)
+    if not check_duplicate and es.indices.exists(index=index_name):
+        actions = [{'add': {'index': index_name, 'alias': write_alias}}]
+        if not es.indices.exists_alias('*', read_alias):
+            actions.append({'add': {'index': index_name, 'alias': read_alias}})
+        es.indices.update_aliases(body={'actions': actions})
+        cache.invalidate_write_indices(organization_id)
+        return index
 
     aliases = {write_alias: {}}
     # we only create the read alias if one doesn't exist already. otherwise it
@@ -47,18 +167,7 @@ def create_index(organization_id, version=None, check_duplicate=True):
         aliases[read_alias] = {}
 
     index.aliases(**aliases)
-    index.settings(index={'analysis': default_search.get_analysis_definition()})
-    # XXX make it easier/document how to add a document type
-    doc_types = ['LocationV1', 'PostV1', 'ProfileV1', 'TeamV1', 'CollectionV1']
-    for doc_type in doc_types:
-        index.doc_type(getattr(types, doc_type))
-
     index.create()
-    waiting = True
-    while waiting:
-        health = index.connection.cluster.health()
-        waiting = health['status'] == 'red'
-        # XXX switch to logger
-        logger.info('waiting for cluster to get out of "red" status: %s' % (health,))
-        time.sleep(1)
+    cache.invalidate_write_indices(organization_id)
+    _wait_for_cluster(index)
     return index
@@ -0,0 +1,212 @@
+"""Precompiled query plans for search_v2.
+
+Building the request body for a search requires constructing elasticsearch_dsl
+`Q` objects for every statement, serializing them and then serializing the
+entire body to JSON. None of that depends on the query other than the query
+string itself, so we build the body once per category with a placeholder
+query and split the serialized body around the placeholder. At request time we
+only have to JSON encode the query and join the fragments.
+
+"""
+import json
+
+from elasticsearch_dsl import Q
+from protobufs.services.search.containers import search_pb2
+
+from . import types
+from .types.collection import actions as collection_actions
+from .types.post import actions as post_actions
+from .types.profile import actions as profile_actions
+from .types.team import actions as team_actions
+
+CATEGORY_TO_ACTIONS = {
+    search_pb2.POSTS: [post_actions],
+    search_pb2.PROFILES: [profile_actions],
+    search_pb2.TEAMS: [team_actions],
+    search_pb2.COLLECTIONS: [collection_actions],
+}
+
+CATEGORY_TO_DOC_TYPE = {
+    search_pb2.POSTS: types.PostV1,
+    search_pb2.PROFILES: types.ProfileV1,
+    search_pb2.TEAMS: types.TeamV1,
+    search_pb2.COLLECTIONS: types.CollectionV1,
+}
+
+# categories searched independently when searching all categories with `_msearch`
+MULTI_SEARCH_CATEGORIES = [
+    search_pb2.PROFILES,
+    search_pb2.TEAMS,
+    search_pb2.POSTS,
+    search_pb2.COLLECTIONS,
+]
+
+RESCORE_WINDOW_SIZE = 20
+
+QUERY_PLACEHOLDER = u'$$query$$'
+
+_plans = {}
+
+
+def _get_statement_key(statement):
+    if hasattr(statement, 'to_dict'):
+        statement = statement.to_dict()
+    return json.dumps(statement, sort_keys=True)
+
+
+def _combine_statements(statement_funcs, query):
+    statements = []
+    seen = set()
+    for func in statement_funcs:
+        for statement in func(query):
+            key = _get_statement_key(statement)
+            if key not in seen:
+                seen.add(key)
+                statements.append(statement)
+    return statements
+
+
+def _get_actions(category):
+    if category == search_pb2.ALL:
+        return sum(CATEGORY_TO_ACTIONS.values(), [])
+    return CATEGORY_TO_ACTIONS[category]
+
+
+def _get_statements(category, statement_type, query):
+    statements = []
+    for action in _get_actions(category):
+        if hasattr(action, statement_type):
+            statements.append(getattr(action, statement_type))
+
+    if statements:
+        return _combine_statements(statements, query)
+
+
+def get_doc_type(category):
+    """Return the doc_type we should search for the given category.
+
+    Returns None if all doc types should be searched.
+
+    """
+    doc_type = CATEGORY_TO_DOC_TYPE.get(category)
+    if doc_type is not None:
+        return doc_type._doc_type.name
+
+
+def get_excluded_source_fields(doc_type_name):
+    """Return the source fields to exclude when fetching documents of the doc type.
+
+    Args:
+        doc_type_name (str): name of the document type
+
+    Returns:
+        list of excluded field names or None
+
+    """
+    for category, doc_type in CATEGORY_TO_DOC_TYPE.iteritems():
+        if doc_type._doc_type.name == doc_type_name:
+            return _get_statements(category, 'get_excluded_source_fields_v1', None)
+
+
+def build_search_body(category, query):
+    """Build the search request body for the query.
+
+    Args:
+        category (search_pb2.CategoryV1): category we're searching
+        query (str): query string
+
+    Returns:
+        dict of the request body
+
+    """
+    should_statements = _get_statements(category, 'get_should_statements_v1', query)
+    rescore_statements = _get_statements(category, 'get_rescore_statements_v1', query)
+    highlight_fields = _get_statements(category, 'get_highlight_fields_v1', query)
+    excluded_source_fields = _get_statements(category, 'get_excluded_source_fields_v1', query)
+
+    body = {'query': Q('bool', should=should_statements).to_dict()}
+    if rescore_statements:
+        rescore_query = Q('bool', should=rescore_statements)
+        body['rescore'] = {
+            'window_size': RESCORE_WINDOW_SIZE,
+            'query': {
+                'rescore_query': rescore_query.to_dict(),
+            },
+        }
+
+    if highlight_fields:
+        body['highlight'] = {
+            'number_of_fragments': 1,
+            'order': 'score',
+            'fields': dict((field.field_name, field.options) for field in highlight_fields),
+            'pre_tags': ['<mark>'],
+            'post_tags': ['</mark>'],
+        }
+
+    if excluded_source_fields:
+        body['_source'] = {
+            'exclude': excluded_source_fields,
+        }
+    return body
+
+
+class QueryPlan(object):
+    """Precompiled request body for a search category.
+
+    Args:
+        category (search_pb2.CategoryV1): category the plan is for
+
+    """
+
+    def __init__(self, category):
+        self.category = category
+        self.doc_type = get_doc_type(category)
+        self._compile(json.dumps(build_search_body(category, QUERY_PLACEHOLDER)))
+
+    def _compile(self, serialized):
+        self.fragments = serialized.split(json.dumps(QUERY_PLACEHOLDER))
+
+    def render(self, query):
+        """Return the serialized request body for the query."""
+        return json.dumps(query).join(self.fragments)
+
+
+class MultiSearchPlan(QueryPlan):
+    """Precompiled `_msearch` request body with a sub-search per category.
+
+    Args:
+        size (int): max number of results to return for each category
+        timeout (Optional[str]): time budget for each sub-search. a sub-search
+            that runs out of time returns the results it has collected so far.
+
+    """
+
+    def __init__(self, size, timeout=None):
+        self.categories = MULTI_SEARCH_CATEGORIES
+        self.doc_type = None
+        lines = []
+        for category in self.categories:
+            body = build_search_body(category, QUERY_PLACEHOLDER)
+            body['size'] = size
+            if timeout:
+                body['timeout'] = timeout
+            lines.append(json.dumps({'type': get_doc_type(category)}))
+            lines.append(json.dumps(body))
+        self._compile('\n'.join(lines) + '\n')
+
+
+def get_query_plan(category):
+    """Return the QueryPlan for the category, compiling it if necessary."""
+    plan = _plans.get(category)
+    if plan is None:
+        plan = _plans[category] = QueryPlan(category)
+    return plan
+
+
+def get_multi_search_plan(size, timeout=None):
+    """Return the MultiSearchPlan for searching all categories."""
+    key = ('msearch', size, timeout)
+    plan = _plans.get(key)
+    if plan is None:
+        plan = _plans[key] = MultiSearchPlan(size, timeout=timeout)
+    return plan
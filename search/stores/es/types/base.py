@@ -1,10 +1,15 @@
 from collections import namedtuple
 
-from elasticsearch_dsl import DocType
+from elasticsearch_dsl import (
+    DocType,
+    String,
+)
 from elasticsearch_dsl.document import DocTypeMeta
+from google.protobuf.descriptor import FieldDescriptor
 from protobuf_to_dict import (
     dict_to_protobuf,
     protobuf_to_dict,
+    TYPE_CALLABLE_MAP,
 )
 from six import add_metaclass
 
@@ -33,18 +38,299 @@ def _set_nested_value(path, data, value):
     _set_nested_value(path, data[part], value)
 
 
+def _build_field_setter(field):
+    """Build a function that writes a decoded JSON value to the given field."""
+    name = field.name
+    if field.type == FieldDescriptor.TYPE_MESSAGE:
+        message_options = field.message_type.GetOptions()
+        if getattr(message_options, 'map_entry', False):
+            value_field = field.message_type.fields_by_name['value']
+            if value_field.type == FieldDescriptor.TYPE_MESSAGE:
+                def _set(message, value):
+                    container = getattr(message, name)
+                    for key, item in value.iteritems():
+                        _decode_message(item, container[key])
+            else:
+                def _set(message, value):
+                    getattr(message, name).update(value)
+        elif field.label == FieldDescriptor.LABEL_REPEATED:
+            def _set(message, value):
+                container = getattr(message, name)
+                for item in value:
+                    _decode_message(item, container.add())
+        else:
+            def _set(message, value):
+                _decode_message(value, getattr(message, name))
+    elif field.type == FieldDescriptor.TYPE_ENUM:
+        values_by_name = field.enum_type.values_by_name
+
+        def _to_enum(value):
+            if isinstance(value, basestring):
+                return values_by_name[value].number
+            return value
+
+        if field.label == FieldDescriptor.LABEL_REPEATED:
+            def _set(message, value):
+                getattr(message, name).extend(_to_enum(item) for item in value)
+        else:
+            def _set(message, value):
+                setattr(message, name, _to_enum(value))
+    elif field.label == FieldDescriptor.LABEL_REPEATED:
+        def _set(message, value):
+            getattr(message, name).extend(value)
+    else:
+        def _set(message, value):
+            setattr(message, name, value)
+    return _set
+
+
+# cache of message descriptor -> {field name: setter}
+_setters = {}
+
+
+def _get_field_setters(descriptor):
+    setters = _setters.get(descriptor)
+    if setters is None:
+        setters = _setters[descriptor] = dict(
+            (field.name, _build_field_setter(field)) for field in descriptor.fields
+        )
+    return setters
+
+
+def _decode_message(data, message):
+    setters = _get_field_setters(message.DESCRIPTOR)
+    for key, value in data.iteritems():
+        if value is None:
+            continue
+
+        setter = setters.get(key)
+        if setter is not None:
+            setter(message, value)
+
+
+def _build_path_setter(path, protobuf):
+    """Build a function that writes a value to a (possibly nested) protobuf field."""
+    parts = path.split('.')
+    descriptor = protobuf.DESCRIPTOR
+    for part in parts[:-1]:
+        descriptor = descriptor.fields_by_name[part].message_type
+
+    parents = parts[:-1]
+    setter = _get_field_setters(descriptor)[parts[-1]]
+
+    def _set(message, value):
+        for part in parents:
+            message = getattr(message, part)
+        setter(message, value)
+    return _set
+
+
+def build_source_decoder(document_to_protobuf_mapping, protobuf):
+    """Build a decoder that writes an ES `_source` dict to a protobuf.
+
+    This is equivalent to calling `prepare_protobuf_dict` and then
+    `dict_to_protobuf`, but all of the mapping and field type resolution is
+    done once when the document type is created.
+
+    Args:
+        document_to_protobuf_mapping (dict): the document type's mapping
+        protobuf (protobuf class): the protobuf the document translates to
+
+    Returns:
+        function accepting (source, container)
+
+    """
+    # document field name -> (nested setter, whether the original field should be
+    # replaced)
+    remapped = {}
+    for field_name, proto_field_name in (document_to_protobuf_mapping or {}).iteritems():
+        replace = True
+        if isinstance(proto_field_name, DocumentToProtobufOptions):
+            replace = proto_field_name.replace
+            proto_field_name = proto_field_name.field_name
+        remapped[field_name] = (_build_path_setter(proto_field_name, protobuf), replace)
+
+    setters = _get_field_setters(protobuf.DESCRIPTOR)
+
+    def decode(source, container):
+        for key, value in source.iteritems():
+            if value is None:
+                continue
+
+            if key in remapped:
+                path_setter, replace = remapped[key]
+                path_setter(container, value)
+                if replace:
+                    continue
+
+            setter = setters.get(key)
+            if setter is not None:
+                setter(container, value)
+    return decode
+
+
+def build_highlight_decoder(document_to_protobuf_mapping):
+    """Build a decoder that writes ES highlights to a highlight map.
+
+    This is equivalent to calling `prepare_highlight_dict` and then copying the
+    top fragment for each field into the highlight map.
+
+    Args:
+        document_to_protobuf_mapping (dict): the document type's mapping
+
+    Returns:
+        function accepting (highlight, highlight_map)
+
+    """
+    # document field name -> highlight keys
+    keys = {}
+    for field_name, proto_field_name in (document_to_protobuf_mapping or {}).iteritems():
+        replace = True
+        if isinstance(proto_field_name, DocumentToProtobufOptions):
+            replace = proto_field_name.replace
+            if not proto_field_name.on_prepare_highlight_dict:
+                proto_field_name = field_name
+            else:
+                proto_field_name = proto_field_name.field_name
+
+        keys[field_name] = (proto_field_name,) if replace else (field_name, proto_field_name)
+
+    def decode(highlight, highlight_map):
+        # ES returns highlight fragments as a dictionary of <field name: array
+        # of fragments>. We only want to return the top highlight fragment.
+        for field_name, fragments in highlight.iteritems():
+            for key in keys.get(field_name, (field_name,)):
+                highlight_map[key] = fragments[0]
+    return decode
+
+
+def _build_field_converter(field):
+    """Build a function that converts a field value the way `protobuf_to_dict` does.
+
+    Returns None for map fields, which are left to `protobuf_to_dict`.
+
+    """
+    if field.type == FieldDescriptor.TYPE_MESSAGE:
+        if getattr(field.message_type.GetOptions(), 'map_entry', False):
+            return None
+        convert = protobuf_to_dict
+    else:
+        convert = TYPE_CALLABLE_MAP[field.type]
+
+    if field.label == FieldDescriptor.LABEL_REPEATED:
+        return lambda values: [convert(value) for value in values]
+    return convert
+
+
+def build_action_encoder(doc_type, document_to_protobuf_mapping, from_protobuf_transforms, protobuf):
+    """Build an encoder that writes a protobuf as a bulk index action.
+
+    This is equivalent to calling `from_protobuf` and then
+    `to_dict(include_meta=True)`, but the field conversions, mapping and
+    transforms are resolved once when the document type is created and we
+    never construct the `DocType`.
+
+    Args:
+        doc_type (elasticsearch_dsl.document.DocTypeOptions): the document
+            type's options
+        document_to_protobuf_mapping (dict): the document type's mapping
+        from_protobuf_transforms (dict): the document type's transforms
+        protobuf (protobuf class): the protobuf the document translates from
+
+    Returns:
+        function accepting (protobuf)
+
+    """
+    converters = dict(
+        (field.name, _build_field_converter(field)) for field in protobuf.DESCRIPTOR.fields
+    )
+
+    # (document field name, protobuf field path)
+    moves = []
+    for field_name, proto_field_name in (document_to_protobuf_mapping or {}).iteritems():
+        if isinstance(proto_field_name, DocumentToProtobufOptions):
+            if not proto_field_name.on_from_protobuf:
+                proto_field_name = field_name
+            else:
+                proto_field_name = proto_field_name.field_name
+        moves.append((field_name, proto_field_name))
+
+    transforms = (from_protobuf_transforms or {}).items()
+    # fields the `DocType` converts on the way in (ie. parsing dates)
+    coerced = [(name, doc_type.mapping[name]) for name in doc_type.mapping if
+               doc_type.mapping[name]._coerce]
+
+    def encode(message):
+        data = {}
+        for field, value in message.ListFields():
+            convert = converters.get(field.name)
+            if convert is None or field.is_extension:
+                data = protobuf_to_dict(message)
+                break
+            data[field.name] = convert(value)
+
+        for field_name, path in moves:
+            value = _get_nested_value(path, data)
+            if value is not None:
+                data[field_name] = value
+
+        for field_name, transform in transforms:
+            if field_name in data:
+                data[field_name] = transform(data[field_name])
+
+        for field_name, field in coerced:
+            if field_name in data:
+                value = field.to_python(data[field_name])
+                if isinstance(value, list):
+                    value = [i.to_dict() if hasattr(i, 'to_dict') else i for i in value]
+                elif hasattr(value, 'to_dict'):
+                    value = value.to_dict()
+                data[field_name] = value
+
+        action = {
+            '_id': message.id,
+            '_type': doc_type.name,
+            # `DocType` doesn't serialize empty values
+            '_source': dict((k, v) for k, v in data.iteritems() if v not in ([], {}, None)),
+        }
+        if doc_type.index:
+            action['_index'] = doc_type.index
+        return action
+    return encode
+
+
 class Options(object):
 
-    def __init__(self, protobuf):
+    def __init__(self, protobuf, decode_source=None, decode_highlight=None, encode_action=None):
         self.protobuf = protobuf
+        self.decode_source = decode_source
+        self.decode_highlight = decode_highlight
+        self.encode_action = encode_action
 
 
 class BaseDocTypeMeta(DocTypeMeta):
 
     def __new__(cls, name, bases, attrs):
         meta = attrs.get('Meta')
-        attrs['_options'] = Options(protobuf=getattr(meta, 'protobuf', None))
-        return super(BaseDocTypeMeta, cls).__new__(cls, name, bases, attrs)
+        protobuf = getattr(meta, 'protobuf', None)
+        options = Options(protobuf=protobuf)
+        mapping = attrs.get('document_to_protobuf_mapping')
+        if protobuf is not None:
+            # read aliases on shared indices are filtered by organization
+            attrs.setdefault('organization_id', String(index='not_analyzed'))
+            options.decode_source = build_source_decoder(mapping, protobuf)
+            options.decode_highlight = build_highlight_decoder(mapping)
+        attrs['_options'] = options
+        new_cls = super(BaseDocTypeMeta, cls).__new__(cls, name, bases, attrs)
+        if protobuf is not None:
+            # the encoder needs the field mapping built by `DocTypeMeta`
+            options.encode_action = build_action_encoder(
+                new_cls._doc_type,
+                mapping,
+                attrs.get('from_protobuf_transforms'),
+                protobuf,
+            )
+        return new_cls
 
 
 @add_metaclass(BaseDocTypeMeta)
@@ -75,6 +361,15 @@ class BaseDocType(DocType):
 
         return cls(_id=protobuf.id, **data)
 
+    @classmethod
+    def to_action(cls, protobuf):
+        """Return the bulk index action for a protobuf.
+
+        Equivalent to `cls.from_protobuf(protobuf).to_dict(include_meta=True)`.
+
+        """
+        return cls._options.encode_action(protobuf)
+
     @classmethod
     def prepare_protobuf_dict(cls, data):
         if cls.document_to_protobuf_mapping:
@@ -107,6 +402,16 @@ class BaseDocType(DocType):
                 if value is not None:
                     _set_nested_value(proto_field_name, data, value)
 
+    @classmethod
+    def decode_source(cls, source, container):
+        """Write the `_source` of an ES hit into container."""
+        cls._options.decode_source(source, container)
+
+    @classmethod
+    def decode_highlight(cls, highlight, highlight_map):
+        """Write the top fragment of each highlighted field into highlight_map."""
+        cls._options.decode_highlight(highlight, highlight_map)
+
     def to_protobuf(self):
         data = self.to_dict()
         self.prepare_protobuf_dict(data)
@@ -1,9 +1,51 @@
+import hashlib
+import re
+from xml.sax.saxutils import escape
+
 from bleach.encoding import force_unicode
 import html5lib
-from html5lib.constants import tokenTypes
+from html5lib.constants import (
+    entities,
+    replacementCharacters,
+    tokenTypes,
+)
 from html5lib.serializer import serialize
 from html5lib.tokenizer import HTMLTokenizer
 
+from services.utils import LRUCache
+
+# number of transformed documents to keep in memory per process
+TRANSFORM_CACHE_SIZE = 1024
+
+_transform_cache = LRUCache(TRANSFORM_CACHE_SIZE)
+
+# html5lib's definition of whitespace
+SPACE_CHARACTERS = u'\t\n\x0c '
+SPACE_CHARACTERS_SET = frozenset(SPACE_CHARACTERS)
+
+BR_NAMES = frozenset(['br', 'bR', 'Br', 'BR'])
+
+# Characters html5lib's input stream and tokenizer have special handling for
+# that the fast path doesn't reproduce.
+UNSUPPORTED_CHARACTERS_RE = re.compile(u'[\x00\r\ufeff]')
+
+# Tokens the fast path supports. This is a strict subset of what html5lib
+# accepts: anything else (doctypes, CDATA, bogus comments, stray "<" or "&",
+# quotes in unexpected places, etc.) falls back to html5lib.
+TOKEN_RE = re.compile(u'''
+    (?P<text>[^<&]+)
+    | <(?:/)?(?P<name>[a-zA-Z][^\\t\\n\\x0c />]*)
+        (?:[\\t\\n\\x0c ]+[^\\t\\n\\x0c />"'=<]+
+            (?:[\\t\\n\\x0c ]*=[\\t\\n\\x0c ]*(?:"[^"]*"|'[^']*'|[^\\t\\n\\x0c >"'=<`]+))?
+        )*
+        [\\t\\n\\x0c ]*/?>
+    | <!--(?!-?>)(?:(?!--!)[\\s\\S])*?-->
+    | &(?P<entity>[a-zA-Z][a-zA-Z0-9]*;)
+    | (?P<ampersand>&)(?=[\t\n\x0c <&]|$)
+    | &\\#(?P<decimal>[0-9]{1,7});
+    | &\\#[xX](?P<hex>[0-9a-fA-F]{1,6});
+''', re.VERBOSE | re.UNICODE)
+
 
 class PostSanitizerMixin(object):
 
@@ -34,8 +76,7 @@ class PostSanitizer(HTMLTokenizer, PostSanitizerMixin):
                 yield token
 
 
-def transform_html(text):
-    text = force_unicode(text)
+def _transform_html_with_html5lib(text):
     parser = html5lib.HTMLParser(tokenizer=PostSanitizer)
     tree = parser.parseFragment(text)
     try:
@@ -43,3 +84,95 @@ def transform_html(text):
     except TypeError:
         serialized = ''
     return force_unicode(serialized)
+
+
+def _get_character_reference(value, base):
+    code_point = int(value, base)
+    if (
+        code_point in replacementCharacters or
+        0xD800 <= code_point <= 0xDFFF or
+        code_point > 0xFFFF
+    ):
+        return None
+    return unichr(code_point)
+
+
+def _transform_html_fast(text):
+    """Extract text the same way `_transform_html_with_html5lib` does.
+
+    Rather than building and serializing a DOM we emit the sanitized text
+    tokens directly. Since the sanitizer drops every tag other than `br`, the
+    tree builder never switches the tokenizer out of its data state, so the
+    output only depends on the tokens below. Returns None if the text contains
+    anything outside of the supported subset.
+
+    """
+    if UNSUPPORTED_CHARACTERS_RE.search(text):
+        return None
+
+    parts = []
+    position = 0
+    length = len(text)
+    while position < length:
+        match = TOKEN_RE.match(text, position)
+        if match is None:
+            return None
+
+        position = match.end()
+        kind = match.lastgroup
+        if kind == 'text':
+            # html5lib emits leading whitespace as a separate token which the
+            # sanitizer drops
+            data = match.group('text').lstrip(SPACE_CHARACTERS)
+            if data:
+                parts.append(data)
+                parts.append(u' ')
+        elif kind == 'name':
+            if match.group('name') in BR_NAMES:
+                parts.append(u'\n')
+        else:
+            if kind == 'entity':
+                data = entities.get(match.group('entity'))
+            elif kind == 'ampersand':
+                data = u'&'
+            elif kind in ('decimal', 'hex'):
+                data = _get_character_reference(match.group(kind), 10 if kind == 'decimal' else 16)
+            else:
+                # comment
+                continue
+
+            if data is None:
+                return None
+            # html5lib emits whitespace references as whitespace tokens which
+            # the sanitizer drops
+            if data not in SPACE_CHARACTERS_SET:
+                parts.append(data)
+                parts.append(u' ')
+    return escape(u''.join(parts)).strip()
+
+
+def _get_transform_key(text):
+    return hashlib.sha1(text.encode('utf-8')).digest()
+
+
+def prime_transform(text, transformed):
+    """Memoize text we've already extracted from an html document (ie. a
+    post's stored `plain_text`) so `transform_html` doesn't reparse it."""
+    _transform_cache.set(_get_transform_key(force_unicode(text)), transformed)
+
+
+def transform_html(text):
+    """Return the plain text content of an html document.
+
+    Results are memoized by a hash of the content.
+
+    """
+    text = force_unicode(text)
+    key = _get_transform_key(text)
+    transformed = _transform_cache.get(key)
+    if transformed is None:
+        transformed = _transform_html_fast(text)
+        if transformed is None:
+            transformed = _transform_html_with_html5lib(text)
+        _transform_cache.set(key, transformed)
+    return transformed
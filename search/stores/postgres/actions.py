@@ -0,0 +1,347 @@
+"""Search documents with Postgres full-text search.
+
+The Postgres store keeps a copy of the documents we index into ES in
+`search.models.Document`, with the text we search extracted from their
+`_source`. It's searched when ES is unavailable or slower than
+`SEARCH_SERVICE_ES_LATENCY_BUDGET` (see `search.stores.es.health`), and can
+replace ES entirely for small deployments and tests by setting
+`SEARCH_SERVICE_ENGINE` to "postgres".
+
+Queries match each term as a prefix against the title and content of the
+document with a GIN indexed tsvector, or the whole query against the title by
+trigram similarity (`pg_trgm`) so partial and misspelled names still match.
+
+As the primary engine, Postgres serves `search_v2` and `get_recents`.
+
+"""
+import json
+import re
+import uuid
+
+from django.conf import settings
+from django.db import (
+    connection,
+    IntegrityError,
+    transaction,
+)
+from django.utils import timezone
+from protobufs.services.search.containers import search_pb2
+
+from ..es.plans import get_excluded_source_fields
+from ..es.types.collection.document import CollectionV1
+from ..es.types.post.document import PostV1
+from ..es.types.profile.document import ProfileV1
+from ..es.types.team.document import TeamV1
+
+ENGINE = 'postgres'
+
+# number of results ES returns when the size isn't set
+DEFAULT_SIZE = 10
+
+# doc type -> (title fields, content fields) in the document's `_source`
+DOCUMENT_FIELDS = {
+    ProfileV1._doc_type.name: (['full_name'], ['display_title', 'email']),
+    TeamV1._doc_type.name: (['name'], ['description']),
+    PostV1._doc_type.name: (['title'], ['content']),
+    CollectionV1._doc_type.name: (['collection_name'], []),
+}
+
+CATEGORY_TO_DOC_TYPES = {
+    search_pb2.PROFILES: [ProfileV1._doc_type.name],
+    search_pb2.TEAMS: [TeamV1._doc_type.name],
+    search_pb2.POSTS: [PostV1._doc_type.name],
+    search_pb2.COLLECTIONS: [CollectionV1._doc_type.name],
+}
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# max number of documents written by a single statement
+BATCH_SIZE = 500
+
+# the tsvector and trigram expressions match the GIN indexes created in
+# search/migrations/0005_document.py
+SEARCH_SQL = """
+SELECT
+    document_type,
+    document_id,
+    source,
+    ts_rank(to_tsvector('english', title || ' ' || content), to_tsquery('english', %(terms)s))
+        + similarity(title, %(query)s) AS score
+FROM search_document
+WHERE
+    organization_id = %(organization_id)s
+    AND document_type IN %(document_types)s
+    AND (
+        to_tsvector('english', title || ' ' || content) @@ to_tsquery('english', %(terms)s)
+        OR title %% %(query)s
+    )
+ORDER BY score DESC, document_id
+LIMIT %(size)s
+"""
+
+# bulk writes join against a VALUES list of the batch. Postgres 9.4 doesn't
+# support `ON CONFLICT`, so documents are updated and then the missing ones
+# inserted. like `external_gte` in ES, a newer version is never overwritten.
+VERSION_CONDITION = """
+    search_document.organization_id = %s
+    AND search_document.document_type = batch.document_type
+    AND search_document.document_id = batch.document_id
+    AND (
+        batch.version IS NULL
+        OR search_document.version IS NULL
+        OR search_document.version <= batch.version
+    )
+"""
+
+UPDATE_SQL = """
+UPDATE search_document SET
+    version = batch.version,
+    title = batch.title,
+    content = batch.content,
+    source = batch.source,
+    changed = %s
+FROM (VALUES {values}) AS batch (document_type, document_id, version, title, content, source)
+WHERE
+""" + VERSION_CONDITION
+
+UPDATE_ROW_SQL = '(%s, %s::uuid, %s::bigint, %s, %s, %s)'
+
+INSERT_SQL = """
+INSERT INTO search_document (
+    id,
+    created,
+    changed,
+    organization_id,
+    document_type,
+    document_id,
+    version,
+    title,
+    content,
+    source
+)
+SELECT
+    batch.id,
+    %s,
+    %s,
+    %s::uuid,
+    batch.document_type,
+    batch.document_id,
+    batch.version,
+    batch.title,
+    batch.content,
+    batch.source
+FROM (VALUES {values}) AS batch (id, document_type, document_id, version, title, content, source)
+WHERE NOT EXISTS (
+    SELECT 1 FROM search_document AS existing
+    WHERE
+        existing.organization_id = %s
+        AND existing.document_type = batch.document_type
+        AND existing.document_id = batch.document_id
+)
+"""
+
+INSERT_ROW_SQL = '(%s::uuid, %s, %s::uuid, %s::bigint, %s, %s, %s)'
+
+DELETE_SQL = """
+DELETE FROM search_document
+USING (VALUES {values}) AS batch (document_type, document_id, version)
+WHERE
+""" + VERSION_CONDITION
+
+DELETE_ROW_SQL = '(%s, %s::uuid, %s::bigint)'
+
+GET_DOCUMENTS_SQL = """
+SELECT document_type, document_id, source
+FROM search_document
+WHERE organization_id = %s AND (document_type, document_id::text) IN %s
+"""
+
+
+def is_primary():
+    """Return whether Postgres is the search engine instead of ES."""
+    return settings.SEARCH_SERVICE_ENGINE == ENGINE
+
+
+def is_enabled():
+    """Return whether documents should be written to the Postgres store."""
+    return is_primary() or settings.SEARCH_SERVICE_POSTGRES_FALLBACK
+
+
+def get_doc_types(category):
+    if category == search_pb2.ALL:
+        return sum(CATEGORY_TO_DOC_TYPES.values(), [])
+    return CATEGORY_TO_DOC_TYPES.get(category, [])
+
+
+def get_terms(query):
+    """Return a tsquery matching each term in the query as a prefix."""
+    return ' & '.join('%s:*' % (term,) for term in TERM_RE.findall(query.lower()))
+
+
+def _get_text(source, fields):
+    return ' '.join(unicode(source[field]) for field in fields if source.get(field))
+
+
+def _get_source(document_type, source):
+    source = json.loads(source)
+    for field in get_excluded_source_fields(document_type) or []:
+        source.pop(field, None)
+    return source
+
+
+def _execute_batch(cursor, sql, row_sql, rows, before, after):
+    values = ', '.join([row_sql] * len(rows))
+    cursor.execute(sql.format(values=values), before + [value for row in rows for value in row] + after)
+
+
+def _get_latest_actions(actions):
+    """Return the action that wins for each document.
+
+    Within a batch, the action with the newest version wins (the last one if
+    they're tied), the same as applying them one at a time.
+
+    """
+    latest = {}
+    for action in actions:
+        if action['_type'] not in DOCUMENT_FIELDS:
+            continue
+
+        key = (action['_type'], action['_id'])
+        current = latest.get(key)
+        if (
+            current is None or
+            action.get('_version') is None or
+            current.get('_version') is None or
+            action['_version'] >= current['_version']
+        ):
+            latest[key] = action
+    return latest.values()
+
+
+def _index(cursor, organization_id, actions):
+    now = timezone.now()
+    rows = []
+    for action in actions:
+        title_fields, content_fields = DOCUMENT_FIELDS[action['_type']]
+        source = action['_source']
+        rows.append([
+            action['_type'],
+            str(action['_id']),
+            action.get('_version'),
+            _get_text(source, title_fields),
+            _get_text(source, content_fields),
+            json.dumps(source),
+        ])
+
+    _execute_batch(cursor, UPDATE_SQL, UPDATE_ROW_SQL, rows, [now], [organization_id])
+    try:
+        with transaction.atomic():
+            _execute_batch(
+                cursor,
+                INSERT_SQL,
+                INSERT_ROW_SQL,
+                [[str(uuid.uuid4())] + row for row in rows],
+                [now, now, organization_id],
+                [organization_id],
+            )
+    except IntegrityError:
+        # lost a race with another indexer creating the same documents
+        _execute_batch(cursor, UPDATE_SQL, UPDATE_ROW_SQL, rows, [now], [organization_id])
+
+
+def _delete(cursor, organization_id, actions):
+    rows = [[action['_type'], str(action['_id']), action.get('_version')] for action in actions]
+    _execute_batch(cursor, DELETE_SQL, DELETE_ROW_SQL, rows, [], [organization_id])
+
+
+def bulk(organization_id, actions):
+    """Apply ES bulk actions to the organization's documents.
+
+    Documents are written `BATCH_SIZE` at a time with a statement per batch.
+
+    Args:
+        organization_id (str): id of the organization
+        actions (list): bulk actions, see `search.indexer.bulk`. actions for
+            document types we don't search are skipped.
+
+    """
+    organization_id = str(organization_id)
+    with connection.cursor() as cursor:
+        for start in range(0, len(actions), BATCH_SIZE):
+            batch = _get_latest_actions(actions[start:start + BATCH_SIZE])
+            deletes = [action for action in batch if action.get('_op_type') == 'delete']
+            indexes = [action for action in batch if action.get('_op_type') != 'delete']
+            if deletes:
+                _delete(cursor, organization_id, deletes)
+            if indexes:
+                _index(cursor, organization_id, indexes)
+
+
+def get_documents(organization_id, documents):
+    """Fetch documents by id, like an ES multi get.
+
+    Args:
+        organization_id (str): id of the organization
+        documents (List[tuple]): (document_type, document_id) of the documents
+
+    Returns:
+        list of docs in the shape ES returns them, in the order requested
+
+    """
+    if not documents:
+        return []
+
+    keys = tuple((document_type, str(document_id)) for document_type, document_id in documents)
+    with connection.cursor() as cursor:
+        cursor.execute(GET_DOCUMENTS_SQL, [str(organization_id), keys])
+        rows = cursor.fetchall()
+
+    sources = dict(
+        ((document_type, str(document_id)), source)
+        for document_type, document_id, source in rows
+    )
+    docs = []
+    for document_type, document_id in keys:
+        doc = {'_type': document_type, '_id': document_id}
+        source = sources.get((document_type, document_id))
+        doc['found'] = source is not None
+        if source is not None:
+            doc['_source'] = _get_source(document_type, source)
+        docs.append(doc)
+    return docs
+
+
+def search(organization_id, category, query, size=DEFAULT_SIZE):
+    """Search the organization's documents.
+
+    Args:
+        organization_id (str): id of the organization
+        category (search_pb2.CategoryV1): category to search
+        query (str): the raw search query
+        size (Optional[int]): max number of results
+
+    Returns:
+        list of hits in the shape ES returns them, ordered by score
+
+    """
+    terms = get_terms(query)
+    document_types = get_doc_types(category)
+    if not terms or not document_types:
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(SEARCH_SQL, {
+            'organization_id': str(organization_id),
+            'document_types': tuple(document_types),
+            'terms': terms,
+            'query': query,
+            'size': size,
+        })
+        rows = cursor.fetchall()
+
+    return [{
+        '_type': document_type,
+        '_id': str(document_id),
+        '_score': score,
+        '_source': _get_source(document_type, source),
+    } for document_type, document_id, source, score in rows]
@@ -1,23 +1,55 @@
-from elasticsearch.helpers import bulk
+from collections import defaultdict
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from elasticsearch_dsl import connections
 from protobufs.services.post import containers_pb2 as post_containers
 from protobufs.services.search.containers import entity_pb2
+from service import metrics
 import service.control
 
+from post.models import Post
 from services.celery import app
 from services.token import make_admin_token
 
-from .stores.es.indices.organization.actions import get_write_alias
+from . import (
+    cache,
+    indexer,
+    query_log,
+    recents,
+)
+from .instrumentation import PhaseTimer
+from .models import IndexUpdate
+from .stores.es.indices.organization.actions import (
+    get_routing,
+    get_write_alias,
+)
 from .stores.es.types.collection.document import CollectionV1
 from .stores.es.types.location.document import LocationV1
 from .stores.es.types.post.document import PostV1
+from .stores.es.types.post.utils import prime_transform
 from .stores.es.types.profile.document import ProfileV1
 from .stores.es.types.team.document import TeamV1
+from .stores.postgres import actions as postgres
+
+logger = logging.getLogger(__name__)
 
 
 def _get_write_indices_for_organization_id(es, organization_id):
+    indices = cache.get_write_indices(organization_id)
+    if indices is not None:
+        metrics.increment('search.write_indices.cache.hit')
+        return indices
+
+    metrics.increment('search.write_indices.cache.miss')
     alias = get_write_alias(organization_id)
-    return es.indices.get_alias('%s*' % (organization_id,), alias).keys()
+    with metrics.time('search.write_indices.lookup.time'):
+        # shared indices aren't named after the organization
+        indices = es.indices.get_alias(index='*', name=alias).keys()
+    cache.set_write_indices(organization_id, indices)
+    return indices
 
 
 def _bulk_actions(actions, organization_id):
@@ -25,27 +57,80 @@ def _bulk_actions(actions, organization_id):
     def _get_action_for_index(action, index):
         action = action.copy()
         action['_index'] = index
+        routing = get_routing(index, organization_id)
+        if routing:
+            action['_routing'] = routing
         return action
 
-    es = connections.connections.get_connection()
-    indices = _get_write_indices_for_organization_id(es, organization_id)
-    all_actions = []
-    for action in actions:
-        for index in indices:
-            data = _get_action_for_index(action, index)
-            all_actions.append(data)
-    bulk(es, all_actions)
+    timer = PhaseTimer('search.bulk')
+    if postgres.is_enabled():
+        # the postgres store needs the actions too, so they're no longer
+        # streamed into ES
+        actions = list(actions)
+        with timer.phase('postgres'):
+            postgres.bulk(organization_id, actions)
+
+    if postgres.is_primary():
+        stats = indexer.BulkStats()
+        stats.succeeded = len(actions)
+    else:
+        es = connections.connections.get_connection()
+        with timer.phase('alias_lookup'):
+            indices = _get_write_indices_for_organization_id(es, organization_id)
+        all_actions = (
+            _get_action_for_index(action, index) for action in actions for index in indices
+        )
+        stats = indexer.bulk(es, all_actions)
+        timer.record('es_network', stats.send_ms)
+        timer.record('backoff', stats.backoff_ms)
+    for failure in stats.failures:
+        metrics.increment('search.bulk.failures')
+        logger.error('failed to index document: %s', failure)
+    # invalidate any cached search results for the organization
+    cache.bump_generation(organization_id)
+    schedule_warm_search_cache(organization_id)
+    if stats.conflicts:
+        metrics.increment('search.bulk.conflicts')
+    timer.finish(
+        organization_id=organization_id,
+        succeeded=stats.succeeded,
+        conflicts=stats.conflicts,
+        failed=len(stats.failures),
+        retries=stats.retries,
+        requests=stats.requests,
+        bytes=stats.bytes,
+    )
+    return stats
+
+
+def _fetch_pages(fetch, ids, organization_id):
+    """Fetch entities a page at a time, fetching the next page while the
+    previous one is indexed."""
+    page_size = settings.SEARCH_SERVICE_INDEX_FETCH_PAGE_SIZE
+
+    def _fetch():
+        for offset in xrange(0, len(ids), page_size):
+            for protobuf in fetch(ids[offset:offset + page_size], organization_id):
+                yield protobuf
+
+    return indexer.prefetch(_fetch(), size=page_size)
+
+
+def _get_update_action(document_type, protobuf):
+    action = document_type.to_action(protobuf)
+    changed = getattr(protobuf, 'changed', None)
+    if changed:
+        indexer.set_version(action, changed)
+    return action
 
 
 def _update_documents(document_type, protobufs, organization_id):
-    documents = [document_type.from_protobuf(protobuf).to_dict(include_meta=True) for protobuf
-                 in protobufs]
+    documents = (_get_update_action(document_type, protobuf) for protobuf in protobufs)
     return _bulk_actions(documents, organization_id)
 
 
-@app.task
-def update_profiles(ids, organization_id):
-    profiles = service.control.get_object(
+def _get_profiles(ids, organization_id):
+    return service.control.get_object(
         service='profile',
         action='get_profiles',
         return_object='profiles',
@@ -54,12 +139,10 @@ def update_profiles(ids, organization_id):
         ids=ids,
         inflations={'only': ['display_title']},
     )
-    _update_documents(ProfileV1, profiles, organization_id)
 
 
-@app.task
-def update_teams(ids, organization_id):
-    teams = service.control.get_object(
+def _get_teams(ids, organization_id):
+    return service.control.get_object(
         service='team',
         action='get_teams',
         return_object='teams',
@@ -68,12 +151,10 @@ def update_teams(ids, organization_id):
         inflations={'exclude': ['permissions']},
         ids=ids,
     )
-    _update_documents(TeamV1, teams, organization_id)
 
 
-@app.task
-def update_locations(ids, organization_id):
-    locations = service.control.get_object(
+def _get_locations(ids, organization_id):
+    return service.control.get_object(
         service='organization',
         action='get_locations',
         return_object='locations',
@@ -81,12 +162,26 @@ def update_locations(ids, organization_id):
         control={'paginator': {'page_size': len(ids)}},
         ids=ids,
     )
-    _update_documents(LocationV1, locations, organization_id)
 
 
-@app.task
-def update_posts(ids, organization_id):
-    posts = service.control.get_object(
+def prime_post_text(posts):
+    """Memoize the stored text of the posts so indexing doesn't reparse their content.
+
+    Args:
+        posts (iterable): (content, plain_text) tuples
+
+    """
+    for content, plain_text in posts:
+        if plain_text is not None:
+            prime_transform(content, plain_text)
+
+
+def _get_posts(ids, organization_id):
+    prime_post_text(Post.objects.filter(
+        pk__in=ids,
+        plain_text__isnull=False,
+    ).values_list('content', 'plain_text'))
+    return service.control.get_object(
         service='post',
         action='get_posts',
         return_object='posts',
@@ -96,12 +191,10 @@ def update_posts(ids, organization_id):
         state=post_containers.LISTED,
         inflations={'only': ['by_profile']},
     )
-    _update_documents(PostV1, posts, organization_id)
 
 
-@app.task
-def update_collections(ids, organization_id):
-    collections = service.control.get_object(
+def _get_collections(ids, organization_id):
+    return service.control.get_object(
         service='post',
         action='get_collections',
         return_object='collections',
@@ -109,16 +202,60 @@ def update_collections(ids, organization_id):
         control={'paginator': {'page_size': len(ids)}},
         ids=ids,
     )
-    _update_documents(CollectionV1, collections, organization_id)
 
 
 @app.task
-def delete_entities(ids, entity_type, organization_id):
+def update_profiles(ids, organization_id):
+    protobufs = _fetch_pages(_get_profiles, ids, organization_id)
+    _update_documents(ProfileV1, protobufs, organization_id)
+
+
+@app.task
+def update_teams(ids, organization_id):
+    protobufs = _fetch_pages(_get_teams, ids, organization_id)
+    _update_documents(TeamV1, protobufs, organization_id)
+
+
+@app.task
+def update_locations(ids, organization_id):
+    protobufs = _fetch_pages(_get_locations, ids, organization_id)
+    _update_documents(LocationV1, protobufs, organization_id)
+
+
+@app.task
+def update_posts(ids, organization_id):
+    protobufs = _fetch_pages(_get_posts, ids, organization_id)
+    _update_documents(PostV1, protobufs, organization_id)
+
+
+@app.task
+def update_collections(ids, organization_id):
+    protobufs = _fetch_pages(_get_collections, ids, organization_id)
+    _update_documents(CollectionV1, protobufs, organization_id)
+
+
+@app.task
+def delete_entities(ids, entity_type, organization_id, versions=None):
+    """Remove entities from the index.
+
+    Args:
+        ids (list): ids of the entities
+        entity_type (entity_pb2.EntityTypeV1): type of the entities
+        organization_id (str): id of the organization
+        versions (Optional[dict]): id -> when the entity was deleted (see
+            `indexer.get_version`). defaults to now. updates older than the
+            deletion that arrive afterwards are rejected.
+
+    """
+    versions = versions or {}
+    now = indexer.get_version(timezone.now())
 
     _build_action = lambda document_id, document_type: {
         '_id': document_id,
         '_op_type': 'delete',
         '_type': document_type._doc_type.name,
+        '_version': versions.get(document_id, now),
+        '_version_type': indexer.VERSION_TYPE,
     }
 
     document_type = None
@@ -134,4 +271,121 @@ def delete_entities(ids, entity_type, organization_id):
         document_type = CollectionV1
 
     actions = [_build_action(_id, document_type) for _id in ids]
-    return _bulk_actions(actions, organization_id)
+    _bulk_actions(actions, organization_id)
+
+
+@app.task
+def process_index_updates(batch_size=None):
+    """Drain pending index updates from the search outbox.
+
+    Updates are coalesced per (organization, entity type) so a bulk edit
+    results in a single batched update instead of one per entity. If an entity
+    was updated multiple times, the last write wins.
+
+    Documents are versioned, so the resulting tasks can run concurrently and
+    in any order. Deletes are versioned by when they were queued.
+
+    """
+    # XXX update_entities imports tasks
+    from .actions.update_entities import (
+        get_batches,
+        update_entities,
+    )
+
+    batch_size = batch_size or settings.SEARCH_SERVICE_INDEX_UPDATE_BATCH_SIZE
+    with transaction.atomic():
+        updates = list(IndexUpdate.objects.select_for_update().order_by('id')[:batch_size])
+        if not updates:
+            return
+
+        # time between the oldest pending update being queued and it being indexed
+        lag = timezone.now() - updates[0].created
+        metrics.timing('search.index_updates.lag', lag.total_seconds() * 1000, use_ms=False)
+
+        latest_actions = {}
+        queued = {}
+        for update in updates:
+            key = (str(update.organization_id), update.entity_type, str(update.entity_id))
+            latest_actions[key] = update.action
+            queued[key] = update.created
+
+        groups = defaultdict(list)
+        for (organization_id, entity_type, entity_id), action in latest_actions.iteritems():
+            groups[(organization_id, entity_type, action)].append(entity_id)
+
+        for (organization_id, entity_type, action), ids in groups.iteritems():
+            if action == IndexUpdate.UPDATE:
+                try:
+                    update_entities(entity_type, ids, organization_id)
+                except ValueError:
+                    # drop the updates so they don't block the rest of the outbox
+                    logger.exception(
+                        'dropping %s index updates for unsupported entity type: %s',
+                        len(ids),
+                        entity_type,
+                    )
+            else:
+                for batch in get_batches(ids):
+                    versions = dict(
+                        (entity_id, indexer.get_version(
+                            queued[(organization_id, entity_type, entity_id)],
+                        ))
+                        for entity_id in batch
+                    )
+                    delete_entities.delay(batch, entity_type, organization_id, versions=versions)
+
+        IndexUpdate.objects.filter(id__in=[update.id for update in updates]).delete()
+
+    logger.info(
+        'processed %s index updates (%s entities)',
+        len(updates),
+        len(latest_actions),
+    )
+    if len(updates) == batch_size:
+        # there are likely more updates pending
+        process_index_updates.delay(batch_size)
+
+
+@app.task
+def compact_recents():
+    deleted = recents.compact()
+    logger.info('compacted recents: %s rows deleted', deleted)
+
+
+@app.task
+def flush_query_log():
+    flushed = query_log.flush()
+    logger.info('flushed query log: %s queries', flushed)
+
+
+def schedule_warm_search_cache(organization_id):
+    """Warm the organization's result cache once indexing settles down.
+
+    Indexing bumps the organization's generation on every bulk request, so
+    warming is delayed by `SEARCH_SERVICE_WARM_DELAY` seconds and only
+    scheduled once per delay.
+
+    """
+    if not settings.SEARCH_SERVICE_WARM_QUERIES:
+        return
+
+    delay = settings.SEARCH_SERVICE_WARM_DELAY
+    if cache.claim_warm(organization_id, delay):
+        warm_search_cache.apply_async((organization_id,), countdown=delay)
+
+
+@app.task
+def warm_search_cache(organization_id, limit=None):
+    """Run the organization's most popular queries so their results are cached."""
+    limit = limit or settings.SEARCH_SERVICE_WARM_QUERIES
+    queries = query_log.get_popular_queries(organization_id, limit)
+    token = make_admin_token(organization_id=organization_id)
+    for category, query in queries:
+        service.control.call_action(
+            service='search',
+            action='search_v2',
+            client_kwargs={'token': token},
+            category=category,
+            query=query,
+        )
+    logger.info('warmed search cache: %s queries (%s)', len(queries), organization_id)
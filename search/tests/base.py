@@ -1,3 +1,5 @@
+import json
+
 from django.conf import settings
 from elasticsearch.helpers import (
     bulk,
@@ -23,6 +25,18 @@ def _delete_all_documents():
     bulk(es, bulk_requests, raise_on_error=False)
 
 
+def get_bulk_actions(patched_es):
+    """Return the (action, source) pairs sent to a mocked ES client's bulk API"""
+    actions = []
+    for call in patched_es.bulk.call_args_list:
+        lines = [json.loads(line) for line in call[1]['body'].splitlines()]
+        while lines:
+            action = lines.pop(0)
+            source = None if 'delete' in action else lines.pop(0)
+            actions.append((action, source))
+    return actions
+
+
 class ESTestCase(MockedTestCase):
 
     @classmethod
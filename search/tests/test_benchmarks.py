@@ -0,0 +1,67 @@
+from elasticsearch_dsl import connections
+import yaml
+
+from services.test import (
+    fuzzy,
+    MockedTestCase,
+)
+
+from .. import benchmarks
+from ..stores.es import types
+from ..stores.es.indices.organization.actions import (
+    create_index,
+    get_read_alias,
+    get_shared_index_name,
+)
+from ..tasks import _bulk_actions
+
+
+class Test(MockedTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(Test, cls).setUpClass()
+        with open('search/fixtures/acme.yml') as read_file:
+            cls.fixtures = yaml.load(read_file)
+
+    def test_percentile(self):
+        values = range(1, 101)
+        self.assertEqual(benchmarks.percentile(values, 50), 50)
+        self.assertEqual(benchmarks.percentile(values, 95), 95)
+        self.assertEqual(benchmarks.percentile(values, 99), 99)
+        self.assertEqual(benchmarks.percentile([3], 99), 3)
+        self.assertIsNone(benchmarks.percentile([], 50))
+
+    def test_generate_corpus(self):
+        corpus = benchmarks.generate_corpus(self.fixtures, 'organization', 1000)
+        self.assertEqual(sum(len(containers) for containers in corpus.values()), 1000)
+        # the mix should follow the fixtures, which are mostly profiles
+        self.assertTrue(len(corpus['profiles']) > len(corpus['posts']))
+        ids = set(container.id for containers in corpus.values() for container in containers)
+        self.assertEqual(len(ids), 1000)
+
+    def test_generate_queries(self):
+        queries = benchmarks.generate_queries(self.fixtures, 50)
+        self.assertEqual(len(queries), 50)
+        self.assertEqual(queries, benchmarks.generate_queries(self.fixtures, 50))
+
+    def test_delete_organization_shared_index(self):
+        es = connections.connections.get_connection()
+        organization_id = fuzzy.FuzzyUUID().fuzz()
+        other_organization_id = fuzzy.FuzzyUUID().fuzz()
+        index_name = get_shared_index_name(organization_id)
+        self.addCleanup(es.indices.delete, index=index_name, ignore=404)
+        with self.settings(SEARCH_SERVICE_SHARED_INDEX_COUNT=1):
+            for each in (organization_id, other_organization_id):
+                create_index(each)
+                profile = types.ProfileV1(full_name='Shared', organization_id=each)
+                _bulk_actions([profile.to_dict(include_meta=True)], each)
+            es.indices.refresh(index=index_name)
+
+            benchmarks.delete_organization(organization_id)
+
+        es.indices.refresh(index=index_name)
+        self.assertTrue(es.indices.exists(index=index_name))
+        self.assertFalse(es.indices.exists_alias('*', get_read_alias(organization_id)))
+        self.assertEqual(es.count(index=index_name)['count'], 1)
+        self.assertEqual(es.count(index=get_read_alias(other_organization_id))['count'], 1)
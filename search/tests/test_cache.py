@@ -0,0 +1,72 @@
+from mock import MagicMock
+from protobufs.services.search.containers import search_pb2
+
+from services.test import (
+    fuzzy,
+    TestCase,
+)
+
+from .. import (
+    cache,
+    tasks,
+)
+from ..stores.es.indices.organization.actions import get_read_alias
+
+
+class Test(TestCase):
+
+    def setUp(self):
+        super(Test, self).setUp()
+        self.organization_id = fuzzy.uuid()
+        self.read_alias = get_read_alias(self.organization_id)
+
+    def _get_results(self, query):
+        return cache.get_results(self.organization_id, self.read_alias, search_pb2.ALL, query)
+
+    def _set_results(self, query, generation, results):
+        cache.set_results(self.read_alias, search_pb2.ALL, query, generation, results)
+
+    def test_normalize_query(self):
+        self.assertEqual(cache.normalize_query('  Customer   SUPPORT '), 'customer support')
+
+    def test_get_results_miss(self):
+        generation, results = self._get_results('customer')
+        self.assertEqual(generation, '0')
+        self.assertIsNone(results)
+
+    def test_get_results_hit(self):
+        generation, _ = self._get_results('customer')
+        self._set_results('customer', generation, 'results')
+        _, results = self._get_results('  Customer ')
+        self.assertEqual(results, 'results')
+
+    def test_bump_generation_invalidates_results(self):
+        generation, _ = self._get_results('customer')
+        self._set_results('customer', generation, 'results')
+        cache.bump_generation(self.organization_id)
+        new_generation, results = self._get_results('customer')
+        self.assertNotEqual(generation, new_generation)
+        self.assertIsNone(results)
+
+    def test_results_cached_with_stale_generation_are_ignored(self):
+        generation, _ = self._get_results('customer')
+        # simulate documents being indexed while we were searching
+        cache.bump_generation(self.organization_id)
+        self._set_results('customer', generation, 'results')
+        _, results = self._get_results('customer')
+        self.assertIsNone(results)
+
+    def test_write_indices_cached_until_invalidated(self):
+        self.assertIsNone(cache.get_write_indices(self.organization_id))
+        cache.set_write_indices(self.organization_id, ['index_v7'])
+        self.assertEqual(cache.get_write_indices(self.organization_id), ['index_v7'])
+        cache.invalidate_write_indices(self.organization_id)
+        self.assertIsNone(cache.get_write_indices(self.organization_id))
+
+    def test_get_write_indices_for_organization_id_uses_cache(self):
+        es = MagicMock()
+        es.indices.get_alias.return_value = {'index_v7': {}}
+        for _ in range(2):
+            indices = tasks._get_write_indices_for_organization_id(es, self.organization_id)
+            self.assertEqual(indices, ['index_v7'])
+        self.assertEqual(es.indices.get_alias.call_count, 1)
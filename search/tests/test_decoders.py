@@ -0,0 +1,76 @@
+import copy
+import json
+
+from elasticsearch.serializer import JSONSerializer
+from protobuf_to_dict import dict_to_protobuf
+
+from services.test import (
+    mocks,
+    TestCase,
+)
+
+from ..stores.es import types
+
+
+def _get_source(document_type, protobuf):
+    # serialize the document the same way it is sent to ES
+    document = document_type.from_protobuf(protobuf)
+    return json.loads(JSONSerializer().dumps(document.to_dict()))
+
+
+class Test(TestCase):
+
+    def _verify_decode_source(self, document_type, protobuf):
+        source = _get_source(document_type, protobuf)
+
+        expected = document_type._options.protobuf()
+        data = copy.deepcopy(source)
+        document_type.prepare_protobuf_dict(data)
+        dict_to_protobuf(data, expected)
+
+        decoded = document_type._options.protobuf()
+        document_type.decode_source(source, decoded)
+        self.assertEqual(decoded, expected)
+
+    def _verify_decode_highlight(self, document_type, highlight):
+        expected = {}
+        data = copy.deepcopy(highlight)
+        document_type.prepare_highlight_dict(data)
+        for key, value in data.iteritems():
+            expected[key] = value[0]
+
+        decoded = {}
+        document_type.decode_highlight(highlight, decoded)
+        self.assertEqual(decoded, expected)
+
+    def test_decode_source_profile(self):
+        self._verify_decode_source(types.ProfileV1, mocks.mock_profile())
+
+    def test_decode_source_team(self):
+        team = mocks.mock_team(description=mocks.mock_description())
+        self._verify_decode_source(types.TeamV1, team)
+
+    def test_decode_source_location(self):
+        self._verify_decode_source(types.LocationV1, mocks.mock_location())
+
+    def test_decode_source_post(self):
+        post = mocks.mock_post(by_profile=mocks.mock_profile())
+        self._verify_decode_source(types.PostV1, post)
+
+    def test_decode_source_collection(self):
+        self._verify_decode_source(types.CollectionV1, mocks.mock_collection())
+
+    def test_decode_highlight_team(self):
+        self._verify_decode_highlight(
+            types.TeamV1,
+            {'name': ['<mark>name</mark>'], 'description': ['<mark>first</mark>', 'second']},
+        )
+
+    def test_decode_highlight_location(self):
+        self._verify_decode_highlight(
+            types.LocationV1,
+            {'location_name': ['<mark>name</mark>'], 'full_address': ['<mark>address</mark>']},
+        )
+
+    def test_decode_highlight_collection(self):
+        self._verify_decode_highlight(types.CollectionV1, {'collection_name': ['<mark>name</mark>']})
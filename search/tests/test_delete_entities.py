@@ -1,3 +1,4 @@
+from elasticsearch.serializer import JSONSerializer
 from mock import patch
 from protobufs.services.search.containers import entity_pb2
 import service.control
@@ -10,6 +11,7 @@ from services.test import (
 from services.token import make_admin_token
 
 from ..stores.es.indices.organization.actions import get_write_alias
+from .base import get_bulk_actions
 
 
 class Test(MockedTestCase):
@@ -26,22 +28,25 @@ class Test(MockedTestCase):
             self.client.call_action('delete_entities')
 
     @patch('search.tasks.connections')
-    @patch('search.tasks.bulk')
-    def test_delete_entities(self, patched, patched_connections):
+    def test_delete_entities(self, patched_connections):
         write_alias = get_write_alias(self.organization.id)
         patched_es = patched_connections.connections.get_connection()
         patched_es.indices.get_alias.return_value = {write_alias: {}}
+        patched_es.transport.serializer = JSONSerializer()
+        patched_es.bulk.return_value = {'errors': False}
 
         def _test(entity_name, entity_value):
+            patched_es.bulk.reset_mock()
             ids = [fuzzy.FuzzyUUID().fuzz() for _ in range(3)]
             self.client.call_action('delete_entities', type=entity_value, ids=ids)
-            es_actions = patched.call_args[0][1]
+            es_actions = get_bulk_actions(patched_es)
             self.assertEqual(len(es_actions), len(ids))
-            action = es_actions[0]
-            self.assertEqual(action['_type'], entity_name)
-            self.assertEqual(action['_op_type'], 'delete')
-            self.assertTrue(action['_id'])
-            self.assertEqual(action['_index'], write_alias)
+            action, source = es_actions[0]
+            self.assertIsNone(source)
+            self.assertEqual(action['delete']['_type'], entity_name)
+            self.assertTrue(action['delete']['_id'])
+            self.assertEqual(action['delete']['_index'], write_alias)
+            self.assertEqual(action['delete']['_version_type'], 'external_gte')
 
         for key, value in entity_pb2.EntityTypeV1.items():
             _test(key.lower(), value)
@@ -75,12 +75,26 @@ class Test(ESTestCase):
 
     def test_get_recents_current_user(self):
         document_type = 'profile'
-        document_id = _fixtures['profiles'][0]['id']
+        document_ids = [_fixtures['profiles'][0]['id'], _fixtures['profiles'][1]['id']]
 
         # User's recents
-        factories.RecentFactory.create_batch(size=2, profile=self.profile, document_type=document_type, document_id=document_id)
+        for document_id in document_ids:
+            factories.RecentFactory.create(profile=self.profile, document_type=document_type, document_id=document_id)
         # Others' recents
-        factories.RecentFactory.create_batch(size=2, document_type=document_type, document_id=document_id)
+        factories.RecentFactory.create_batch(size=2, document_type=document_type, document_id=document_ids[0])
 
         response = self.client.call_action('get_recents')
         self.assertEqual(len(response.result.recents), 2)
+
+    def test_get_recents_deduplicated(self):
+        document_type = 'profile'
+        document_id = _fixtures['profiles'][0]['id']
+        for _ in range(2):
+            self.client.call_action('track_recent', tracking_details={
+                'document_type': document_type,
+                'document_id': document_id,
+            })
+
+        response = self.client.call_action('get_recents')
+        self.assertEqual(len(response.result.recents), 1)
+        self.assertEqual(response.result.recents[0].profile.id, document_id)
@@ -0,0 +1,175 @@
+import time
+
+from elasticsearch.exceptions import TransportError
+from elasticsearch.serializer import JSONSerializer
+from mock import (
+    MagicMock,
+    patch,
+)
+
+from services.test import TestCase
+
+from .. import indexer
+from .base import get_bulk_actions
+
+
+def _action(document_id, content='content'):
+    return {
+        '_index': 'index',
+        '_type': 'post',
+        '_id': document_id,
+        '_source': {'content': content},
+    }
+
+
+def _item(document_id, status):
+    return {'index': {'_index': 'index', '_type': 'post', '_id': document_id, 'status': status}}
+
+
+class Test(TestCase):
+
+    def setUp(self):
+        super(Test, self).setUp()
+        self.es = MagicMock()
+        self.es.transport.serializer = JSONSerializer()
+        self.es.bulk.return_value = {'errors': False}
+
+    def test_chunk_actions_by_bytes(self):
+        actions = [_action(str(i), content='x' * 100) for i in range(10)]
+        chunks = list(indexer.chunk_actions(actions, JSONSerializer(), 500, 1000))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 10)
+        for chunk in chunks:
+            self.assertTrue(len(indexer._get_body(chunk)) <= 500)
+
+    def test_chunk_actions_oversized_action(self):
+        actions = [_action('1', content='x' * 1000), _action('2')]
+        chunks = list(indexer.chunk_actions(actions, JSONSerializer(), 500, 1000))
+        self.assertEqual([len(chunk) for chunk in chunks], [1, 1])
+
+    def test_chunk_actions_by_count(self):
+        actions = [_action(str(i)) for i in range(5)]
+        chunks = list(indexer.chunk_actions(actions, JSONSerializer(), 1024 * 1024, 2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+
+    def test_prefetch(self):
+        self.assertEqual(list(indexer.prefetch(iter(range(10)), size=2)), range(10))
+
+    def test_prefetch_raises_errors(self):
+        def _generate():
+            yield 1
+            raise ValueError('failed')
+
+        items = indexer.prefetch(_generate())
+        self.assertEqual(next(items), 1)
+        with self.assertRaises(ValueError):
+            next(items)
+
+    @patch('search.indexer.connections')
+    def test_prefetch_closes_connections(self, patched_connections):
+        connection = MagicMock()
+        patched_connections.all.return_value = [connection]
+        self.assertEqual(list(indexer.prefetch(iter(range(3)))), range(3))
+        self.assertTrue(connection.close.called)
+
+    def test_prefetch_stops_when_closed(self):
+        consumed = []
+
+        def _generate():
+            for i in range(100):
+                consumed.append(i)
+                yield i
+
+        items = indexer.prefetch(_generate(), size=1)
+        self.assertEqual(next(items), 0)
+        items.close()
+        time.sleep(0.3)
+        self.assertTrue(len(consumed) < 100)
+
+    @patch('search.indexer.time.sleep')
+    def test_bulk_retries_rejected_items(self, patched_sleep):
+        self.es.bulk.side_effect = [
+            {'errors': True, 'items': [_item('1', 201), _item('2', 429), _item('3', 400)]},
+            {'errors': True, 'items': [_item('2', 429)]},
+            {'errors': False},
+        ]
+        stats = indexer.bulk(self.es, [_action('1'), _action('2'), _action('3')], initial_backoff=1)
+        self.assertEqual(stats.succeeded, 2)
+        self.assertEqual(stats.retries, 2)
+        self.assertEqual(stats.requests, 3)
+        self.assertEqual(len(stats.failures), 1)
+        self.assertEqual(stats.failures[0]['index']['_id'], '3')
+        self.assertEqual([call[0][0] for call in patched_sleep.call_args_list], [1, 2])
+
+        # only the rejected document is retried
+        retried = [action['index']['_id'] for action, _ in get_bulk_actions(self.es)[3:]]
+        self.assertEqual(retried, ['2', '2'])
+
+    @patch('search.indexer.time.sleep')
+    def test_bulk_retries_rejected_requests(self, patched_sleep):
+        self.es.bulk.side_effect = [TransportError(429, 'rejected'), {'errors': False}]
+        stats = indexer.bulk(self.es, [_action('1'), _action('2')])
+        self.assertEqual(stats.succeeded, 2)
+        self.assertEqual(stats.retries, 2)
+        self.assertFalse(stats.failures)
+
+    @patch('search.indexer.time.sleep')
+    def test_bulk_reports_items_rejected_after_retries(self, patched_sleep):
+        self.es.bulk.side_effect = TransportError(429, 'rejected')
+        stats = indexer.bulk(self.es, [_action('1')], max_retries=2)
+        self.assertEqual(self.es.bulk.call_count, 3)
+        self.assertEqual(stats.succeeded, 0)
+        self.assertEqual(stats.failures[0]['index']['_id'], '1')
+        self.assertEqual(stats.failures[0]['index']['status'], 429)
+
+    def test_bulk_deleting_missing_documents_succeeds(self):
+        self.es.bulk.return_value = {
+            'errors': True,
+            'items': [{'delete': {'_id': '1', 'status': 404, 'found': False}}],
+        }
+        stats = indexer.bulk(self.es, [{'_op_type': 'delete', '_id': '1', '_type': 'post'}])
+        self.assertEqual(stats.succeeded, 1)
+        self.assertFalse(stats.failures)
+
+    def test_bulk_raises_transport_errors(self):
+        self.es.bulk.side_effect = TransportError(500, 'failed')
+        with self.assertRaises(TransportError):
+            indexer.bulk(self.es, [_action('1')])
+
+    def test_bulk_counts_stale_writes_as_conflicts(self):
+        self.es.bulk.return_value = {
+            'errors': True,
+            'items': [_item('1', 201), _item('2', 409)],
+        }
+        stats = indexer.bulk(self.es, [_action('1'), _action('2')])
+        self.assertEqual(stats.succeeded, 1)
+        self.assertEqual(stats.conflicts, 1)
+        self.assertFalse(stats.failures)
+
+    def test_parallel_bulk(self):
+        actions = [_action(str(i)) for i in range(10)]
+        stats = indexer.parallel_bulk(self.es, iter(actions), 3, max_actions=2)
+        self.assertEqual(stats.succeeded, 10)
+        self.assertEqual(stats.requests, 5)
+        sent = sorted(action['index']['_id'] for action, _ in get_bulk_actions(self.es))
+        self.assertEqual(sent, sorted(str(i) for i in range(10)))
+
+    def test_parallel_bulk_raises_transport_errors(self):
+        self.es.bulk.side_effect = TransportError(500, 'failed')
+        consumed = []
+
+        def _generate():
+            for i in range(100):
+                consumed.append(i)
+                yield _action(str(i))
+
+        with self.assertRaises(TransportError):
+            indexer.parallel_bulk(self.es, _generate(), 2, max_actions=1)
+        # we stop generating actions once a worker fails
+        self.assertTrue(len(consumed) < 100)
+
+    def test_get_version(self):
+        self.assertEqual(indexer.get_version('1970-01-01T00:00:01.5+00:00'), 1500000)
+        earlier = indexer.get_version('2016-01-01 00:00:00.999999+00:00')
+        later = indexer.get_version('2016-01-01 00:00:01+00:00')
+        self.assertTrue(earlier < later)
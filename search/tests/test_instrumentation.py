@@ -0,0 +1,41 @@
+from mock import patch
+
+from services.test import TestCase
+
+from .. import instrumentation
+
+
+class Test(TestCase):
+
+    @patch('search.instrumentation.metrics')
+    def test_phase_timer_emits_timings(self, patched_metrics):
+        timer = instrumentation.PhaseTimer('search.test')
+        for _ in range(2):
+            with timer.phase('decode'):
+                pass
+        timer.record('es_took', 5)
+        timer.finish()
+
+        names = [call[0][0] for call in patched_metrics.timing.call_args_list]
+        self.assertEqual(names, ['search.test.decode', 'search.test.es_took', 'search.test.total'])
+        self.assertEqual(timer.timings['es_took'], 5)
+
+    @patch('search.instrumentation.metrics')
+    @patch('search.instrumentation.slow_query_logger')
+    def test_phase_timer_logs_slow_queries(self, patched_logger, patched_metrics):
+        with self.settings(
+            SEARCH_SERVICE_SLOW_QUERY_THRESHOLD_MS=0,
+            SEARCH_SERVICE_SLOW_QUERY_SAMPLE_RATE=1,
+        ):
+            timer = instrumentation.PhaseTimer('search.test')
+            timer.finish(organization_id='organization', body='{"query": {}}')
+
+        self.assertEqual(patched_logger.warning.call_count, 1)
+        self.assertIn('"organization_id": "organization"', patched_logger.warning.call_args[0][-1])
+
+    @patch('search.instrumentation.metrics')
+    @patch('search.instrumentation.slow_query_logger')
+    def test_phase_timer_skips_fast_queries(self, patched_logger, patched_metrics):
+        with self.settings(SEARCH_SERVICE_SLOW_QUERY_THRESHOLD_MS=60 * 1000):
+            instrumentation.PhaseTimer('search.test').finish()
+        self.assertFalse(patched_logger.warning.called)
@@ -1,10 +1,12 @@
 import time
 from elasticsearch_dsl import connections
+from mock import patch
 from services.test import (
     fuzzy,
     MockedTestCase,
 )
 
+from ..actions import migrations
 from ..actions.migrations import (
     get_indices_to_migrate,
     migrate_index,
@@ -14,9 +16,11 @@ from ..tasks import (
     _get_write_indices_for_organization_id,
 )
 from ..stores.es import types
+from ..stores.es.indices.organization import INDEX_VERSION
 from ..stores.es.indices.organization.actions import (
     create_index,
     get_read_alias,
+    get_shared_index_name,
     get_write_alias,
 )
 
@@ -102,3 +106,134 @@ class Test(MockedTestCase):
         self.assertEqual(len(write_aliases.keys()), 1)
         self.assertEqual(write_aliases.keys()[0], new_index._name)
         self.assertFalse(self.es.indices.exists(old_index._name))
+
+    def _search(self, organization_id):
+        self.es.indices.refresh(index='*')
+        return self.es.search(index=get_read_alias(organization_id))['hits']['hits']
+
+    def test_create_index_shared(self):
+        organization_ids = [fuzzy.FuzzyUUID().fuzz() for _ in range(3)]
+        with self.settings(SEARCH_SERVICE_SHARED_INDEX_COUNT=1):
+            indices = [create_index(organization_id) for organization_id in organization_ids]
+            self.assertEqual(len(set(index._name for index in indices)), 1)
+            self.assertEqual(indices[0]._name, get_shared_index_name(organization_ids[0]))
+
+            for organization_id in organization_ids:
+                profile = types.ProfileV1(full_name='Shared', organization_id=organization_id)
+                _bulk_actions([profile.to_dict(include_meta=True)], organization_id)
+
+        # each organization only sees its own documents through its read alias
+        for organization_id in organization_ids:
+            hits = self._search(organization_id)
+            self.assertEqual(len(hits), 1)
+            self.assertEqual(hits[0]['_source']['organization_id'], organization_id)
+
+    def test_index_document_shared_index(self):
+        organization_id = fuzzy.FuzzyUUID().fuzz()
+        with self.settings(SEARCH_SERVICE_SHARED_INDEX_COUNT=1):
+            create_index(organization_id)
+            write_indices = _get_write_indices_for_organization_id(self.es, organization_id)
+            self.assertEqual(write_indices, [get_shared_index_name(organization_id)])
+
+            profile = types.ProfileV1(
+                _id='profile',
+                full_name='Shared',
+                organization_id=organization_id,
+            )
+            stats = _bulk_actions([profile.to_dict(include_meta=True)], organization_id)
+
+        self.assertEqual(stats.succeeded, 1)
+        self.es.indices.refresh(index='*')
+        profile = types.ProfileV1.get(id='profile', index=get_read_alias(organization_id))
+        self.assertEqual(profile.full_name, 'Shared')
+
+    def test_migrate_index_to_shared_index(self):
+        organization_id = fuzzy.FuzzyUUID().fuzz()
+        other_organization_id = fuzzy.FuzzyUUID().fuzz()
+        old_index = create_index(organization_id)
+        write_alias = get_write_alias(organization_id)
+        types.ProfileV1(_index=write_alias, full_name='Test').save()
+        types.TeamV1(_index=write_alias, name='Founders').save()
+
+        with self.settings(SEARCH_SERVICE_SHARED_INDEX_COUNT=1):
+            create_index(other_organization_id)
+            profile = types.ProfileV1(full_name='Other', organization_id=other_organization_id)
+            _bulk_actions([profile.to_dict(include_meta=True)], other_organization_id)
+            self.es.indices.refresh(index='*')
+            new_index = migrate_index(old_index._name)
+
+        self.assertEqual(new_index._name, get_shared_index_name(organization_id))
+        self.assertFalse(self.es.indices.exists(old_index._name))
+        self.assertEqual(len(self._search(organization_id)), 2)
+        self.assertEqual(len(self._search(other_organization_id)), 1)
+        write_aliases = self.es.indices.get_alias('*', write_alias)
+        self.assertEqual(write_aliases.keys(), [new_index._name])
+
+        # migrating the shared index to a new version moves every organization
+        with self.settings(SEARCH_SERVICE_SHARED_INDEX_COUNT=1):
+            newer_index = migrate_index(new_index._name, current_version=INDEX_VERSION + 1)
+        self.assertFalse(self.es.indices.exists(new_index._name))
+        self.assertEqual(len(self._search(organization_id)), 2)
+        self.assertEqual(len(self._search(other_organization_id)), 1)
+        read_aliases = self.es.indices.get_alias('*', get_read_alias(other_organization_id))
+        self.assertEqual(read_aliases.keys(), [newer_index._name])
+
+    def test_get_index_version(self):
+        self.assertEqual(migrations.get_index_version('organization_v7'), 7)
+        self.assertEqual(migrations.get_index_version('shared_3_v12'), 12)
+        self.assertIsNone(migrations.get_index_version('organization-read'))
+
+    @patch('search.actions.migrations.time')
+    def test_throttle(self, patched_time):
+        patched_time.time.return_value = 100
+        throttle = migrations.Throttle(10)
+        throttle.wait(5)
+        self.assertFalse(patched_time.sleep.called)
+        throttle.wait()
+        patched_time.sleep.assert_called_once_with(0.5)
+
+    def test_migrate_index_keeps_documents_written_during_migration(self):
+        organization_id = fuzzy.FuzzyUUID().fuzz()
+        old_index = create_index(organization_id, version=1)
+        types.ProfileV1(_id='profile', _index=old_index._name, full_name='Old').save()
+        new_index = create_index(organization_id, version=2, check_duplicate=False)
+        # simulate an update arriving through the write alias after the old
+        # index was read
+        types.ProfileV1(_id='profile', _index=new_index._name, full_name='New').save()
+        self.es.indices.refresh(index='*')
+
+        migrate_index(old_index._name, current_version=2)
+        profile = types.ProfileV1.get(id='profile', index=get_read_alias(organization_id))
+        self.assertEqual(profile.full_name, 'New')
+
+    def test_migrate_index_resumes_from_checkpoint(self):
+        organization_id = fuzzy.FuzzyUUID().fuzz()
+        old_index = create_index(organization_id, version=1)
+        types.ProfileV1(_index=old_index._name, full_name='Test').save()
+        # a previous run created the new index before it failed
+        new_index = create_index(organization_id, version=2, check_duplicate=False)
+        self.es.indices.refresh(index='*')
+        checkpoint_key = migrations.get_checkpoint_key(
+            organization_id,
+            old_index._name,
+            new_index._name,
+        )
+        self.addCleanup(migrations.get_redis_client().delete, checkpoint_key)
+        # pretend every slice was copied by a previous run
+        for slice_id in migrations._get_slices(self.es, old_index._name, organization_id):
+            migrations._complete_slice(checkpoint_key, slice_id)
+
+        with self.settings(SEARCH_SERVICE_MIGRATION_CONVERGE_ATTEMPTS=1):
+            with self.assertRaises(migrations.MigrationError):
+                migrate_index(old_index._name, current_version=2)
+
+        # the organization is still reading from the old index
+        read_aliases = self.es.indices.get_alias('*', get_read_alias(organization_id))
+        self.assertEqual(read_aliases.keys(), [old_index._name])
+
+        # rerunning without the checkpoint completes the migration
+        migrations.get_redis_client().delete(checkpoint_key)
+        migrate_index(old_index._name, current_version=2)
+        read_aliases = self.es.indices.get_alias('*', get_read_alias(organization_id))
+        self.assertEqual(read_aliases.keys(), [new_index._name])
+        self.assertFalse(self.es.indices.exists(old_index._name))
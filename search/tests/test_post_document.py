@@ -4,6 +4,7 @@ from services.test import (
 )
 
 from search.stores.es.types.post.document import PostV1
+from search.stores.es.types.post import utils
 from search.stores.es.types.post.utils import transform_html
 
 
@@ -39,3 +40,25 @@ class Test(MockedTestCase):
         expected = u'some title some caption here \nif you have more questions, look \xa0 here code block list here there numbered list here there another inline image: \n\nwith another caption'
         document = PostV1.from_protobuf(post)
         self.assertEqual(document.content, expected)
+
+    def test_transform_html_fast_path_matches_html5lib(self):
+        contents = [
+            '<div>a &amp; b &lt;c&gt; &#39;d&#x27; &nbsp;&Tab;e & f<br/>g</div><!-- comment -->',
+            '<div class="x" data-a=\'{"b": ">"}\'>quoted <o:p>attributes</o:p></div>',
+            '<ul><li>list</li></ul>\n  <pre>  indented\n    code</pre>',
+        ]
+        for content in contents:
+            self.assertEqual(
+                utils._transform_html_fast(content),
+                utils._transform_html_with_html5lib(content),
+            )
+
+    def test_transform_html_falls_back_to_html5lib(self):
+        content = '<!DOCTYPE html><div>AT&T <![CDATA[x]]> 1 < 2</div>'
+        self.assertIsNone(utils._transform_html_fast(content))
+        self.assertEqual(transform_html(content), utils._transform_html_with_html5lib(content))
+
+    def test_prime_transform_skips_parsing(self):
+        content = '<div>primed <b>content</b></div>'
+        utils.prime_transform(content, 'stored text')
+        self.assertEqual(transform_html(content), 'stored text')
@@ -0,0 +1,163 @@
+from elasticsearch.exceptions import ConnectionError
+from mock import patch
+from protobufs.services.search.containers import search_pb2
+import service.control
+
+from services.test import (
+    fuzzy,
+    mocks,
+    MockedTestCase,
+)
+
+from .. import (
+    factories,
+    models,
+)
+from ..stores.es import health
+from ..stores.postgres import actions as postgres
+
+
+def _action(document_type, source, document_id=None, version=None, op_type='index'):
+    action = {
+        '_op_type': op_type,
+        '_type': document_type,
+        '_id': document_id or fuzzy.uuid(),
+        '_source': source,
+    }
+    if version is not None:
+        action['_version'] = version
+    return action
+
+
+class Test(MockedTestCase):
+
+    def setUp(self):
+        super(Test, self).setUp()
+        self.organization = mocks.mock_organization()
+        self.profile = mocks.mock_profile(organization_id=self.organization.id)
+        token = mocks.mock_token(profile_id=self.profile.id, organization_id=self.organization.id)
+        self.client = service.control.Client('search', token=token)
+        self.mock.instance.dont_mock_service('search')
+        health.reset()
+        self.addCleanup(health.reset)
+
+    def _search(self, query, category=search_pb2.ALL):
+        return postgres.search(self.organization.id, category, query)
+
+    def test_get_terms(self):
+        self.assertEqual(postgres.get_terms('Michael  Hahn!'), 'michael:* & hahn:*')
+        self.assertEqual(postgres.get_terms('&|!'), '')
+
+    def test_search(self):
+        profile = _action('profile', {'full_name': 'Michael Hahn', 'display_title': 'Engineer'})
+        post = _action('post', {'title': 'Expense policy', 'content': 'How to file expenses'})
+        postgres.bulk(self.organization.id, [profile, post])
+        # documents for other organizations aren't searched
+        postgres.bulk(fuzzy.uuid(), [_action('profile', {'full_name': 'Michael Hahn'})])
+
+        hits = self._search('mich')
+        self.assertEqual([hit['_id'] for hit in hits], [profile['_id']])
+        self.assertEqual(hits[0]['_type'], 'profile')
+        self.assertEqual(hits[0]['_source'], profile['_source'])
+
+        self.assertEqual([hit['_id'] for hit in self._search('expenses')], [post['_id']])
+        self.assertFalse(self._search('expenses', category=search_pb2.PROFILES))
+
+    def test_search_misspelled_title(self):
+        team = _action('team', {'name': 'Engineering'})
+        postgres.bulk(self.organization.id, [team])
+        self.assertEqual([hit['_id'] for hit in self._search('Enginering')], [team['_id']])
+
+    def test_bulk_keeps_newer_versions(self):
+        document_id = fuzzy.uuid()
+        postgres.bulk(self.organization.id, [
+            _action('team', {'name': 'New'}, document_id=document_id, version=2),
+            _action('team', {'name': 'Old'}, document_id=document_id, version=1),
+        ])
+        document = models.Document.objects.get(document_id=document_id)
+        self.assertEqual(document.title, 'New')
+
+        postgres.bulk(self.organization.id, [
+            _action('team', None, document_id=document_id, version=1, op_type='delete'),
+        ])
+        self.assertTrue(models.Document.objects.filter(document_id=document_id).exists())
+
+        postgres.bulk(self.organization.id, [
+            _action('team', None, document_id=document_id, version=3, op_type='delete'),
+        ])
+        self.assertFalse(models.Document.objects.filter(document_id=document_id).exists())
+
+    def test_search_excludes_source_fields(self):
+        post = _action('post', {'title': 'Expense policy', 'content': 'How to file expenses'})
+        postgres.bulk(self.organization.id, [post])
+        hits = self._search('expenses')
+        self.assertEqual(hits[0]['_source'], {'title': 'Expense policy'})
+
+    def test_bulk_batches(self):
+        teams = [_action('team', {'name': 'Team %s' % (index,)}) for index in range(5)]
+        with patch.object(postgres, 'BATCH_SIZE', 2):
+            postgres.bulk(self.organization.id, teams)
+            postgres.bulk(self.organization.id, [
+                _action('team', None, document_id=team['_id'], op_type='delete')
+                for team in teams[:3]
+            ])
+
+        document_ids = models.Document.objects.filter(
+            organization_id=self.organization.id,
+        ).values_list('document_id', flat=True)
+        self.assertEqual(
+            sorted(str(document_id) for document_id in document_ids),
+            sorted(str(team['_id']) for team in teams[3:]),
+        )
+
+    @patch('search.actions.get_recents.connections')
+    def test_get_recents_postgres_engine(self, patched_connections):
+        team = _action('team', {'name': 'Engineering'})
+        postgres.bulk(self.organization.id, [team])
+        factories.RecentFactory.create(
+            profile=self.profile,
+            document_type='team',
+            document_id=team['_id'],
+        )
+        with self.settings(SEARCH_SERVICE_ENGINE='postgres'):
+            response = self.client.call_action('get_recents')
+        self.assertEqual(len(response.result.recents), 1)
+        self.assertEqual(response.result.recents[0].team.name, 'Engineering')
+        self.assertFalse(patched_connections.connections.get_connection().mget.called)
+
+    def test_health_threshold(self):
+        with self.settings(SEARCH_SERVICE_ES_FAILURE_THRESHOLD=2):
+            health.record_failure()
+            self.assertTrue(health.is_available())
+            health.record_took(10)
+            health.record_failure()
+            self.assertTrue(health.is_available())
+
+            with self.settings(SEARCH_SERVICE_ES_LATENCY_BUDGET=0.1):
+                health.record_took(200)
+            self.assertFalse(health.is_available())
+
+    @patch('search.actions.search_v2.connections')
+    def test_search_v2_falls_back_to_postgres(self, patched_connections):
+        patched_connections.connections.get_connection().search.side_effect = ConnectionError(
+            'N/A',
+            'unavailable',
+            None,
+        )
+        postgres.bulk(self.organization.id, [_action('team', {'name': 'Engineering'})])
+        with self.settings(SEARCH_SERVICE_POSTGRES_FALLBACK=True):
+            response = self.client.call_action(
+                'search_v2',
+                query='engineering',
+                category=search_pb2.TEAMS,
+            )
+        self.assertEqual(len(response.result.results), 1)
+        self.assertEqual(response.result.results[0].team.name, 'Engineering')
+
+    @patch('search.actions.search_v2.connections')
+    def test_search_v2_postgres_engine(self, patched_connections):
+        postgres.bulk(self.organization.id, [_action('team', {'name': 'Engineering'})])
+        with self.settings(SEARCH_SERVICE_ENGINE='postgres'):
+            response = self.client.call_action('search_v2', query='engineering')
+        self.assertEqual(len(response.result.results), 1)
+        self.assertFalse(patched_connections.connections.get_connection().search.called)
@@ -0,0 +1,105 @@
+from mock import patch
+from protobufs.services.search.containers import entity_pb2
+
+from services.test import (
+    fuzzy,
+    TestCase,
+)
+
+from .. import (
+    indexer,
+    tasks,
+)
+from ..models import IndexUpdate
+
+
+class Test(TestCase):
+
+    def setUp(self):
+        super(Test, self).setUp()
+        self.organization_id = fuzzy.uuid()
+
+    def _create_update(self, entity_id, entity_type=entity_pb2.PROFILE, action=IndexUpdate.UPDATE):
+        return IndexUpdate.objects.create(
+            organization_id=self.organization_id,
+            entity_type=entity_type,
+            entity_id=entity_id,
+            action=action,
+        )
+
+    @patch('search.actions.update_entities.tasks.update_profiles')
+    def test_process_index_updates_coalesces_updates(self, patched):
+        ids = [fuzzy.uuid() for _ in range(3)]
+        for _ in range(2):
+            for entity_id in ids:
+                self._create_update(entity_id)
+
+        tasks.process_index_updates()
+        self.assertEqual(patched.delay.call_count, 1)
+        called_ids, organization_id = patched.delay.call_args_list[0][0]
+        self.assertEqual(sorted(called_ids), sorted(ids))
+        self.assertEqual(organization_id, self.organization_id)
+        self.assertFalse(IndexUpdate.objects.exists())
+
+    @patch('search.tasks.delete_entities')
+    @patch('search.actions.update_entities.tasks.update_posts')
+    def test_process_index_updates_last_write_wins(self, patched_update, patched_delete):
+        deleted_id = fuzzy.uuid()
+        updated_id = fuzzy.uuid()
+        self._create_update(deleted_id, entity_type=entity_pb2.POST)
+        self._create_update(updated_id, entity_type=entity_pb2.POST, action=IndexUpdate.DELETE)
+        self._create_update(deleted_id, entity_type=entity_pb2.POST, action=IndexUpdate.DELETE)
+        self._create_update(updated_id, entity_type=entity_pb2.POST)
+
+        tasks.process_index_updates()
+        self.assertEqual(patched_update.delay.call_args_list[0][0][0], [updated_id])
+        args, kwargs = patched_delete.delay.call_args_list[0]
+        self.assertEqual(args, ([deleted_id], entity_pb2.POST, self.organization_id))
+        self.assertEqual(kwargs['versions'].keys(), [deleted_id])
+
+    @patch('search.tasks.delete_entities')
+    def test_process_index_updates_versions_deletes(self, patched_delete):
+        entity_id = fuzzy.uuid()
+        self._create_update(entity_id, entity_type=entity_pb2.POST, action=IndexUpdate.DELETE)
+        update = self._create_update(
+            entity_id,
+            entity_type=entity_pb2.POST,
+            action=IndexUpdate.DELETE,
+        )
+
+        tasks.process_index_updates()
+        # deletes are versioned by when the latest delete was queued
+        versions = patched_delete.delay.call_args_list[0][1]['versions']
+        self.assertEqual(versions[entity_id], indexer.get_version(update.created))
+
+    @patch('search.actions.update_entities.tasks.update_profiles')
+    def test_process_index_updates_batch_size(self, patched):
+        for _ in range(3):
+            self._create_update(fuzzy.uuid())
+
+        with patch.object(tasks.process_index_updates, 'delay') as patched_delay:
+            tasks.process_index_updates(batch_size=2)
+            self.assertEqual(patched_delay.call_count, 1)
+
+        self.assertEqual(len(patched.delay.call_args_list[0][0][0]), 2)
+        self.assertEqual(IndexUpdate.objects.count(), 1)
+
+    @patch('search.tasks.delete_entities')
+    @patch('search.actions.update_entities.tasks.update_profiles')
+    def test_process_index_updates_no_updates(self, patched_update, patched_delete):
+        with patch.object(tasks.process_index_updates, 'delay') as patched_delay:
+            self.assertIsNone(tasks.process_index_updates())
+
+        self.assertFalse(patched_update.delay.called)
+        self.assertFalse(patched_delete.delay.called)
+        self.assertFalse(patched_delay.called)
+
+    @patch('search.actions.update_entities.tasks.update_profiles')
+    def test_process_index_updates_drops_unsupported_entity_types(self, patched):
+        profile_id = fuzzy.uuid()
+        self._create_update(fuzzy.uuid(), entity_type=max(entity_pb2.EntityTypeV1.values()) + 1)
+        self._create_update(profile_id)
+
+        tasks.process_index_updates()
+        self.assertEqual(patched.delay.call_args_list[0][0][0], [profile_id])
+        self.assertFalse(IndexUpdate.objects.exists())
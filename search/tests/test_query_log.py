@@ -0,0 +1,82 @@
+from mock import patch
+from protobufs.services.search.containers import search_pb2
+
+from services.test import (
+    fuzzy,
+    TestCase,
+)
+
+from .. import (
+    models,
+    query_log,
+    tasks,
+)
+
+
+class Test(TestCase):
+
+    def setUp(self):
+        super(Test, self).setUp()
+        self.organization_id = fuzzy.uuid()
+
+    def _get_query(self, query, category=search_pb2.ALL):
+        return models.Query.objects.get(
+            organization_id=self.organization_id,
+            category=category,
+            query=query,
+        )
+
+    def test_flush_rolls_up_normalized_queries(self):
+        query_log.record(self.organization_id, search_pb2.ALL, 'Customer  Support', 2)
+        query_log.record(self.organization_id, search_pb2.ALL, 'customer support', 0)
+        query_log.record(self.organization_id, search_pb2.PROFILES, 'customer support', 1)
+        query_log.flush()
+
+        query = self._get_query('customer support')
+        self.assertEqual(query.count, 2)
+        self.assertEqual(query.hits, 1)
+        self.assertEqual(self._get_query('customer support', search_pb2.PROFILES).count, 1)
+
+    def test_flush_adds_to_existing_counts(self):
+        query_log.record(self.organization_id, search_pb2.ALL, 'customer', 1)
+        query_log.flush()
+        query_log.record(self.organization_id, search_pb2.ALL, 'customer', 1)
+        query_log.flush()
+        # nothing new to flush
+        self.assertEqual(query_log.flush(), 0)
+        self.assertEqual(self._get_query('customer').count, 2)
+
+    def test_get_popular_queries(self):
+        for query, count in (('customer', 3), ('engineering', 1), ('support', 2)):
+            for _ in range(count):
+                query_log.record(self.organization_id, search_pb2.ALL, query, 1)
+        query_log.flush()
+
+        queries = query_log.get_popular_queries(self.organization_id, 2)
+        self.assertEqual(queries, [(search_pb2.ALL, 'customer'), (search_pb2.ALL, 'support')])
+
+    def test_claim_miss_report(self):
+        self.assertTrue(query_log.claim_miss_report(self.organization_id, 'Customer'))
+        self.assertFalse(query_log.claim_miss_report(self.organization_id, 'customer'))
+
+    def test_release_miss_report(self):
+        self.assertTrue(query_log.claim_miss_report(self.organization_id, 'customer'))
+        query_log.release_miss_report(self.organization_id, 'Customer')
+        self.assertTrue(query_log.claim_miss_report(self.organization_id, 'customer'))
+
+    def test_claim_miss_report_query_with_results(self):
+        query_log.record(self.organization_id, search_pb2.ALL, 'customer', 1)
+        query_log.flush()
+        self.assertTrue(query_log.claim_miss_report(self.organization_id, 'customer'))
+        self.assertTrue(query_log.claim_miss_report(self.organization_id, 'customer'))
+
+    @patch('search.tasks.service.control.call_action')
+    def test_warm_search_cache_runs_popular_queries(self, patched_call_action):
+        query_log.record(self.organization_id, search_pb2.ALL, 'customer', 1)
+        query_log.flush()
+        tasks.warm_search_cache(self.organization_id)
+
+        self.assertEqual(patched_call_action.call_count, 1)
+        kwargs = patched_call_action.call_args[1]
+        self.assertEqual(kwargs['action'], 'search_v2')
+        self.assertEqual(kwargs['query'], 'customer')
@@ -0,0 +1,65 @@
+import json
+
+from elasticsearch_dsl import Q
+from protobufs.services.search.containers import search_pb2
+
+from services.test import TestCase
+
+from ..stores.es import (
+    plans,
+    types,
+)
+
+
+class Test(TestCase):
+
+    def test_render_matches_built_body(self):
+        query = u'Meg "in" Customer\\Support \xe9'
+        for category in [search_pb2.ALL] + plans.CATEGORY_TO_ACTIONS.keys():
+            plan = plans.get_query_plan(category)
+            self.assertEqual(
+                json.loads(plan.render(query)),
+                json.loads(json.dumps(plans.build_search_body(category, query))),
+            )
+
+    def test_plan_doc_type(self):
+        self.assertIsNone(plans.get_query_plan(search_pb2.ALL).doc_type)
+        self.assertEqual(
+            plans.get_query_plan(search_pb2.PROFILES).doc_type,
+            types.ProfileV1._doc_type.name,
+        )
+
+    def test_plans_are_compiled_once(self):
+        self.assertIs(
+            plans.get_query_plan(search_pb2.POSTS),
+            plans.get_query_plan(search_pb2.POSTS),
+        )
+
+    def test_combine_statements_dedupes(self):
+        statements = plans._combine_statements(
+            [lambda query: [Q('match', title=query)]] * 2,
+            'query',
+        )
+        self.assertEqual(statements, [Q('match', title='query')])
+
+    def test_multi_search_plan_render(self):
+        query = u'Meg "in" Customer\\Support \xe9'
+        plan = plans.get_multi_search_plan(5, timeout='100ms')
+        lines = plan.render(query).split('\n')
+        # each category has a header and a body followed by a trailing newline
+        self.assertEqual(len(lines), len(plan.categories) * 2 + 1)
+        self.assertEqual(lines[-1], '')
+        for index, category in enumerate(plan.categories):
+            header = json.loads(lines[index * 2])
+            body = json.loads(lines[index * 2 + 1])
+            self.assertEqual(header, {'type': plans.get_doc_type(category)})
+            self.assertEqual(body['size'], 5)
+            self.assertEqual(body['timeout'], '100ms')
+            expected = json.loads(json.dumps(plans.build_search_body(category, query)))
+            del body['size']
+            del body['timeout']
+            self.assertEqual(body, expected)
+
+    def test_multi_search_plans_are_compiled_once_per_settings(self):
+        self.assertIs(plans.get_multi_search_plan(5), plans.get_multi_search_plan(5))
+        self.assertIsNot(plans.get_multi_search_plan(5), plans.get_multi_search_plan(10))
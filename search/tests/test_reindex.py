@@ -0,0 +1,77 @@
+from elasticsearch_dsl import connections
+from mock import (
+    MagicMock,
+    patch,
+)
+
+from profiles.factories import ProfileFactory
+from services.test import (
+    fuzzy,
+    TestCase,
+)
+from team.factories import TeamFactory
+
+from ..actions import reindex
+from ..stores.es.indices.organization.actions import (
+    create_index,
+    get_read_alias,
+)
+
+
+class Test(TestCase):
+
+    def test_stream_ids_chunks(self):
+        organization_id = fuzzy.uuid()
+        profiles = ProfileFactory.create_batch(size=5, organization_id=organization_id)
+        ProfileFactory.create_batch(size=2)
+
+        queryset = reindex.Profile.objects.filter(organization_id=organization_id)
+        chunks = list(reindex.stream_ids(queryset, chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(
+            sorted(str(_id) for chunk in chunks for _id in chunk),
+            sorted(str(profile.id) for profile in profiles),
+        )
+
+    def test_refresh_disabled_restores_refresh_interval(self):
+        es = MagicMock()
+        es.indices.get_settings.return_value = {
+            'a': {'settings': {'index': {'refresh_interval': '30s'}}},
+            'b': {'settings': {}},
+        }
+        with reindex.refresh_disabled(es, ['a', 'b']):
+            es.indices.put_settings.assert_called_once_with(
+                index='a,b',
+                body={'index': {'refresh_interval': '-1'}},
+            )
+
+        calls = es.indices.put_settings.call_args_list[1:]
+        self.assertEqual(calls[0][1], {'index': 'a', 'body': {'index': {'refresh_interval': '30s'}}})
+        self.assertEqual(calls[1][1], {'index': 'b', 'body': {'index': {'refresh_interval': '1s'}}})
+        es.indices.refresh.assert_called_once_with(index='a,b')
+
+    def test_reindex_organization_unsupported_type(self):
+        with self.assertRaises(ValueError):
+            reindex.reindex_organization(fuzzy.uuid(), entity_types=['invalid'])
+
+    @patch('search.actions.reindex.schedule_warm_search_cache')
+    def test_reindex_organization(self, patched_schedule):
+        organization_id = fuzzy.uuid()
+        TeamFactory.create_batch(size=5, organization_id=organization_id)
+        TeamFactory.create_batch(size=2)
+        es = connections.connections.get_connection()
+        index = create_index(organization_id)
+        self.addCleanup(es.indices.delete, index=index._name, ignore=404)
+
+        stats = reindex.reindex_organization(
+            organization_id,
+            entity_types=['teams'],
+            workers=2,
+            chunk_size=2,
+        )
+        self.assertEqual(stats.documents, {'team': 5})
+        self.assertFalse(stats.failures)
+        self.assertTrue(stats.bytes)
+        # refreshing is re-enabled and the index refreshed once we're done
+        count = es.count(index=get_read_alias(organization_id), doc_type='team')['count']
+        self.assertEqual(count, 5)
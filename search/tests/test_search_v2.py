@@ -1,6 +1,7 @@
 import time
 
 from elasticsearch_dsl import connections
+from mock import patch
 from protobuf_to_dict import dict_to_protobuf
 from protobufs.services.post import containers_pb2 as post_containers
 from protobufs.services.profile import containers_pb2 as profile_containers
@@ -532,3 +533,43 @@ class Test(ESTestCase):
             '<mark>Some</mark> <mark>Bold</mark> <mark>Section</mark>',
             response.result.results[0].highlight['content'],
         )
+
+    def test_search_all_multi_search(self):
+        with self.settings(
+            SEARCH_SERVICE_MULTI_SEARCH_SIZE=2,
+            SEARCH_SERVICE_RESULT_CACHE_TIMEOUT=None,
+        ):
+            response = self.client.call_action('search_v2', query='Customer')
+
+        results = response.result.results
+        result_types = [result.tracking_details.document_type for result in results]
+        self.assertIn(types.ProfileV1._doc_type.name, result_types)
+        self.assertIn(types.TeamV1._doc_type.name, result_types)
+        for result_type in set(result_types):
+            self.assertTrue(result_types.count(result_type) <= 2)
+
+        scores = [result.score for result in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.verify_top_results(
+            'team',
+            {'name': 'Customer Support'},
+            results,
+        )
+
+    @patch('search.actions.search_v2.cache.set_results')
+    @patch('search.actions.search_v2.cache.get_results', return_value=(1, None))
+    @patch('search.actions.search_v2.connections')
+    def test_search_partial_results_not_cached(
+            self,
+            patched_connections,
+            patched_get_results,
+            patched_set_results,
+        ):
+        responses = [{'error': 'rejected execution'}]
+        responses.extend({'took': 1, 'timed_out': False, 'hits': {'hits': []}} for _ in range(10))
+        patched_connections.connections.get_connection().msearch.return_value = {
+            'responses': responses,
+        }
+        with self.settings(SEARCH_SERVICE_MULTI_SEARCH_SIZE=2):
+            self.client.call_action('search_v2', query='Customer')
+        self.assertFalse(patched_set_results.called)
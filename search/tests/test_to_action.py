@@ -0,0 +1,48 @@
+from protobuf_to_dict import dict_to_protobuf
+from protobufs.services.organization import containers_pb2 as organization_containers
+from protobufs.services.post import containers_pb2 as post_containers
+from protobufs.services.profile import containers_pb2 as profile_containers
+from protobufs.services.team import containers_pb2 as team_containers
+import yaml
+
+from services.test import (
+    mocks,
+    TestCase,
+)
+
+from ..benchmarks import FIXTURE_TYPES
+from ..stores.es import types
+
+
+class Test(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(Test, cls).setUpClass()
+        with open('search/fixtures/acme.yml') as read_file:
+            cls.fixtures = yaml.load(read_file)
+
+    def _verify(self, document_type, protobuf):
+        expected = document_type.from_protobuf(protobuf).to_dict(include_meta=True)
+        self.assertEqual(document_type.to_action(protobuf), expected)
+
+    def test_to_action_fixtures(self):
+        for key, container, document_type in FIXTURE_TYPES:
+            for fixture in self.fixtures[key]:
+                self._verify(document_type, dict_to_protobuf(fixture, container, strict=False))
+
+    def test_to_action_mocks(self):
+        self._verify(types.ProfileV1, mocks.mock_profile())
+        team = mocks.mock_team()
+        team.description.CopyFrom(mocks.mock_description())
+        self._verify(types.TeamV1, team)
+        self._verify(types.LocationV1, mocks.mock_location())
+        self._verify(types.PostV1, mocks.mock_post())
+        self._verify(types.CollectionV1, mocks.mock_collection())
+
+    def test_to_action_empty(self):
+        self._verify(types.ProfileV1, profile_containers.ProfileV1())
+        self._verify(types.TeamV1, team_containers.TeamV1())
+        self._verify(types.LocationV1, organization_containers.LocationV1())
+        self._verify(types.PostV1, post_containers.PostV1())
+        self._verify(types.CollectionV1, post_containers.CollectionV1())
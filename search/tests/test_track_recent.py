@@ -6,7 +6,10 @@ from services.test import (
     mocks,
     MockedTestCase,
 )
-from .. import models
+from .. import (
+    models,
+    recents,
+)
 
 
 class Test(MockedTestCase):
@@ -43,3 +46,31 @@ class Test(MockedTestCase):
             self.client.call_action('track_recent', tracking_details={
                 'document_type': types.ProfileV1._doc_type.name,
             })
+
+    def test_track_recent_deduplicates(self):
+        document_id = fuzzy.uuid()
+        for _ in range(2):
+            self.client.call_action('track_recent', tracking_details={
+                'document_id': document_id,
+                'document_type': types.ProfileV1._doc_type.name,
+            })
+        self.assertEqual(models.Recent.objects.filter(by_profile_id=self.profile.id).count(), 1)
+
+    def test_track_recent_capped(self):
+        with self.settings(SEARCH_SERVICE_RECENTS_LIMIT=2):
+            document_ids = [fuzzy.uuid() for _ in range(3)]
+            for document_id in document_ids:
+                self.client.call_action('track_recent', tracking_details={
+                    'document_id': document_id,
+                    'document_type': types.ProfileV1._doc_type.name,
+                })
+
+            self.assertEqual(
+                recents.get_recents(self.organization.id, self.profile.id),
+                [
+                    (types.ProfileV1._doc_type.name, document_ids[2]),
+                    (types.ProfileV1._doc_type.name, document_ids[1]),
+                ],
+            )
+            recents.compact()
+            self.assertEqual(models.Recent.objects.filter(by_profile_id=self.profile.id).count(), 2)
@@ -1,3 +1,4 @@
+from elasticsearch.serializer import JSONSerializer
 from mock import patch
 from protobuf_to_dict import dict_to_protobuf
 from protobufs.services.organization import containers_pb2 as organization_containers
@@ -16,6 +17,7 @@ from .. import tasks
 from ..actions.update_entities import get_batches
 from ..stores.es import types
 from ..stores.es.indices.organization.actions import get_write_alias
+from .base import get_bulk_actions
 
 
 class TestUpdateEntities(MockedTestCase):
@@ -29,8 +31,10 @@ class TestUpdateEntities(MockedTestCase):
 
         self.patcher = patch('search.tasks.connections')
         patched_connections = self.patcher.start()
-        connection = patched_connections.connections.get_connection()
-        connection.indices.get_alias.return_value = {get_write_alias(self.organization.id): {}}
+        self.es = patched_connections.connections.get_connection()
+        self.es.indices.get_alias.return_value = {get_write_alias(self.organization.id): {}}
+        self.es.transport.serializer = JSONSerializer()
+        self.es.bulk.return_value = {'errors': False}
 
     def tearDown(self):
         super(TestUpdateEntities, self).tearDown()
@@ -55,8 +59,7 @@ class TestUpdateEntities(MockedTestCase):
             ([str(p.id) for p in profiles], str(profiles[0].organization_id))
         )
 
-    @patch('search.tasks.bulk')
-    def test_tasks_update_profiles(self, patched_bulk):
+    def test_tasks_update_profiles(self):
         profile = mocks.mock_profile()
         self.mock.instance.register_mock_object(
             service='profile',
@@ -68,16 +71,26 @@ class TestUpdateEntities(MockedTestCase):
             is_admin=False,
         )
         tasks.update_profiles([str(profile.id)], str(profile.organization_id))
-        self.assertEqual(patched_bulk.call_count, 1)
+        self.assertEqual(self.es.bulk.call_count, 1)
 
-        documents = patched_bulk.call_args_list[0][0][1]
+        _, source = get_bulk_actions(self.es)[0]
         called_profile = dict_to_protobuf(
-            documents[0]['_source'],
+            source,
             profile_containers.ProfileV1,
             strict=False,
         )
         self.verify_containers(profile, called_profile)
 
+    def test_update_actions_are_versioned(self):
+        post = mocks.mock_post(created=None, changed=None)
+        action = tasks._get_update_action(types.PostV1, post)
+        self.assertNotIn('_version', action)
+
+        post.changed = '2016-01-01T00:00:00.000001+00:00'
+        action = tasks._get_update_action(types.PostV1, post)
+        self.assertEqual(action['_version'], 1451606400000001)
+        self.assertEqual(action['_version_type'], 'external_gte')
+
     def test_get_batches(self):
         # test batch with no remainder
         batches = get_batches(range(30), batch_size=10)
@@ -105,8 +118,7 @@ class TestUpdateEntities(MockedTestCase):
             ([str(t.id) for t in teams], str(teams[0].organization_id))
         )
 
-    @patch('search.tasks.bulk')
-    def test_tasks_update_teams(self, patched_bulk):
+    def test_tasks_update_teams(self):
         team = mocks.mock_team()
         self.mock.instance.register_mock_object(
             service='team',
@@ -117,11 +129,11 @@ class TestUpdateEntities(MockedTestCase):
             inflations={'disabled': False, 'exclude': ['permissions']},
         )
         tasks.update_teams([str(team.id)], str(team.organization_id))
-        self.assertEqual(patched_bulk.call_count, 1)
+        self.assertEqual(self.es.bulk.call_count, 1)
 
-        documents = patched_bulk.call_args_list[0][0][1]
+        _, source = get_bulk_actions(self.es)[0]
         called_team = dict_to_protobuf(
-            documents[0]['_source'],
+            source,
             organization_containers.TeamV1,
             strict=False,
         )
@@ -142,8 +154,7 @@ class TestUpdateEntities(MockedTestCase):
             ([str(l.id) for l in locations], str(locations[0].organization_id))
         )
 
-    @patch('search.tasks.bulk')
-    def test_tasks_update_locations(self, patched_bulk):
+    def test_tasks_update_locations(self):
         location = mocks.mock_location()
         self.mock.instance.register_mock_object(
             service='organization',
@@ -153,12 +164,12 @@ class TestUpdateEntities(MockedTestCase):
             ids=[location.id],
         )
         tasks.update_locations([str(location.id)], str(location.organization_id))
-        self.assertEqual(patched_bulk.call_count, 1)
+        self.assertEqual(self.es.bulk.call_count, 1)
 
-        documents = patched_bulk.call_args_list[0][0][1]
-        types.LocationV1.prepare_protobuf_dict(documents[0]['_source'])
+        _, source = get_bulk_actions(self.es)[0]
+        types.LocationV1.prepare_protobuf_dict(source)
         called_location = dict_to_protobuf(
-            documents[0]['_source'],
+            source,
             organization_containers.LocationV1,
             strict=False,
         )
@@ -179,8 +190,7 @@ class TestUpdateEntities(MockedTestCase):
             ([str(p.id) for p in posts], str(posts[0].organization_id))
         )
 
-    @patch('search.tasks.bulk')
-    def test_tasks_update_posts(self, patched_bulk):
+    def test_tasks_update_posts(self):
         post = mocks.mock_post(created=None, changed=None)
         self.mock.instance.register_mock_object(
             service='post',
@@ -193,11 +203,11 @@ class TestUpdateEntities(MockedTestCase):
             all_states=False,
         )
         tasks.update_posts([str(post.id)], str(post.organization_id))
-        self.assertEqual(patched_bulk.call_count, 1)
+        self.assertEqual(self.es.bulk.call_count, 1)
 
-        documents = patched_bulk.call_args_list[0][0][1]
+        _, source = get_bulk_actions(self.es)[0]
         called_post = dict_to_protobuf(
-            documents[0]['_source'],
+            source,
             post_containers.PostV1,
             strict=False,
         )
@@ -220,8 +230,7 @@ class TestUpdateEntities(MockedTestCase):
             ([str(c.id) for c in collections], str(collections[0].organization_id))
         )
 
-    @patch('search.tasks.bulk')
-    def test_tasks_update_collections(self, patched_bulk):
+    def test_tasks_update_collections(self):
         collection = mocks.mock_collection(created=None, changed=None)
         self.mock.instance.register_mock_object(
             service='post',
@@ -234,11 +243,11 @@ class TestUpdateEntities(MockedTestCase):
             mock_regex_lookup='post.get_collections:.*',
         )
         tasks.update_collections([str(collection.id)], str(collection.organization_id))
-        self.assertEqual(patched_bulk.call_count, 1)
+        self.assertEqual(self.es.bulk.call_count, 1)
 
-        documents = patched_bulk.call_args_list[0][0][1]
+        _, source = get_bulk_actions(self.es)[0]
         called_collection = dict_to_protobuf(
-            documents[0]['_source'],
+            source,
             post_containers.CollectionV1,
             strict=False,
         )
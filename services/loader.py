@@ -0,0 +1,178 @@
+"""Request scoped batching and caching of entities from other services.
+
+Models inflate related entities (ie. a post's author) one object at a time,
+which costs a call to another service per object and often fetches the same
+entity over and over. While a request is being handled, lookups go through a
+`Loader` instead:
+
+    - ids can be primed before inflating a page of objects, so they're fetched
+      with a single batched call (ie. `get_profiles` instead of a
+      `get_profile` per object)
+    - every entity fetched is memoized for the rest of the request
+
+Outside of a request (ie. in celery tasks) lookups go straight to the service.
+
+"""
+from collections import (
+    defaultdict,
+    namedtuple,
+)
+from contextlib import contextmanager
+import json
+import threading
+
+import service.control
+
+EntityType = namedtuple('EntityType', (
+    'service',
+    'batch_action',
+    'batch_return_object',
+    'action',
+    'return_object',
+    'id_parameter',
+))
+
+PROFILE = EntityType('profile', 'get_profiles', 'profiles', 'get_profile', 'profile', 'profile_id')
+TEAM = EntityType('team', 'get_teams', 'teams', 'get_team', 'team', 'team_id')
+# files can only be fetched in batches
+FILE = EntityType('file', 'get_files', 'files', None, None, None)
+
+_local = threading.local()
+
+
+def _get_batch_options(options):
+    fields = options.get('fields')
+    # we need the ids to match up the batched results
+    if fields and fields.get('only') and 'id' not in fields['only']:
+        options = dict(options, fields=dict(fields, only=list(fields['only']) + ['id']))
+    return options
+
+
+def _fetch(entity_type, entity_id, token, options):
+    return service.control.get_object(
+        service=entity_type.service,
+        action=entity_type.action,
+        client_kwargs={'token': token},
+        return_object=entity_type.return_object,
+        **dict(options, **{entity_type.id_parameter: str(entity_id)})
+    )
+
+
+def _fetch_many(entity_type, ids, token, options):
+    return service.control.get_object(
+        service=entity_type.service,
+        action=entity_type.batch_action,
+        client_kwargs={'token': token},
+        return_object=entity_type.batch_return_object,
+        control={'paginator': {'page_size': len(ids)}},
+        ids=ids,
+        **_get_batch_options(options)
+    )
+
+
+class Loader(object):
+    """Batch and memoize entity lookups.
+
+    Entities are memoized per token and options, since both can change what
+    the service returns.
+
+    """
+
+    def __init__(self):
+        self._entities = defaultdict(dict)
+        self._pending = defaultdict(set)
+
+    def _get_key(self, entity_type, token, options):
+        return (entity_type, token, json.dumps(options, sort_keys=True))
+
+    def prime(self, entity_type, ids, token, **options):
+        """Queue ids to be fetched with the next lookup of the same type."""
+        key = self._get_key(entity_type, token, options)
+        entities = self._entities[key]
+        self._pending[key].update(str(_id) for _id in ids if str(_id) not in entities)
+
+    def load_many(self, entity_type, ids, token, **options):
+        """Return the entities with the given ids, skipping any that don't exist.
+
+        Any primed ids of the same type are fetched in the same call.
+
+        """
+        ids = [str(_id) for _id in ids]
+        self.prime(entity_type, ids, token, **options)
+        key = self._get_key(entity_type, token, options)
+        entities = self._entities[key]
+        pending = self._pending.pop(key, None)
+        if pending:
+            for entity in _fetch_many(entity_type, list(pending), token, options):
+                entities[entity.id] = entity
+            # remember misses so we don't ask for them again
+            for _id in pending:
+                entities.setdefault(_id, None)
+        return [entities[_id] for _id in ids if entities.get(_id) is not None]
+
+    def load(self, entity_type, entity_id, token, **options):
+        """Return the entity with the given id or None if it doesn't exist."""
+        entities = self.load_many(entity_type, [entity_id], token, **options)
+        return entities[0] if entities else None
+
+
+def get_loader():
+    """Return the loader for the current request, or None outside of a request."""
+    return getattr(_local, 'loader', None)
+
+
+@contextmanager
+def scope():
+    """Batch and memoize lookups within the wrapped block.
+
+    Nested scopes share the outermost loader.
+
+    """
+    loader = get_loader()
+    if loader is not None:
+        yield loader
+        return
+
+    _local.loader = Loader()
+    try:
+        yield _local.loader
+    finally:
+        _local.loader = None
+
+
+def prime(entity_type, ids, token, **options):
+    """Queue ids to be fetched in one batch with the next lookup of the same type.
+
+    Args:
+        entity_type (EntityType): type of the entities
+        ids (list): ids of the entities
+        token (str): service token
+        **options: parameters for the lookup (ie. `inflations` and `fields`)
+
+    """
+    loader = get_loader()
+    if loader is not None:
+        loader.prime(entity_type, ids, token, **options)
+
+
+def get(entity_type, entity_id, token, **options):
+    """Return the entity with the given id.
+
+    Errors for entities that don't exist are raised the same way they would
+    be calling the service directly.
+
+    """
+    loader = get_loader()
+    if loader is not None:
+        entity = loader.load(entity_type, entity_id, token, **options)
+        if entity is not None:
+            return entity
+    return _fetch(entity_type, entity_id, token, options)
+
+
+def get_many(entity_type, ids, token, **options):
+    """Return the entities with the given ids, skipping any that don't exist."""
+    loader = get_loader()
+    if loader is not None:
+        return loader.load_many(entity_type, ids, token, **options)
+    return _fetch_many(entity_type, [str(_id) for _id in ids], token, options)
@@ -1,13 +1,8 @@
 from base64 import b64encode
-import logging
 
-import service.control
+from django.apps import apps
 import watson
 
-from .token import make_admin_token
-
-logger = logging.getLogger(__name__)
-
 
 class SearchAdapter(watson.SearchAdapter):
 
@@ -23,28 +18,29 @@ class SearchAdapter(watson.SearchAdapter):
 
 
 def update_entity(primary_key, organization_id, entity_type):
-    token = make_admin_token(organization_id=organization_id)
-    try:
-        service.control.call_action(
-            service='search',
-            action='update_entities',
-            client_kwargs={'token': token},
-            ids=[str(primary_key)],
-            type=entity_type,
-        )
-    except service.control.CallActionError as e:
-        logger.error(e.summary)
+    """Queue the entity to be updated within the search index.
+
+    The update is written to the search outbox so it is committed along with
+    the change to the entity. Pending updates are coalesced and sent to the
+    index by `search.tasks.process_index_updates`.
+
+    """
+    # NB: this module is imported by app configs before the models are loaded
+    IndexUpdate = apps.get_model('search', 'IndexUpdate')
+    IndexUpdate.objects.create(
+        organization_id=organization_id,
+        entity_type=entity_type,
+        entity_id=primary_key,
+        action=IndexUpdate.UPDATE,
+    )
 
 
 def delete_entity(primary_key, organization_id, entity_type):
-    token = make_admin_token(organization_id=organization_id)
-    try:
-        service.control.call_action(
-            service='search',
-            action='delete_entities',
-            client_kwargs={'token': token},
-            ids=[str(primary_key)],
-            type=entity_type,
-        )
-    except service.control.CallActionError as e:
-        logger.error(e.summary)
+    """Queue the entity to be removed from the search index."""
+    IndexUpdate = apps.get_model('search', 'IndexUpdate')
+    IndexUpdate.objects.create(
+        organization_id=organization_id,
+        entity_type=entity_type,
+        entity_id=primary_key,
+        action=IndexUpdate.DELETE,
+    )
@@ -7,6 +7,7 @@ https://docs.djangoproject.com/en/1.7/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/1.7/ref/settings/
 """
+from datetime import timedelta
 import json
 import os
 import sys
@@ -291,6 +292,89 @@ CELERY_DISABLE_RATE_LIMITS = True
 CELERYD_LOG_FORMAT = '[%(asctime)s: %(levelname)s/%(processName)s] %(name)s %(message)s'
 
 SEARCH_SERVICE_ELASTICSEARCH = None
+# number of shared indices to spread organizations across. when set, new
+# organizations get filtered, routed aliases into a shared index instead of an
+# index of their own (falsy disables)
+SEARCH_SERVICE_SHARED_INDEX_COUNT = None
+# number of seconds to cache search results (falsy disables the cache)
+SEARCH_SERVICE_RESULT_CACHE_TIMEOUT = 60 * 5
+# number of seconds to cache the indices behind write aliases (falsy disables the cache)
+SEARCH_SERVICE_WRITE_INDICES_CACHE_TIMEOUT = 60
+# max number of results per category when searching all categories. when set,
+# each category is searched independently in a single `_msearch` request
+# instead of with one blended query (falsy disables)
+SEARCH_SERVICE_MULTI_SEARCH_SIZE = None
+# time budget for each category when searching all categories with `_msearch`
+SEARCH_SERVICE_MULTI_SEARCH_TIMEOUT = '250ms'
+# operations slower than this are sampled into the "search.slow_queries" log (None disables)
+SEARCH_SERVICE_SLOW_QUERY_THRESHOLD_MS = 500
+# fraction of slow operations to log
+SEARCH_SERVICE_SLOW_QUERY_SAMPLE_RATE = 0.1
+# max number of pending index updates to process at a time
+SEARCH_SERVICE_INDEX_UPDATE_BATCH_SIZE = 1000
+# number of entities to fetch from their service at a time when indexing
+SEARCH_SERVICE_INDEX_FETCH_PAGE_SIZE = 100
+# max size of a bulk request in bytes
+SEARCH_SERVICE_BULK_MAX_BYTES = 5 * 1024 * 1024
+# max number of actions in a bulk request
+SEARCH_SERVICE_BULK_MAX_ACTIONS = 1000
+# number of times to retry bulk actions rejected by ES (429) before reporting them as failed
+SEARCH_SERVICE_BULK_MAX_RETRIES = 4
+# seconds to wait before retrying rejected bulk actions, doubling with each retry
+SEARCH_SERVICE_BULK_INITIAL_BACKOFF = 0.2
+# number of threads copying documents when migrating an organization between indices
+SEARCH_SERVICE_MIGRATION_WORKERS = 4
+# max number of documents per second to copy when migrating (None disables)
+SEARCH_SERVICE_MIGRATION_MAX_DOCS_PER_SECOND = 2000
+# number of times to compare document counts before giving up on switching the read alias
+SEARCH_SERVICE_MIGRATION_CONVERGE_ATTEMPTS = 10
+# engine serving search_v2: "elasticsearch" or "postgres" (for small deployments and tests)
+SEARCH_SERVICE_ENGINE = 'elasticsearch'
+# copy indexed documents into postgres and search them when ES is unavailable or over budget
+SEARCH_SERVICE_POSTGRES_FALLBACK = False
+# seconds a search can take in ES before we fall back to postgres (None disables)
+SEARCH_SERVICE_ES_LATENCY_BUDGET = 0.5
+# number of failed or slow searches in a row before we stop searching ES
+SEARCH_SERVICE_ES_FAILURE_THRESHOLD = 3
+# number of seconds to search postgres before trying ES again
+SEARCH_SERVICE_ES_RETRY_INTERVAL = 30
+# max number of recents to keep for each profile
+SEARCH_SERVICE_RECENTS_LIMIT = 50
+# number of seconds to keep a profile's recents in redis after they were last viewed
+SEARCH_SERVICE_RECENTS_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+# number of each organization's most popular queries to run after its results
+# are invalidated, so they're cached before anyone searches (falsy disables)
+SEARCH_SERVICE_WARM_QUERIES = 20
+# number of seconds to wait for indexing to settle before warming results
+SEARCH_SERVICE_WARM_DELAY = 30
+# number of seconds a query counts towards the popular queries after it was last searched
+SEARCH_SERVICE_QUERY_LOG_WINDOW = 60 * 60 * 24 * 7
+
+# max number of characters of post content to extract text from when the post
+# is saved. text is extracted from larger posts asynchronously
+POST_SERVICE_PLAIN_TEXT_MAX_SYNC_LENGTH = 100000
+# number of seconds to wait before extracting text from large posts, so the
+# post's transaction has committed
+POST_SERVICE_PLAIN_TEXT_DELAY = 5
+# number of times to retry extracting text from a post that hasn't committed yet
+POST_SERVICE_PLAIN_TEXT_MAX_RETRIES = 5
+# number of seconds to cache rendered html documents (falsy disables the cache)
+POST_SERVICE_HTML_DOCUMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+CELERYBEAT_SCHEDULE = {
+    'process-index-updates': {
+        'task': 'search.tasks.process_index_updates',
+        'schedule': timedelta(seconds=5),
+    },
+    'compact-recents': {
+        'task': 'search.tasks.compact_recents',
+        'schedule': timedelta(hours=1),
+    },
+    'flush-query-log': {
+        'task': 'search.tasks.flush_query_log',
+        'schedule': timedelta(minutes=1),
+    },
+}
 
 TESTS_TEARDOWN_ES = False
 
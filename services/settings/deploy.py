@@ -206,11 +206,9 @@ AUTHENTICATION_TOKEN_COOKIE_SECURE = bool(int(os.environ.get(
 
 METRICS_HANDLER = 'service.metrics.datadog.instance'
 
-CELERYBEAT_SCHEDULE = {
-    'sync-profiles': {
-        'task': 'profiles.tasks.sync_all',
-        'schedule': crontab(minute=0, hour=0)
-    },
+CELERYBEAT_SCHEDULE['sync-profiles'] = {
+    'task': 'profiles.tasks.sync_all',
+    'schedule': crontab(minute=0, hour=0)
 }
 
 CELERY_IGNORE_RESULT = True
@@ -0,0 +1,90 @@
+from mock import patch
+from protobufs.services.profile import containers_pb2 as profile_containers
+
+from .. import loader
+from ..test import (
+    fuzzy,
+    TestCase,
+)
+
+
+class Test(TestCase):
+
+    def setUp(self):
+        super(Test, self).setUp()
+        self.token = 'token'
+        self.profiles = [profile_containers.ProfileV1(id=fuzzy.uuid()) for _ in range(3)]
+        patcher = patch('services.loader.service.control.get_object')
+        self.patched_get_object = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_outside_of_scope(self):
+        self.patched_get_object.return_value = self.profiles[0]
+        for _ in range(2):
+            profile = loader.get(loader.PROFILE, self.profiles[0].id, self.token)
+        self.assertEqual(profile, self.profiles[0])
+        self.assertEqual(self.patched_get_object.call_count, 2)
+        kwargs = self.patched_get_object.call_args[1]
+        self.assertEqual(kwargs['action'], 'get_profile')
+        self.assertEqual(kwargs['profile_id'], self.profiles[0].id)
+
+    def test_get_primed_ids_batched(self):
+        self.patched_get_object.return_value = self.profiles
+        ids = [p.id for p in self.profiles]
+        with loader.scope():
+            loader.prime(loader.PROFILE, ids, self.token, inflations={'disabled': True})
+            for profile_id in ids * 2:
+                profile = loader.get(
+                    loader.PROFILE,
+                    profile_id,
+                    self.token,
+                    inflations={'disabled': True},
+                )
+                self.assertEqual(profile.id, profile_id)
+
+        self.assertEqual(self.patched_get_object.call_count, 1)
+        kwargs = self.patched_get_object.call_args[1]
+        self.assertEqual(kwargs['action'], 'get_profiles')
+        self.assertEqual(sorted(kwargs['ids']), sorted(ids))
+        self.assertEqual(kwargs['control'], {'paginator': {'page_size': len(ids)}})
+
+    def test_get_memoized_per_options(self):
+        self.patched_get_object.return_value = self.profiles[:1]
+        with loader.scope():
+            loader.get(loader.PROFILE, self.profiles[0].id, self.token)
+            loader.get(loader.PROFILE, self.profiles[0].id, self.token)
+            loader.get(loader.PROFILE, self.profiles[0].id, self.token, fields={'only': ['is_admin']})
+        self.assertEqual(self.patched_get_object.call_count, 2)
+        kwargs = self.patched_get_object.call_args[1]
+        self.assertEqual(kwargs['fields'], {'only': ['is_admin', 'id']})
+
+    def test_get_missing_entity_falls_back_to_service(self):
+        self.patched_get_object.side_effect = [[], self.profiles[0]]
+        with loader.scope():
+            profile = loader.get(loader.PROFILE, self.profiles[0].id, self.token)
+        self.assertEqual(profile, self.profiles[0])
+        self.assertEqual(
+            [call[1]['action'] for call in self.patched_get_object.call_args_list],
+            ['get_profiles', 'get_profile'],
+        )
+
+    def test_get_many_skips_missing(self):
+        self.patched_get_object.return_value = self.profiles[:2]
+        missing_id = fuzzy.uuid()
+        with loader.scope():
+            profiles = loader.get_many(
+                loader.PROFILE,
+                [self.profiles[1].id, missing_id, self.profiles[0].id],
+                self.token,
+            )
+            # misses are remembered
+            loader.get_many(loader.PROFILE, [missing_id], self.token)
+        self.assertEqual(profiles, [self.profiles[1], self.profiles[0]])
+        self.assertEqual(self.patched_get_object.call_count, 1)
+
+    def test_scope_cleared(self):
+        with loader.scope() as outer:
+            with loader.scope() as inner:
+                self.assertIs(inner, outer)
+            self.assertIs(loader.get_loader(), outer)
+        self.assertIsNone(loader.get_loader())
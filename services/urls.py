@@ -11,4 +11,5 @@ urlpatterns = patterns('',
     url(r'^v1/$', views.ServicesView.as_view()),
     url(r'^user/', include('users.urls')),
     url(r'^hooks/', include('hooks.urls')),
+    url(r'^post/', include('post.urls')),
 )
@@ -1,4 +1,6 @@
+from collections import OrderedDict
 import json
+import threading
 import urllib
 import uuid
 
@@ -108,3 +110,40 @@ def has_field_error(response, field, error):
             has_error = True
             break
     return has_error
+
+
+class LRUCache(object):
+    """Thread safe, bounded, in-process cache that evicts the least recently used key.
+
+    Args:
+        maxsize (int): max number of keys to hold
+
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
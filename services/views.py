@@ -11,6 +11,7 @@ from rest_framework.views import APIView
 from service import settings as service_settings
 from service_protobufs import soa_pb2
 
+from . import loader
 from .authentication import (
     delete_authentication_cookie,
     set_authentication_cookie,
@@ -56,7 +57,12 @@ class ServicesView(APIView):
             service_request.control.token = token
 
         serialized_request = service_request.SerializeToString()
-        service_response = self.transport.process_request(service_request, serialized_request)
+        # lookups made by the actions handling the request are batched and memoized
+        with loader.scope():
+            service_response = self.transport.process_request(
+                service_request,
+                serialized_request,
+            )
         response = HttpResponse(
             service_response.SerializeToString(),
             content_type='application/x-protobuf',
@@ -2,8 +2,8 @@ from common import utils
 from common.db import models
 from protobufs.services.post import containers_pb2 as post_containers
 from protobufs.services.team import containers_pb2 as team_containers
-import service.control
 
+from services import loader
 from services.fields import DescriptionField
 
 
@@ -49,12 +49,10 @@ class Team(models.UUIDModel, models.TimestampableModel):
     def _inflate(self, protobuf, inflations, overrides, token):
         if self.description and self.description.by_profile_id:
             if token and utils.should_inflate_field('description.by_profile_id', inflations):
-                by_profile = service.control.get_object(
-                    service='profile',
-                    action='get_profile',
-                    client_kwargs={'token': token},
-                    return_object='profile',
-                    profile_id=str(self.description.by_profile_id),
+                by_profile = loader.get(
+                    loader.PROFILE,
+                    self.description.by_profile_id,
+                    token,
                     inflations={'disabled': True},
                 )
                 self.description.by_profile.CopyFrom(by_profile)
@@ -122,12 +120,10 @@ class TeamMember(models.UUIDModel, models.TimestampableModel):
             'profile' not in overrides and
             utils.should_inflate_field('profile', inflations)
         ):
-            profile = service.control.get_object(
-                service='profile',
-                action='get_profile',
-                client_kwargs={'token': token},
-                return_object='profile',
-                profile_id=str(self.profile_id),
+            profile = loader.get(
+                loader.PROFILE,
+                self.profile_id,
+                token,
                 inflations={'disabled': True},
             )
             protobuf.profile.CopyFrom(profile)
@@ -9,6 +9,7 @@ from service import (
     validators,
 )
 import service.control
+from services import loader
 from services.mixins import PreRunParseTokenMixin
 
 from ..actions import (
@@ -192,6 +193,19 @@ class GetTeams(PreRunParseTokenMixin, actions.Action):
                 token=self.token,
             )
 
+        if utils.should_inflate_field('description.by_profile_id', self.request.inflations):
+            # fetch the description authors for the page in a single call
+            author_ids = [
+                t.description.by_profile_id for t in teams
+                if t.description and t.description.by_profile_id
+            ]
+            loader.prime(
+                loader.PROFILE,
+                author_ids,
+                self.token,
+                inflations={'disabled': True},
+            )
+
         for team in teams:
             container = self.response.teams.add()
             permissions = team_id_to_permissions_dict.get(str(team.id), (None, None))[1]